@@ -0,0 +1,44 @@
+"""Shared setup for the service benchmarks
+
+Benchmarks import application modules the same way `src/main.py` does, so
+`src/` is put on the path and the settings that have no defaults are filled
+with local placeholders (no benchmark talks to MongoDB or Redis).
+"""
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Sequence
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+def time_calls(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Time `repeat` calls of `fn`, returning per-call latency in microseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    }
+
+def print_table(headers: Sequence[str], rows: List[Sequence[object]]):
+    """Print rows as a fixed-width text table"""
+    cells = [[str(h) for h in headers]] + [
+        [f"{v:,.2f}" if isinstance(v, float) else str(v) for v in row] for row in rows
+    ]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for n, row in enumerate(cells):
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+        if n == 0:
+            print("  ".join("-" * width for width in widths))
@@ -0,0 +1,60 @@
+"""Single-pass category matcher vs. the previous four-scan implementation
+
+The old AgeAppropriatenessAnalyzer lowercased the text and ran `re.findall`
+once per category with uncompiled patterns. The new matcher combines the
+categories into one compiled alternation and scans once (and, for batches,
+once over the concatenated texts).
+    
+    python benchmarks/bench_age_matcher.py
+"""
+import random
+import re
+
+from _common import print_table, time_calls
+from ml.analyzers.age_analyzer import MATURE_PATTERNS, AgeAppropriatenessAnalyzer
+
+FILLER = (
+    "community volunteers food drive school donation weekend support local "
+    "family shelter meal program clothing winter books children health"
+).split()
+MATURE = ["killing", "blood", "nude", "drugs", "alcohol", "damn", "hell", "murderer"]
+
+def make_text(size: int, seed: int) -> str:
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(MATURE) if rng.random() < 0.02 else rng.choice(FILLER)
+        words.append(word.capitalize() if rng.random() < 0.1 else word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+def legacy_counts(text: str):
+    text_lower = text.lower()
+    flags = {}
+    for category, pattern in MATURE_PATTERNS.items():
+        matches = re.findall(pattern, text_lower, re.IGNORECASE)
+        if matches:
+            flags[category] = len(matches)
+    return flags
+
+def main():
+    analyzer = AgeAppropriatenessAnalyzer()
+    rows = []
+    for label, size, repeat in [("1 KB", 1_000, 2000), ("10 KB", 10_000, 500), ("100 KB", 100_000, 50)]:
+        text = make_text(size, seed=size)
+        assert legacy_counts(text) == analyzer.count_categories(text)
+        legacy = time_calls(lambda: legacy_counts(text), repeat)
+        single = time_calls(lambda: analyzer.count_categories(text), repeat)
+        rows.append([label, legacy["p50_us"], single["p50_us"], legacy["p50_us"] / single["p50_us"]])
+    
+    texts = [make_text(1_000, seed=i) for i in range(256)]
+    assert [legacy_counts(t) for t in texts] == analyzer.count_categories_batch(texts)
+    legacy = time_calls(lambda: [legacy_counts(t) for t in texts], 50)
+    batch = time_calls(lambda: analyzer.count_categories_batch(texts), 50)
+    rows.append(["256 x 1 KB batch", legacy["p50_us"], batch["p50_us"], legacy["p50_us"] / batch["p50_us"]])
+    
+    print_table(["input", "four-scan p50 us", "single-pass p50 us", "speedup"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Per-request cost of building the content analyzer vs. the app-scoped registry
+
+The old `get_analyzer()` dependency built a new ContentAnalyzer (and with it
+an AgeAppropriatenessAnalyzer) on every request, and `analyze()` constructed
+a ModelLoader that probes `torch.cuda.is_available()`. The registry builds
+them once at startup. Both paths use the placeholder toxicity score so only
+the per-request construction cost differs.
+    
+    python benchmarks/bench_analyzer_dependency.py [requests]
+"""
+import asyncio
+import logging
+import sys
+import time
+import tracemalloc
+
+from _common import print_table
+from models.schemas import ContentAnalysisRequest
+from services.content_analyzer import ContentAnalyzer
+from ml.models.model_loader import ModelLoader
+from ml.analyzers.age_analyzer import AgeAppropriatenessAnalyzer
+
+SAMPLE = ContentAnalysisRequest(
+    content_id="bench",
+    content="Community food drive this weekend, volunteers welcome. Bring gloves!"
+)
+
+async def legacy_request():
+    analyzer = ContentAnalyzer()
+    ModelLoader()
+    return await analyzer.analyze(SAMPLE)
+
+SHARED = ContentAnalyzer(age_analyzer=AgeAppropriatenessAnalyzer())
+
+async def registry_request():
+    return await SHARED.analyze(SAMPLE)
+
+async def measure(handler, requests: int):
+    for _ in range(50):
+        await handler()
+    
+    start = time.perf_counter()
+    for _ in range(requests):
+        await handler()
+    latency_us = (time.perf_counter() - start) / requests * 1e6
+    
+    # Peak memory allocated while serving one request
+    peaks = []
+    tracemalloc.start()
+    for _ in range(min(requests, 500)):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        await handler()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - base)
+    tracemalloc.stop()
+    return latency_us, sum(peaks) / len(peaks)
+
+async def main(requests: int):
+    logging.disable(logging.INFO)
+    legacy = await measure(legacy_request, requests)
+    shared = await measure(registry_request, requests)
+    print_table(
+        ["path", "latency_us/req", "peak_alloc_bytes/req"],
+        [
+            ["per-request construction", legacy[0], legacy[1]],
+            ["app-scoped registry", shared[0], shared[1]],
+            ["speedup / reduction", legacy[0] / shared[0], legacy[1] / max(shared[1], 1.0)]
+        ]
+    )
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -0,0 +1,105 @@
+"""Interest embeddings: IVF search vs. exact search, latency and recall
+
+Synthetic unit-length embeddings are drawn around random topic centers so
+neighborhoods are meaningful, and queries are noisy copies of stored rows
+(a user interest close to some content). Exact float32 search (one matrix
+product and `argpartition`) is the reference; recall@k is the share of its
+top k that each configuration also returns. Rows are:
+
+- float32 / int8 exact: `EmbeddingIndex.search(..., nprobe=0)` per storage
+- int8 IVF nprobe=n: the coarse quantizer reads only the n closest lists
+
+The "pool" table repeats this for what feed requests run: similarity of a
+fixed candidate subset (`EmbeddingIndex.similarity`), then top k of it.
+    
+    python benchmarks/bench_embedding_index.py [k]
+"""
+import sys
+
+import numpy as np
+
+from _common import print_table, time_calls
+from services.embedding_index import EmbeddingIndex, train_ivf
+from services.feed_ranking import top_k
+
+DIM = 384
+SIZES = (10_000, 100_000)
+POOL_SIZE = 20_000
+TOPICS = 1_000
+QUERIES = 50
+NPROBES = (4, 8, 16, 32)
+
+def make_embeddings(size: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((TOPICS, DIM)).astype(np.float32)
+    noise = rng.standard_normal((size, DIM)).astype(np.float32)
+    vectors = centers[rng.integers(TOPICS, size=size)] + 0.8 * noise
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def make_queries(vectors: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    queries = vectors[rng.integers(len(vectors), size=QUERIES)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def build_index(vectors: np.ndarray, storage: str, n_lists: int) -> EmbeddingIndex:
+    index = EmbeddingIndex(capacity=len(vectors), dim=DIM, storage=storage, n_lists=n_lists)
+    index.add(range(len(vectors)), vectors)
+    if n_lists > 1:
+        rows, keys, sample = index.training_sample()
+        centroids, assignment = train_ivf(sample, n_lists)
+        index.set_centroids(centroids, rows, keys, assignment)
+    return index
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    similarity = vectors @ query
+    return top_k(similarity, np.ones(len(vectors), dtype=bool), k)
+
+def recall(found, reference) -> float:
+    return len(set(found.tolist()) & set(reference.tolist())) / len(reference)
+
+def run(rows, name: str, search, reference, queries, repeat: int):
+    latency = time_calls(lambda: [search(query) for query in queries], repeat)
+    hits = np.mean([recall(search(query), expected) for query, expected in zip(queries, reference)])
+    rows.append([name, latency["p50_us"] / 1000 / len(queries), float(hits)])
+
+def main(k: int):
+    rng = np.random.default_rng(0)
+    for size in SIZES:
+        vectors = make_embeddings(size, rng)
+        queries = make_queries(vectors, rng)
+        n_lists = int(np.sqrt(size))
+        float_index = build_index(vectors, "float32", 0)
+        int8_index = build_index(vectors, "int8", n_lists)
+        reference = [exact_top_k(vectors, query, k) for query in queries]
+        repeat = max(3, 200_000 // size)
+        
+        rows = []
+        run(rows, "numpy matmul", lambda q: exact_top_k(vectors, q, k), reference, queries, repeat)
+        run(rows, "float32 exact", lambda q: float_index.search(q, k)[0], reference, queries, repeat)
+        run(rows, "int8 exact", lambda q: int8_index.search(q, k, nprobe=0)[0], reference, queries, repeat)
+        for nprobe in NPROBES:
+            run(
+                rows,
+                f"int8 IVF nprobe={nprobe}",
+                lambda q, nprobe=nprobe: int8_index.search(q, k, nprobe=nprobe)[0],
+                reference,
+                queries,
+                repeat
+            )
+        print(f"\n{size:,} embeddings, {n_lists} IVF lists, top {k}")
+        print_table(["search", "ms / query", f"recall@{k}"], rows)
+        
+        # Feed path: similarity of a candidate pool, then its top k
+        pool = np.sort(rng.choice(size, size=min(POOL_SIZE, size), replace=False))
+        pool_reference = [pool[exact_top_k(vectors[pool], query, k)] for query in queries]
+        rows = []
+        for nprobe in (0,) + NPROBES:
+            def rank(query, nprobe=nprobe):
+                similarity = int8_index.similarity(query, pool, nprobe=nprobe)
+                return pool[top_k(similarity, np.ones(len(pool), dtype=bool), k)]
+            name = "int8 exact" if nprobe == 0 else f"int8 IVF nprobe={nprobe}"
+            run(rows, name, rank, pool_reference, queries, repeat)
+        print(f"\n{len(pool):,}-candidate pool out of {size:,}, top {k}")
+        print_table(["pool similarity", "ms / query", f"recall@{k}"], rows)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
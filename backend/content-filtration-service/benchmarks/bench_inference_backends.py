@@ -0,0 +1,80 @@
+"""Latency and throughput of the toxicity/sentiment models per inference backend
+
+Loads each backend through `ModelLoader` (the same path the service uses) and
+times the analyzers' `predict_batch` at several batch sizes. The ONNX backend
+needs an export first (`cd src && python -m ml.models.export_onnx`); backends
+that fail to load are reported and skipped.
+
+    python benchmarks/bench_inference_backends.py
+    python benchmarks/bench_inference_backends.py --backends pytorch int8 --threads 2
+"""
+import argparse
+import asyncio
+import random
+
+import torch
+
+from _common import print_table, time_calls
+from ml.analyzers.sentiment_analyzer import SentimentAnalyzer
+from ml.analyzers.toxicity_analyzer import ToxicityAnalyzer
+from ml.models.backends import INFERENCE_BACKENDS
+from ml.models.model_loader import ModelLoader
+
+WORDS = (
+    "community volunteers food drive school donation weekend support local "
+    "family shelter meal program clothing winter books children health idiot "
+    "terrible wonderful angry happy hate love stupid great awful amazing"
+).split()
+
+def make_texts(count: int, words: int, seed: int):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(words)) for _ in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=list(INFERENCE_BACKENDS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--words", type=int, default=40, help="words per text")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    args = parser.parse_args()
+    
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    
+    rows = []
+    for backend in args.backends:
+        loader = ModelLoader(backend=backend)
+        try:
+            asyncio.run(loader.load_models(["toxicity", "sentiment"]))
+        except Exception as e:
+            print(f"skipping {backend}: {e}")
+            continue
+        
+        scorers = {
+            "toxicity": ToxicityAnalyzer(loader.get_model('toxicity')).predict_batch,
+            "sentiment": SentimentAnalyzer(
+                loader.get_model('sentiment'),
+                loader.get_tokenizer('sentiment'),
+                device=loader.device
+            ).predict_batch
+        }
+        for model, predict in scorers.items():
+            for batch_size in args.batch_sizes:
+                texts = make_texts(batch_size, args.words, seed=batch_size)
+                with torch.inference_mode():
+                    predict(texts)  # warm-up
+                    timing = time_calls(lambda: predict(texts), args.repeat)
+                rows.append([
+                    backend,
+                    model,
+                    batch_size,
+                    timing["p50_us"] / 1000,
+                    timing["p99_us"] / 1000,
+                    batch_size / (timing["mean_us"] / 1e6)
+                ])
+    
+    print_table(["backend", "model", "batch", "p50 ms", "p99 ms", "texts/s"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Serialization cost of `/api/content/analyze`: dict path vs. encoded bytes
+
+The previous route cached `result.model_dump(mode="json")`, rebuilt a dict
+with the caller's content_id on every hit and returned it, so FastAPI
+validated it against `response_model` and serialized it again. The current
+route encodes the result once with orjson, caches those bytes and splices
+the content_id into them. Both paths are driven through a FastAPI app over
+raw ASGI with an in-memory stand-in for Redis (same value codec), and the
+analysis itself is a prebuilt result, so only the serialization differs.
+
+    python benchmarks/bench_response_serialization.py [requests]
+"""
+import asyncio
+import sys
+import time
+import uuid
+from typing import Dict
+
+import orjson
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, Response
+
+from _common import print_table
+from models.schemas import (
+    AgeAppropriatenessScore,
+    AgeGroup,
+    ContentAnalysisRequest,
+    ContentAnalysisResponse,
+    SensitivityLevel,
+    ToxicityScore
+)
+from services.analysis_cache import LocalTTLCache, encode_analysis, render_analysis
+from services.cache_service import decode_value, encode_value
+
+# As built by the analyzer for REQUEST_BODY
+RESULT = ContentAnalysisResponse(
+    content_id="post-123",
+    toxicity=ToxicityScore(
+        overall_score=0.0812,
+        categories={
+            "toxicity": 0.1021,
+            "severe_toxicity": 0.0013,
+            "obscene": 0.0211,
+            "threat": 0.0034,
+            "insult": 0.0442,
+            "identity_attack": 0.0061
+        },
+        is_toxic=False,
+        severity="low"
+    ),
+    age_appropriateness=AgeAppropriatenessScore(
+        min_age=0,
+        recommended_age_groups=list(AgeGroup),
+        content_rating="G",
+        reasons=[]
+    ),
+    sensitivity=SensitivityLevel.SAFE,
+    is_safe=True,
+    recommendations={"action": "allow", "confidence": 0.85}
+)
+
+REQUEST_BODY = orjson.dumps({
+    "content_id": "post-123",
+    "content": "Community food drive this weekend, volunteers welcome. Bring gloves!"
+})
+
+class Tiers:
+    """Local LRU plus a dict of Redis-encoded values; `tier` picks where lookups hit"""
+    
+    def __init__(self, tier: str):
+        self.tier = tier
+        self.local = LocalTTLCache(1000, 3600)
+        self.redis: Dict[str, bytes] = {}
+    
+    def get(self, key: str, parse: bool):
+        if self.tier == "local":
+            return self.local.get(key)
+        if self.tier == "redis":
+            raw = self.redis.get(key)
+            return decode_value(raw, parse) if raw is not None else None
+        return None
+    
+    def set(self, key: str, payload):
+        self.local.set(key, payload)
+        self.redis[key] = encode_value(payload)
+
+def legacy_app(tiers: Tiers) -> FastAPI:
+    app = FastAPI()
+    
+    @app.post("/analyze", response_model=ContentAnalysisResponse)
+    async def analyze(request: ContentAnalysisRequest):
+        result = tiers.get("k", parse=True)
+        if result is None:
+            result = RESULT.model_dump(mode="json")
+            tiers.set("k", result)
+            return result
+        return {
+            **result,
+            "content_id": request.content_id or str(uuid.uuid4()),
+            "decided_by": "cache"
+        }
+    
+    return app
+
+def encoded_app(tiers: Tiers) -> FastAPI:
+    app = FastAPI(default_response_class=ORJSONResponse)
+    
+    @app.post("/analyze", response_model=ContentAnalysisResponse)
+    async def analyze(request: ContentAnalysisRequest):
+        payload = tiers.get("k", parse=False)
+        decided_by = "cache"
+        if payload is None:
+            payload = encode_analysis(RESULT)
+            tiers.set("k", payload)
+            decided_by = None
+        return Response(
+            content=render_analysis(payload, request.content_id or str(uuid.uuid4()), decided_by),
+            media_type="application/json"
+        )
+    
+    return app
+
+async def post(app: FastAPI, body: bytes) -> bytes:
+    """One POST /analyze through the ASGI interface, returning the response body"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/analyze",
+        "raw_path": b"/analyze",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode())
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000)
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+    
+    chunks = []
+    
+    async def send(message):
+        if message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+    
+    await app(scope, receive, send)
+    return b"".join(chunks)
+
+async def measure(make_app, tier: str, requests: int):
+    tiers = Tiers(tier)
+    app = make_app(tiers)
+    # The first request computes and fills the cache
+    first = orjson.loads(await post(app, REQUEST_BODY))
+    for _ in range(200):
+        await post(app, REQUEST_BODY)
+    
+    start = time.perf_counter()
+    for _ in range(requests):
+        body = await post(app, REQUEST_BODY)
+    latency_us = (time.perf_counter() - start) / requests * 1e6
+    return latency_us, first, orjson.loads(body)
+
+async def main(requests: int):
+    rows = []
+    for tier in ("local", "redis", "miss"):
+        legacy_us, legacy_first, legacy_body = await measure(legacy_app, tier, requests)
+        encoded_us, encoded_first, encoded_body = await measure(encoded_app, tier, requests)
+        # Same JSON either way, whatever the key order
+        assert legacy_first == encoded_first and legacy_body == encoded_body, tier
+        rows.append([tier, legacy_us, encoded_us, legacy_us / encoded_us])
+    print_table(["served from", "dict path us/req", "encoded path us/req", "speedup"], rows)
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -0,0 +1,101 @@
+"""Padding efficiency of token-budgeted, length-bucketed batches
+
+Compares how many of the tokens pushed through the encoder are real (not
+padding) for the previous approach, arrival-order batches of a fixed item
+count padded to their longest member and truncated at the model limit, and
+for `SequenceBatcher`'s planning: sliding-window chunks sorted by length and
+packed under a padded-token budget. Post lengths follow a long-tailed
+distribution (mostly short posts, some very long ones).
+
+    python benchmarks/bench_token_bucketing.py
+    python benchmarks/bench_token_bucketing.py --tokenizer bert-base-uncased
+"""
+import argparse
+import random
+
+from _common import print_table, time_calls
+from ml.inference.sequence_batcher import padded_tokens, plan_token_batches, sliding_windows
+
+SPECIAL_TOKENS = 2  # [CLS] ... [SEP]
+
+def make_lengths(count: int, seed: int):
+    """Content token counts per post: log-normal, median ~40 tokens, tail into thousands"""
+    rng = random.Random(seed)
+    return [max(1, int(rng.lognormvariate(3.7, 1.1))) for _ in range(count)]
+
+def tokenized_lengths(tokenizer_name: str, count: int, seed: int):
+    from transformers import AutoTokenizer
+    
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    rng = random.Random(seed)
+    words = "community volunteers food drive school donation weekend support local family".split()
+    texts = [" ".join(rng.choice(words) for _ in range(n)) for n in make_lengths(count, seed)]
+    ids = tokenizer(texts, add_special_tokens=False, truncation=False, verbose=False)["input_ids"]
+    return [len(i) for i in ids]
+
+def fixed_count(lengths, batch_size: int, max_length: int):
+    """Arrival order, `batch_size` items per batch, truncated to `max_length`"""
+    truncated = [min(n + SPECIAL_TOKENS, max_length) for n in lengths]
+    batches = [list(range(i, min(i + batch_size, len(lengths)))) for i in range(0, len(lengths), batch_size)]
+    return truncated, batches
+
+def bucketed(lengths, max_tokens: int, max_batch_size: int, max_length: int, stride: int):
+    """Sliding-window chunks (nothing truncated), length-sorted under a token budget"""
+    window = max_length - SPECIAL_TOKENS
+    sequences = []
+    for n in lengths:
+        sequences.extend(
+            len(chunk) + SPECIAL_TOKENS for chunk in sliding_windows(list(range(n)), window, stride)
+        )
+    return sequences, plan_token_batches(sequences, max_tokens, max_batch_size)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=2048)
+    parser.add_argument("--batch-size", type=int, default=32, help="item count of the fixed-size baseline")
+    parser.add_argument("--max-tokens", type=int, default=8192)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--stride", type=int, default=128)
+    parser.add_argument("--tokenizer", help="HF tokenizer for real token counts (default: synthetic)")
+    args = parser.parse_args()
+    
+    if args.tokenizer:
+        lengths = tokenized_lengths(args.tokenizer, args.texts, seed=7)
+    else:
+        lengths = make_lengths(args.texts, seed=7)
+    
+    rows = []
+    base_lengths, base_batches = fixed_count(lengths, args.batch_size, args.max_length)
+    base_padded = padded_tokens(base_lengths, base_batches)
+    rows.append([
+        f"fixed {args.batch_size} items",
+        len(base_batches),
+        sum(base_lengths),
+        base_padded,
+        sum(base_lengths) / base_padded,
+        sum(max(0, n + SPECIAL_TOKENS - args.max_length) for n in lengths)
+    ])
+    
+    for max_tokens in sorted({args.max_tokens // 2, args.max_tokens, args.max_tokens * 2}):
+        seq_lengths, batches = bucketed(lengths, max_tokens, 64, args.max_length, args.stride)
+        padded = padded_tokens(seq_lengths, batches)
+        rows.append([
+            f"bucketed {max_tokens} tokens",
+            len(batches),
+            sum(seq_lengths),
+            padded,
+            sum(seq_lengths) / padded,
+            0
+        ])
+    
+    print_table(
+        ["batching", "batches", "real tokens", "padded tokens", "efficiency", "tokens truncated"],
+        rows
+    )
+    
+    seq_lengths, _ = bucketed(lengths, args.max_tokens, 64, args.max_length, args.stride)
+    timing = time_calls(lambda: plan_token_batches(seq_lengths, args.max_tokens, 64), 50)
+    print(f"\nplanning {len(seq_lengths)} sequences: p50 {timing['p50_us']:,.0f} us")
+
+if __name__ == "__main__":
+    main()
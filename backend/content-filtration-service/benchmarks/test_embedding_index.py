@@ -0,0 +1,103 @@
+"""Correctness of the interest embedding index against exact search
+
+Uses the benchmark's synthetic topic-clustered embeddings, at sizes that
+run in a few seconds:
+    
+    python -m pytest benchmarks/test_embedding_index.py
+"""
+import numpy as np
+
+import _common  # noqa: F401  (puts src/ on the path)
+from bench_embedding_index import DIM, build_index, exact_top_k, make_embeddings, make_queries, recall
+from services.embedding_index import EmbeddingIndex, quantize_int8, spherical_kmeans, train_ivf
+
+SIZE = 10_000
+K = 20
+
+def setup_module(module):
+    rng = np.random.default_rng(0)
+    module.vectors = make_embeddings(SIZE, rng)
+    module.queries = make_queries(vectors, rng)
+    module.reference = [exact_top_k(vectors, query, K) for query in queries]
+
+def mean_recall(search, k: int = K) -> float:
+    return float(np.mean([
+        recall(search(query)[:k], expected[:k]) for query, expected in zip(queries, reference)
+    ]))
+
+def test_quantize_int8_error_within_half_a_step():
+    codes, scales = quantize_int8(vectors)
+    assert codes.dtype == np.int8
+    error = np.abs(codes.astype(np.float32) * scales[:, None] - vectors)
+    assert np.all(error <= scales[:, None] / 2 + 1e-7)
+
+def test_quantize_int8_zero_rows():
+    codes, scales = quantize_int8(np.zeros((2, DIM), dtype=np.float32))
+    assert not codes.any()
+    assert np.all(scales == 1.0)
+
+def test_spherical_kmeans_unit_centroids_close_to_members():
+    centroids = spherical_kmeans(vectors, 64)
+    assert centroids.shape == (64, DIM)
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0, atol=1e-5)
+    # Members are closer to their own centroid than to a random one
+    similarity = vectors @ centroids.T
+    assert similarity.max(axis=1).mean() > similarity.mean() + 0.2
+
+def test_train_ivf_assigns_nearest_centroid():
+    centroids, assignment = train_ivf(vectors[:2000], 32)
+    assert np.array_equal(assignment, np.argmax(vectors[:2000] @ centroids.T, axis=1))
+
+def test_float32_exact_search_matches_numpy():
+    index = build_index(vectors, "float32", 0)
+    for query, expected in zip(queries, reference):
+        keys, similarity = index.search(query, K, nprobe=0)
+        assert np.array_equal(keys, expected)
+        assert np.allclose(similarity, vectors[expected] @ query, atol=1e-5)
+
+def test_int8_exact_search_recall():
+    index = build_index(vectors, "int8", 0)
+    assert mean_recall(lambda query: index.search(query, K, nprobe=0)[0]) >= 0.95
+
+def test_ivf_search_recall():
+    index = build_index(vectors, "int8", 100)
+    # Close neighbours share lists with the query; the weakly related tail
+    # of the top k is what probing fewer lists gives up
+    assert mean_recall(lambda query: index.search(query, K, nprobe=16)[0], k=5) >= 0.95
+    recalls = [mean_recall(lambda query: index.search(query, K, nprobe=nprobe)[0]) for nprobe in (4, 16, 64)]
+    assert recalls == sorted(recalls)
+    # Probing every list is an exact search
+    exact = mean_recall(lambda query: index.search(query, K, nprobe=0)[0])
+    assert mean_recall(lambda query: index.search(query, K, nprobe=100)[0]) == exact
+
+def test_pool_similarity_matches_exact_on_probed_rows():
+    index = build_index(vectors, "float32", 100)
+    pool = np.sort(np.random.default_rng(1).choice(SIZE, size=2000, replace=False))
+    query = queries[0]
+    exact = np.clip(vectors[pool] @ query, 0.0, 1.0)
+    assert np.allclose(index.similarity(query, pool, nprobe=0), exact, atol=1e-5)
+    
+    similarity = index.similarity(query, pool, nprobe=16)
+    probed = index._in_probed(pool, index._probed(query[None], 16))
+    assert np.allclose(similarity[probed], exact[probed], atol=1e-5)
+    assert not similarity[~probed].any()
+
+def test_ring_evicts_oldest_keys():
+    index = EmbeddingIndex(capacity=100, dim=DIM, storage="int8", n_lists=0)
+    index.add(range(150), vectors[:150])
+    assert len(index) == 100
+    rows = index.lookup(np.arange(150))
+    assert np.all(rows[:50] == -1)
+    assert np.all(rows[50:] >= 0)
+    assert np.allclose(index.vectors(rows[50:]), vectors[50:150], atol=0.01)
+
+def test_set_centroids_assigns_rows_added_during_training():
+    index = EmbeddingIndex(capacity=4000, dim=DIM, storage="int8", n_lists=16)
+    index.add(range(2000), vectors[:2000])
+    rows, keys, sample = index.training_sample()
+    centroids, assignment = train_ivf(sample, 16)
+    index.add(range(2000, 2500), vectors[2000:2500])
+    index.set_centroids(centroids, rows, keys, assignment)
+    late = index.lookup(np.arange(2000, 2500))
+    assert np.all(index.lists[late] >= 0)
+    assert np.array_equal(index.lists[late], np.argmax(index.vectors(late) @ centroids.T, axis=1))
@@ -0,0 +1,40 @@
+"""Byte layout that `/api/content/analyze` splices responses from
+
+`render_analysis` inserts the caller's content_id and `decided_by` into
+`encode_analysis` bytes without parsing them, which only works while
+`decided_by` is the first key of the encoded payload:
+    
+    python -m pytest benchmarks/test_response_serialization.py
+"""
+import orjson
+
+import _common  # noqa: F401  (puts src/ on the path)
+from bench_response_serialization import RESULT
+from services.analysis_cache import decode_analysis, encode_analysis, render_analysis
+
+def test_encoded_analysis_starts_with_decided_by():
+    payload = encode_analysis(RESULT)
+    assert next(iter(orjson.loads(payload))) == "decided_by"
+    assert payload.startswith(b'{"decided_by":')
+    assert "content_id" not in orjson.loads(payload)
+
+def test_render_matches_decoded_analysis():
+    payload = encode_analysis(RESULT)
+    body = orjson.loads(render_analysis(payload, "post-456"))
+    assert body == decode_analysis(payload, "post-456")
+    assert body == {**RESULT.model_dump(mode="json"), "content_id": "post-456"}
+    assert list(body)[:2] == ["content_id", "decided_by"]
+
+def test_render_overrides_decided_by():
+    payload = encode_analysis(RESULT.model_copy(update={"decided_by": "model"}))
+    body = orjson.loads(render_analysis(payload, "post-456", "cache"))
+    assert body["decided_by"] == "cache"
+    assert body == decode_analysis(payload, "post-456", "cache")
+
+def test_render_reencodes_other_layouts():
+    payload = orjson.dumps({"is_safe": True, "decided_by": "model"})
+    assert orjson.loads(render_analysis(payload, "post-456", "cache")) == {
+        "is_safe": True,
+        "decided_by": "cache",
+        "content_id": "post-456"
+    }
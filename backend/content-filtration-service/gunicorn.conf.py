@@ -0,0 +1,40 @@
+"""Gunicorn config for running several uvicorn workers in one pod
+
+    gunicorn -c gunicorn.conf.py main:app
+
+With SHARED_MODEL_WEIGHTS=true the master loads the models once before
+forking and the workers share the weight pages copy-on-write; otherwise
+every worker loads its own copy in the app lifespan.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from config.settings import settings  # noqa: E402
+
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = settings.WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+loglevel = settings.LOG_LEVEL.lower()
+# Model loading can take a while in workers that do not share weights
+timeout = 120
+preload_app = settings.SHARED_MODEL_WEIGHTS
+
+
+def on_starting(server):
+    if settings.SHARED_MODEL_WEIGHTS:
+        from ml.models.shared_weights import preload_models
+        preload_models()
+
+
+def pre_fork(server, worker):
+    if settings.SHARED_MODEL_WEIGHTS:
+        from ml.models.shared_weights import freeze_before_fork
+        freeze_before_fork()
+
+
+def post_fork(server, worker):
+    if settings.SHARED_MODEL_WEIGHTS:
+        from ml.models.shared_weights import after_fork
+        after_fork()
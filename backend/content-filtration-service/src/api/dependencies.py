@@ -0,0 +1,79 @@
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from ml.models.model_registry import ModelRegistry
+from services.admission import AdmissionController
+from services.analysis_cache import AnalysisCache
+from services.cache_service import CacheService
+from services.analysis_store import AnalysisStore
+from services.embedding_index import DeferredEmbedding, EmbeddingIndex, InterestVectors
+from services.fairness_service import FairnessMonitor
+from services.feed_cache import FeedCache
+from services.safety_index import DeferredAnalysis, SafetyIndex
+
+def get_registry(request: Request) -> ModelRegistry:
+    """Dependency to get the app-scoped model registry"""
+    registry = getattr(request.app.state, "registry", None)
+    if registry is None or not registry.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Models are not loaded yet",
+            headers={"Retry-After": "5"}
+        )
+    return registry
+
+def get_analysis_cache(request: Request) -> AnalysisCache:
+    """Dependency to get the app-scoped analysis cache"""
+    return request.app.state.analysis_cache
+
+def get_cache_service(request: Request) -> CacheService:
+    """Dependency to get the shared Redis cache (one connection pool per worker)"""
+    return request.app.state.cache
+
+def get_analysis_store(request: Request) -> AnalysisStore:
+    """Dependency to get the write-behind analysis store"""
+    return request.app.state.analysis_store
+
+def get_safety_index(request: Request) -> SafetyIndex:
+    """Dependency to get the in-process safety index"""
+    return request.app.state.safety_index
+
+def get_deferred_analysis(request: Request) -> DeferredAnalysis:
+    """Dependency to get the background analysis queue for unindexed feed candidates"""
+    return request.app.state.deferred_analysis
+
+def get_feed_cache(request: Request) -> Optional[FeedCache]:
+    """Dependency to get the per-user materialized feed cache (None when disabled)"""
+    return getattr(request.app.state, "feed_cache", None)
+
+def get_embedding_index(request: Request) -> Optional[EmbeddingIndex]:
+    """Dependency to get the content embedding index (None when embeddings are disabled)"""
+    return getattr(request.app.state, "embedding_index", None)
+
+def get_deferred_embedding(request: Request) -> Optional[DeferredEmbedding]:
+    """Dependency to get the background embedding queue for feed candidates"""
+    return getattr(request.app.state, "deferred_embedding", None)
+
+def get_interest_vectors(request: Request) -> Optional[InterestVectors]:
+    """Dependency to get the cache of interest embeddings"""
+    return getattr(request.app.state, "interest_vectors", None)
+
+def get_fairness_monitor(request: Request) -> FairnessMonitor:
+    """Dependency to get the online per-group fairness counters"""
+    return request.app.state.fairness
+
+def get_admission_controller(request: Request) -> Optional[AdmissionController]:
+    """Dependency to get the admission controller (None when disabled)"""
+    return getattr(request.app.state, "admission", None)
+
+def admission(endpoint: str):
+    """Dependency factory holding an admission slot of `endpoint` for the request"""
+    async def admit(request: Request):
+        controller = get_admission_controller(request)
+        if controller is None:
+            yield
+            return
+        async with controller.admit(endpoint):
+            yield
+    return admit
@@ -0,0 +1,409 @@
+"""Prometheus exposition for the service
+
+Nothing on the request path talks to prometheus_client. The pipeline keeps
+its own plain counters and `BucketHistogram`s (a bisect and two additions
+per observation); `ServiceCollector` reads them, and the existing `stats()`
+snapshots, only when `/metrics` is scraped. Each worker process exposes its
+own numbers.
+"""
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
+from prometheus_client.core import (
+    CounterMetricFamily,
+    GaugeMetricFamily,
+    HistogramMetricFamily
+)
+
+from config.settings import settings
+from utils.histogram import LATENCY_BOUNDS_SECONDS, BucketHistogram
+
+class RequestMetrics:
+    """In-flight gauge, latency and response counts per handler"""
+    
+    def __init__(self):
+        self.in_flight = 0
+        self.latency: Dict[Tuple[str, str], BucketHistogram] = {}
+        self.responses: Dict[Tuple[str, str, str], int] = {}
+    
+    def observe(self, handler: str, method: str, status: int, seconds: float):
+        key = (handler, method)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = BucketHistogram(LATENCY_BOUNDS_SECONDS)
+        histogram.observe(seconds)
+        response_key = (handler, method, str(status))
+        self.responses[response_key] = self.responses.get(response_key, 0) + 1
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware feeding `RequestMetrics`
+    
+    Requests are labelled by endpoint function name, which the router puts
+    in the scope, so label cardinality stays bounded whatever the paths.
+    """
+    
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        self.metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.in_flight -= 1
+            endpoint = scope.get("endpoint")
+            self.metrics.observe(
+                getattr(endpoint, "__name__", "unmatched"),
+                scope["method"],
+                status,
+                time.perf_counter() - start
+            )
+
+def _histogram(
+    name: str,
+    documentation: str,
+    labels: Iterable[str],
+    series: Iterable[Tuple[Tuple[str, ...], Dict[str, Any]]],
+    scale: float = 1.0
+) -> HistogramMetricFamily:
+    """Histogram family from `BucketHistogram.snapshot()`s; `scale` converts bounds (e.g. ms -> s)"""
+    family = HistogramMetricFamily(name, documentation, labels=list(labels))
+    for label_values, snapshot in series:
+        buckets = [
+            (bound if bound == "+Inf" else f"{float(bound) * scale:g}", count)
+            for bound, count in snapshot["buckets"].items()
+        ]
+        family.add_metric(list(label_values), buckets, sum_value=snapshot["sum"] * scale)
+    return family
+
+def _gauge(name: str, documentation: str, value: Optional[float]) -> GaugeMetricFamily:
+    return GaugeMetricFamily(name, documentation, value=float("nan") if value is None else value)
+
+def _counter(name: str, documentation: str, value: float) -> CounterMetricFamily:
+    family = CounterMetricFamily(name, documentation)
+    family.add_metric([], value)
+    return family
+
+class ServiceCollector:
+    """Collects everything from `app.state` at scrape time"""
+    
+    def __init__(self, app: FastAPI, request_metrics: RequestMetrics):
+        self.app = app
+        self.request_metrics = request_metrics
+    
+    def collect(self):
+        state = self.app.state
+        yield from self._requests()
+        
+        registry = getattr(state, "registry", None)
+        ready = registry is not None and registry.ready
+        yield _gauge("models_ready", "1 once models are loaded and analyzers built", float(ready))
+        if ready:
+            yield from self._analyzer(registry.content_analyzer)
+            yield from self._inference(registry.stats())
+        
+        analysis_cache = getattr(state, "analysis_cache", None)
+        if analysis_cache is not None:
+            yield from self._analysis_cache(analysis_cache)
+        
+        admission = getattr(state, "admission", None)
+        if admission is not None:
+            yield from self._admission(admission.stats())
+        
+        store = getattr(state, "analysis_store", None)
+        if store is not None:
+            yield from self._analysis_store(store.stats())
+        
+        safety_index = getattr(state, "safety_index", None)
+        if safety_index is not None:
+            yield from self._safety_index(safety_index.stats(), state.deferred_analysis.stats())
+        
+        feed_cache = getattr(state, "feed_cache", None)
+        if feed_cache is not None:
+            yield from self._feed_cache(feed_cache.stats())
+        
+        embedding_index = getattr(state, "embedding_index", None)
+        if embedding_index is not None:
+            yield from self._embeddings(embedding_index.stats(), state.deferred_embedding.stats())
+        
+        fairness = getattr(state, "fairness", None)
+        if fairness is not None:
+            yield from self._fairness(fairness)
+    
+    def _requests(self):
+        metrics = self.request_metrics
+        yield _gauge("http_requests_in_flight", "HTTP requests being served", metrics.in_flight)
+        yield _histogram(
+            "http_request_duration_seconds",
+            "HTTP request latency, until the last body byte is sent",
+            ["handler", "method"],
+            [(key, histogram.snapshot()) for key, histogram in list(metrics.latency.items())]
+        )
+        responses = CounterMetricFamily(
+            "http_responses",
+            "HTTP responses",
+            labels=["handler", "method", "status"]
+        )
+        for key, count in list(metrics.responses.items()):
+            responses.add_metric(list(key), count)
+        yield responses
+    
+    def _analyzer(self, analyzer):
+        cache = getattr(self.app.state, "analysis_cache", None)
+        series = [
+            ((stage,), histogram.snapshot())
+            for stage, histogram in analyzer.stage_seconds.items()
+        ]
+        if cache is not None:
+            series.insert(0, (("cache",), cache.lookup_seconds.snapshot()))
+        yield _histogram(
+            "content_analysis_stage_duration_seconds",
+            "Latency of each stage of a single-item analysis",
+            ["stage"],
+            series
+        )
+        
+        decisions = CounterMetricFamily(
+            "content_analysis_decisions",
+            "Analyses decided per cascade tier",
+            labels=["tier"]
+        )
+        for tier, count in analyzer.tier_counts.items():
+            decisions.add_metric([tier], count)
+        yield decisions
+        
+        yield _counter("content_analysis_errors", "Single-item analyses that raised", analyzer.errors_total)
+        yield _counter(
+            "content_analysis_model_failures",
+            "Toxicity model calls that failed (served pattern-only, not cached)",
+            analyzer.model_failures_total
+        )
+        
+        skips = CounterMetricFamily(
+            "content_analysis_deadline_skips",
+            "Stages skipped to meet request deadlines",
+            labels=["stage"]
+        )
+        for stage, count in analyzer.deadline_skips.items():
+            skips.add_metric([stage], count)
+        yield skips
+    
+    def _inference(self, stats: Dict[str, Any]):
+        executor = stats.get("executor")
+        if executor:
+            yield _gauge(
+                "inference_executor_in_flight",
+                "Inference calls admitted to the pool",
+                executor["in_flight"]
+            )
+            yield _gauge(
+                "inference_executor_queue_depth",
+                "Inference calls waiting for a worker thread",
+                executor["queue_depth"]
+            )
+            calls = CounterMetricFamily(
+                "inference_executor_calls",
+                "Inference calls by outcome",
+                labels=["outcome"]
+            )
+            for outcome in ("completed", "failed", "rejected"):
+                calls.add_metric([outcome], executor[f"{outcome}_total"])
+            yield calls
+        
+        batcher = stats.get("toxicity_batcher")
+        if batcher:
+            labels = (batcher["name"],)
+            depth = GaugeMetricFamily(
+                "micro_batcher_queue_depth",
+                "Items waiting to be batched",
+                labels=["batcher"]
+            )
+            depth.add_metric(list(labels), batcher["queue_depth"])
+            yield depth
+            yield _histogram(
+                "micro_batcher_batch_size",
+                "Items per model call",
+                ["batcher"],
+                [(labels, batcher["batch_size_histogram"])]
+            )
+            yield _histogram(
+                "micro_batcher_queue_wait_seconds",
+                "Time an item waited for its batch",
+                ["batcher"],
+                [(labels, batcher["queue_wait_ms_histogram"])],
+                scale=0.001
+            )
+            errors = CounterMetricFamily(
+                "micro_batcher_errors",
+                "Failed batches and rejected items",
+                labels=["batcher", "kind"]
+            )
+            errors.add_metric([batcher["name"], "batch_failed"], batcher["errors_total"])
+            errors.add_metric([batcher["name"], "rejected"], batcher["rejected_total"])
+            yield errors
+        
+        token_batching = stats.get("token_batching") or {}
+        efficiency = GaugeMetricFamily(
+            "token_padding_efficiency",
+            "Real / padded tokens per forward pass",
+            labels=["model"]
+        )
+        token_cache = CounterMetricFamily(
+            "token_cache_lookups",
+            "Token-id cache lookups",
+            labels=["model", "result"]
+        )
+        for name, batching in token_batching.items():
+            efficiency.add_metric([name], batching["padding_efficiency"])
+            token_cache.add_metric([name, "hit"], batching["token_cache"]["hits"])
+            token_cache.add_metric([name, "miss"], batching["token_cache"]["misses"])
+        yield efficiency
+        yield token_cache
+    
+    def _analysis_cache(self, analysis_cache):
+        stats = analysis_cache.stats()
+        lookups = CounterMetricFamily(
+            "analysis_cache_lookups",
+            "Analysis cache lookups per tier",
+            labels=["tier", "result"]
+        )
+        for tier in ("local", "redis"):
+            lookups.add_metric([tier, "hit"], stats[f"{tier}_hits"])
+            lookups.add_metric([tier, "miss"], stats[f"{tier}_misses"])
+        yield lookups
+        yield _counter(
+            "analysis_cache_coalesced",
+            "Misses served by another request's computation",
+            stats["coalesced"]
+        )
+        yield _gauge(
+            "analysis_cache_local_entries",
+            "Entries in the in-process analysis cache",
+            stats["local_entries"]
+        )
+    
+    def _analysis_store(self, stats: Dict[str, Any]):
+        yield _gauge("analysis_store_pending", "Analyses buffered for MongoDB", stats["pending"])
+        yield _counter("analysis_store_written", "Analyses written to MongoDB", stats["written_total"])
+        errors = CounterMetricFamily("analysis_store_errors", "Write-behind failures", labels=["kind"])
+        errors.add_metric(["failed_flush"], stats["failed_flushes_total"])
+        errors.add_metric(["dropped"], stats["dropped_total"])
+        yield errors
+    
+    def _safety_index(self, stats: Dict[str, Any], deferred: Dict[str, Any]):
+        yield _gauge("safety_index_entries", "Analyses held in the feed safety index", stats["entries"])
+        lookups = CounterMetricFamily("safety_index_lookups", "Feed candidate lookups", labels=["result"])
+        lookups.add_metric(["hit"], stats["hits"])
+        lookups.add_metric(["miss"], stats["misses"])
+        yield lookups
+        yield _gauge("deferred_analysis_pending", "Unindexed candidates queued for analysis", deferred["pending"])
+        outcomes = CounterMetricFamily(
+            "deferred_analysis_items",
+            "Unindexed candidates by outcome",
+            labels=["outcome"]
+        )
+        for outcome in ("analyzed", "dropped", "failed"):
+            outcomes.add_metric([outcome], deferred[f"{outcome}_total"])
+        yield outcomes
+    
+    def _feed_cache(self, stats: Dict[str, Any]):
+        yield _gauge("feed_cache_users", "Users with a materialized feed", stats["users"])
+        lookups = CounterMetricFamily("feed_cache_lookups", "Materialized feed lookups", labels=["result"])
+        lookups.add_metric(["hit"], stats["hits"])
+        lookups.add_metric(["miss"], stats["misses"])
+        yield lookups
+        rows = CounterMetricFamily(
+            "feed_cache_rows",
+            "Feed candidates reused from a materialized feed or computed",
+            labels=["result"]
+        )
+        rows.add_metric(["reused"], stats["rows_reused_total"])
+        rows.add_metric(["computed"], stats["rows_computed_total"])
+        yield rows
+        yield _counter(
+            "feed_cache_invalidations",
+            "Preference or safety setting updates that invalidated a feed",
+            stats["invalidations_total"]
+        )
+    
+    def _embeddings(self, stats: Dict[str, Any], deferred: Dict[str, Any]):
+        yield _gauge("embedding_index_entries", "Content embeddings held for ranking", stats["entries"])
+        yield _gauge("embedding_index_ivf_lists", "Trained IVF lists (0 = exact search)", stats["ivf_lists"])
+        yield _counter("embedding_index_queries", "Interest similarity queries", stats["queries_total"])
+        yield _gauge("deferred_embedding_pending", "Candidates queued for embedding", deferred["pending"])
+        outcomes = CounterMetricFamily(
+            "deferred_embedding_items",
+            "Feed candidates queued for embedding by outcome",
+            labels=["outcome"]
+        )
+        for outcome in ("embedded", "dropped", "failed"):
+            outcomes.add_metric([outcome], deferred[f"{outcome}_total"])
+        yield outcomes
+    
+    def _fairness(self, fairness):
+        stats = fairness.stats()
+        yield _counter("fairness_decisions", "Decisions with a demographic group", stats["decisions_total"])
+        yield _counter("fairness_labels", "Reviewed ground-truth labels counted", stats["labels_total"])
+        yield _gauge("fairness_groups", "Demographic groups tracked", stats["groups"])
+        report = fairness.report(settings.FAIRNESS_METRICS_RANGE)
+        gaps = GaugeMetricFamily(
+            "fairness_gap",
+            f"Max - min rate across groups over the last {settings.FAIRNESS_METRICS_RANGE}, this process",
+            labels=["metric"]
+        )
+        for metric in ("demographic_parity", "equal_opportunity", "treatment_equality"):
+            gap = report[f"{metric}_gap"]
+            gaps.add_metric([metric], float("nan") if gap is None else gap)
+        yield gaps
+    
+    def _admission(self, stats: Dict[str, Any]):
+        in_flight = GaugeMetricFamily("admission_in_flight", "Admitted requests running", labels=["endpoint"])
+        queued = GaugeMetricFamily("admission_queued", "Requests waiting for admission", labels=["endpoint"])
+        shed = CounterMetricFamily(
+            "admission_shed",
+            "Requests shed instead of admitted",
+            labels=["endpoint", "reason"]
+        )
+        for endpoint, pool in stats["endpoints"].items():
+            in_flight.add_metric([endpoint], pool["in_flight"])
+            queued.add_metric([endpoint], pool["queued"])
+            for reason, count in pool["shed_total"].items():
+                shed.add_metric([endpoint, reason], count)
+        yield in_flight
+        yield queued
+        yield shed
+        yield _histogram(
+            "admission_queue_wait_seconds",
+            "Time from arrival to admission",
+            ["endpoint"],
+            [((endpoint,), pool["queue_wait_ms"]) for endpoint, pool in stats["endpoints"].items()],
+            scale=0.001
+        )
+
+def setup_metrics(app: FastAPI):
+    """Install the request middleware and serve `/metrics` from a per-app registry"""
+    request_metrics = RequestMetrics()
+    app.add_middleware(RequestMetricsMiddleware, metrics=request_metrics)
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(ServiceCollector(app, request_metrics))
+    
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,81 +1,380 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from typing import AsyncIterator, List, Tuple, Union
+import asyncio
 import logging
+import uuid
+import orjson
+
+from config.settings import settings
 
 from models.schemas import (
     ContentAnalysisRequest,
     ContentAnalysisResponse,
-    BatchAnalysisRequest
+    BatchAnalysisRequest,
+    BatchAnalysisResponse,
+    BatchAnalysisItemResult
 )
 from services.content_analyzer import ContentAnalyzer
-from services.cache_service import CacheService
+from services.analysis_cache import (
+    AnalysisCache,
+    decode_analysis,
+    encode_analysis,
+    is_complete,
+    render_analysis
+)
+from services.analysis_store import AnalysisStore
+from services.safety_index import DeferredAnalysis, SafetyIndex
+from services.fairness_service import FairnessMonitor
+from ml.inference.executor import InferenceSaturatedError
+from ml.models.model_registry import ModelRegistry
+from utils.deadline import Deadline
+from api.cancellation import cancel_on_disconnect
+from api.dependencies import (
+    admission,
+    get_registry,
+    get_analysis_cache,
+    get_analysis_store,
+    get_deferred_analysis,
+    get_fairness_monitor,
+    get_safety_index
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-async def get_analyzer():
-    """Dependency to get content analyzer"""
-    return ContentAnalyzer()
+async def get_analyzer(registry: ModelRegistry = Depends(get_registry)):
+    """Dependency to get the shared content analyzer"""
+    return registry.content_analyzer
 
-async def get_cache():
-    """Dependency to get cache service"""
-    return CacheService()
-
-@router.post("/analyze", response_model=ContentAnalysisResponse)
+@router.post(
+    "/analyze",
+    response_model=ContentAnalysisResponse,
+    dependencies=[Depends(admission("analyze"))]
+)
 async def analyze_content(
     request: ContentAnalysisRequest,
+    http_request: Request,
     analyzer: ContentAnalyzer = Depends(get_analyzer),
-    cache: CacheService = Depends(get_cache)
+    analysis_cache: AnalysisCache = Depends(get_analysis_cache),
+    store: AnalysisStore = Depends(get_analysis_store),
+    safety_index: SafetyIndex = Depends(get_safety_index),
+    deferred: DeferredAnalysis = Depends(get_deferred_analysis),
+    fairness: FairnessMonitor = Depends(get_fairness_monitor)
 ):
     """
     Analyze content for toxicity, misinformation, age-appropriateness, and sensitivity
+    
+    The analysis is encoded once and cached as bytes; every response splices
+    the caller's content_id into those bytes instead of re-validating and
+    re-serializing the model (`response_model` only documents the shape).
+    
+    An optional deadline header (remaining budget in ms) lets the pipeline
+    skip the toxicity model when it cannot finish in time; skipped stages are
+    listed in `skipped_analyses`. Such partial results (and pattern-only
+    fallbacks after a model failure) are queued for a full background
+    analysis instead of being indexed. Work stops if the client disconnects.
     """
     try:
-        # Check cache first
-        cache_key = f"content_analysis:{hash(request.content)}"
-        cached_result = await cache.get(cache_key)
+        deadline = Deadline.from_header(http_request.headers.get(settings.DEADLINE_HEADER))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {settings.DEADLINE_HEADER} header")
+    
+    try:
+        async def compute():
+            return encode_analysis(await analyzer.analyze(request, deadline=deadline))
         
-        if cached_result:
-            logger.info(f"Cache hit for content analysis")
-            return cached_result
+        # Content-addressed lookup: local LRU, then Redis, then the model.
+        # Deadline-bound misses are computed alone and cached only if complete.
+        digest = analysis_cache.digest(request.content)
+        payload, tier = await cancel_on_disconnect(
+            http_request,
+            analysis_cache.get_or_compute(request.content, compute, coalesce=deadline is None)
+        )
+        # Cached payloads are always complete; a computed (or coalesced) one may
+        # be a deadline-degraded or model-failure fallback
+        partial = tier in ("model", "coalesced") and not is_complete(payload)
+        if deadline is not None and tier == "model" and not partial:
+            await analysis_cache.set_many({digest: payload})
         
-        # Analyze content
-        result = await analyzer.analyze(request)
+        # Cached analyses are shared across requests; keep the caller's id
+        content_id = request.content_id or str(uuid.uuid4())
+        decided_by = "cache" if tier in ("local", "redis") else None
         
-        # Cache result
-        await cache.set(cache_key, result.dict())
+        # Persist asynchronously so /{content_id}/score can find it later,
+        # index the decision for feed requests and count it per group.
+        # Anonymous requests are not persisted: their id is generated per
+        # request, so every repeat would store another copy (the analysis
+        # itself is still cached and indexed by content).
+        # Partial results are pattern-only verdicts: they are served to this
+        # caller, and the full analysis is retried in the background, which
+        # persists, indexes and counts it once the model answers.
+        if partial:
+            deferred.submit([request])
+        else:
+            if request.content_id:
+                store.record(digest, payload, request.content_id)
+            safety_index.add(digest, payload, request.content_id)
+            fairness.record_analysis(request, payload)
         
-        return result
+        return Response(
+            content=render_analysis(payload, content_id, decided_by),
+            media_type="application/json"
+        )
+    except (HTTPException, InferenceSaturatedError):
+        raise
     except Exception as e:
         logger.error(f"Content analysis failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/batch-analyze", response_model=List[ContentAnalysisResponse])
+async def _analyze_items(
+    items: List[ContentAnalysisRequest],
+    analyzer: ContentAnalyzer,
+    analysis_cache: AnalysisCache,
+    store: AnalysisStore,
+    safety_index: SafetyIndex,
+    fairness: FairnessMonitor,
+    start_index: int = 0
+) -> List[BatchAnalysisItemResult]:
+    """Cache-aware batch analysis shared by the batch and streaming endpoints"""
+    digests = [analysis_cache.digest(item.content) for item in items]
+    
+    # One local pass + one Redis MGET for the whole batch
+    cached = await analysis_cache.get_many(digests)
+    
+    results: List[BatchAnalysisItemResult] = [None] * len(items)
+    misses = []
+    for position, (item, digest) in enumerate(zip(items, digests)):
+        if digest in cached:
+            content_id = item.content_id or str(uuid.uuid4())
+            results[position] = BatchAnalysisItemResult(
+                index=start_index + position,
+                content_id=content_id,
+                result=decode_analysis(cached[digest], content_id, "cache")
+            )
+        else:
+            misses.append(position)
+    
+    # Analyze only the misses, then write them back with one pipeline
+    fresh = {}
+    computed = await analyzer.batch_analyze([items[position] for position in misses])
+    for position, item_result in zip(misses, computed):
+        item_result.index = start_index + position
+        results[position] = item_result
+        if item_result.result is not None and not item_result.result.skipped_analyses:
+            fresh[digests[position]] = encode_analysis(item_result.result)
+    await analysis_cache.set_many(fresh)
+    
+    # Only complete analyses are persisted (when the item names a content_id),
+    # indexed and counted per group
+    for item, item_result, digest in zip(items, results, digests):
+        if item_result.result is not None and not item_result.result.skipped_analyses:
+            payload = fresh.get(digest) or cached[digest]
+            if item.content_id:
+                store.record(digest, payload, item.content_id)
+            safety_index.add(digest, payload, item.content_id)
+            fairness.record_analysis(item, payload)
+    return results
+
+async def analyze_in_background(state, items: List[ContentAnalysisRequest]):
+    """Analyze items outside a request (feed candidates missing from the safety index)
+    
+    Runs in the batch admission pool. Raises InferenceSaturatedError while the
+    models are still loading so the caller retries later.
+    """
+    registry = state.registry
+    if not registry.ready:
+        raise InferenceSaturatedError("Models are not loaded yet", retry_after=5)
+    
+    async def run():
+        return await _analyze_items(
+            items,
+            registry.content_analyzer,
+            state.analysis_cache,
+            state.analysis_store,
+            state.safety_index,
+            state.fairness
+        )
+    
+    if state.admission is None:
+        return await run()
+    async with state.admission.admit("batch-analyze"):
+        return await run()
+
+@router.post(
+    "/batch-analyze",
+    response_model=BatchAnalysisResponse,
+    dependencies=[Depends(admission("batch-analyze"))]
+)
 async def batch_analyze_content(
     request: BatchAnalysisRequest,
-    analyzer: ContentAnalyzer = Depends(get_analyzer)
+    http_request: Request,
+    analyzer: ContentAnalyzer = Depends(get_analyzer),
+    analysis_cache: AnalysisCache = Depends(get_analysis_cache),
+    store: AnalysisStore = Depends(get_analysis_store),
+    safety_index: SafetyIndex = Depends(get_safety_index),
+    fairness: FairnessMonitor = Depends(get_fairness_monitor)
 ):
     """
-    Batch analyze multiple content items
+    Batch analyze multiple content items (per-item results or errors, in input order)
     """
     try:
-        results = await analyzer.batch_analyze(request.items)
-        return results
+        results = await cancel_on_disconnect(
+            http_request,
+            _analyze_items(request.items, analyzer, analysis_cache, store, safety_index, fairness)
+        )
+        return BatchAnalysisResponse(
+            results=results,
+            total=len(results),
+            failed=sum(1 for item in results if item.error is not None)
+        )
+    except (HTTPException, InferenceSaturatedError):
+        raise
     except Exception as e:
         logger.error(f"Batch analysis failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _read_ndjson_windows(
+    http_request: Request,
+    window_size: int
+) -> AsyncIterator[List[Tuple[int, Union[ContentAnalysisRequest, str]]]]:
+    """Parse an NDJSON body incrementally into windows of (index, item-or-error)"""
+    window = []
+    buffer = b""
+    index = 0
+    
+    def parse(line: bytes):
+        nonlocal index
+        line = line.strip()
+        if not line:
+            return
+        try:
+            window.append((index, ContentAnalysisRequest.model_validate_json(line)))
+        except ValidationError as e:
+            window.append((index, f"Invalid item: {e.errors(include_url=False)}"))
+        index += 1
+    
+    async for chunk in http_request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > settings.STREAM_MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail="NDJSON line too large")
+        for line in lines:
+            parse(line)
+            if len(window) >= window_size:
+                yield window
+                window = []
+    parse(buffer)
+    if window:
+        yield window
+
+@router.post("/batch-analyze/stream", dependencies=[Depends(admission("batch-analyze-stream"))])
+async def stream_batch_analyze_content(
+    http_request: Request,
+    analyzer: ContentAnalyzer = Depends(get_analyzer),
+    analysis_cache: AnalysisCache = Depends(get_analysis_cache),
+    store: AnalysisStore = Depends(get_analysis_store),
+    safety_index: SafetyIndex = Depends(get_safety_index),
+    fairness: FairnessMonitor = Depends(get_fairness_monitor)
+):
+    """
+    Analyze an NDJSON stream of content items, streaming NDJSON results back
+    
+    Items are processed in bounded windows through the batched model path,
+    so memory stays flat regardless of how many lines the body contains.
+    The last line is a summary with total and failed counts. A window that
+    cannot be analyzed (still saturated after STREAM_WINDOW_MAX_RETRIES
+    waits, or failing) ends the stream with an error line naming its first
+    and last item index, before the summary.
+    """
+    windows: "asyncio.Queue" = asyncio.Queue(maxsize=settings.STREAM_WINDOWS_IN_FLIGHT)
+    
+    async def produce():
+        try:
+            async for window in _read_ndjson_windows(http_request, settings.STREAM_WINDOW_SIZE):
+                await windows.put(window)
+        except Exception as e:
+            await windows.put(e)
+        finally:
+            await windows.put(None)
+    
+    async def results():
+        reader = asyncio.create_task(produce())
+        total = failed = 0
+        try:
+            while True:
+                window = await windows.get()
+                if window is None:
+                    break
+                if isinstance(window, Exception):
+                    detail = window.detail if isinstance(window, HTTPException) else str(window)
+                    yield orjson.dumps({"error": detail}) + b"\n"
+                    break
+                
+                items = [(index, item) for index, item in window if not isinstance(item, str)]
+                retries = 0
+                try:
+                    while True:
+                        try:
+                            analyzed = await _analyze_items(
+                                [item for _, item in items],
+                                analyzer,
+                                analysis_cache,
+                                store,
+                                safety_index,
+                                fairness
+                            )
+                            break
+                        except InferenceSaturatedError as e:
+                            # Backlog clients wait for capacity instead of failing, up to a point
+                            if retries >= settings.STREAM_WINDOW_MAX_RETRIES:
+                                raise
+                            retries += 1
+                            await asyncio.sleep(e.retry_after)
+                except Exception as e:
+                    logger.error(f"Streamed batch analysis window failed: {e}")
+                    total += len(window)
+                    failed += len(window)
+                    yield orjson.dumps({
+                        "error": str(e),
+                        "first_index": window[0][0],
+                        "last_index": window[-1][0]
+                    }) + b"\n"
+                    break
+                for (index, _), item_result in zip(items, analyzed):
+                    item_result.index = index
+                
+                by_index = {item_result.index: item_result for item_result in analyzed}
+                lines = []
+                for index, item in window:
+                    if isinstance(item, str):
+                        item_result = BatchAnalysisItemResult(index=index, error=item)
+                    else:
+                        item_result = by_index[index]
+                    total += 1
+                    failed += item_result.error is not None
+                    lines.append(orjson.dumps(item_result.model_dump(mode="json")))
+                yield b"\n".join(lines) + b"\n"
+            
+            yield orjson.dumps({"summary": {"total": total, "failed": failed}}) + b"\n"
+        finally:
+            reader.cancel()
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @router.get("/{content_id}/score")
 async def get_content_score(
     content_id: str,
-    cache: CacheService = Depends(get_cache)
+    store: AnalysisStore = Depends(get_analysis_store)
 ):
     """
-    Get cached content safety score
+    Get content safety score (Redis, falling back to MongoDB)
+    
+    Only analyses requested with a `content_id` are stored.
     """
     try:
-        cache_key = f"content_score:{content_id}"
-        result = await cache.get(cache_key)
+        result = await store.get_score(content_id)
         
         if not result:
             raise HTTPException(status_code=404, detail="Content score not found")
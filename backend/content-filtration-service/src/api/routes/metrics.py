@@ -1,15 +1,38 @@
 from fastapi import APIRouter, HTTPException, Depends
+from datetime import timezone
+from typing import List
 import logging
 
-from models.schemas import BiasMetrics
-from services.fairness_service import FairnessService
+from config.settings import settings
+from models.schemas import BiasMetrics, FairnessLabel
+from services.fairness_service import FairnessMonitor, FairnessService
+from ml.models.model_registry import ModelRegistry
+from services.analysis_cache import AnalysisCache
+from services.analysis_store import AnalysisStore
+from services.admission import AdmissionController
+from services.safety_index import DeferredAnalysis, SafetyIndex
+from services.feed_cache import FeedCache
+from services.embedding_index import DeferredEmbedding, EmbeddingIndex
+from api.dependencies import (
+    get_registry,
+    get_analysis_cache,
+    get_analysis_store,
+    get_admission_controller,
+    get_deferred_analysis,
+    get_deferred_embedding,
+    get_embedding_index,
+    get_fairness_monitor,
+    get_feed_cache,
+    get_safety_index
+)
+from utils.memory import worker_memory_report
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-async def get_fairness_service():
+async def get_fairness_service(monitor: FairnessMonitor = Depends(get_fairness_monitor)):
     """Dependency to get fairness service"""
-    return FairnessService()
+    return FairnessService(monitor)
 
 @router.get("/bias", response_model=BiasMetrics)
 async def get_bias_metrics(
@@ -32,14 +55,36 @@ async def get_fairness_analysis(
 ):
     """
     Get fairness analysis over time
+    
+    Per-group positive and true positive rates, the demographic parity,
+    equal opportunity and treatment equality gaps, and a trend of the gaps,
+    summed from time-bucketed counters (`time_range` such as 30m, 24h, 7d).
     """
     try:
         analysis = await service.analyze_fairness(time_range)
         return analysis
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to get fairness analysis: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/fairness/labels")
+async def record_fairness_labels(
+    labels: List[FairnessLabel],
+    monitor: FairnessMonitor = Depends(get_fairness_monitor)
+):
+    """
+    Record reviewed ground truth for past decisions (feeds equal opportunity)
+    """
+    for label in labels:
+        at = label.timestamp
+        if at is not None:
+            # Naive timestamps are UTC, like the rest of the service
+            at = (at if at.tzinfo else at.replace(tzinfo=timezone.utc)).timestamp()
+        monitor.record_label(label.demographic_group, label.flagged, label.label, at=at)
+    return {"recorded": len(labels), **monitor.stats()}
+
 @router.post("/models/retrain")
 async def trigger_model_retrain(
     model_name: str,
@@ -54,3 +99,98 @@ async def trigger_model_retrain(
     except Exception as e:
         logger.error(f"Failed to trigger retrain: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/inference")
+async def get_inference_metrics(registry: ModelRegistry = Depends(get_registry)):
+    """
+    Get micro-batching and inference executor statistics
+    """
+    return registry.stats()
+
+@router.get("/cache")
+async def get_cache_metrics(analysis_cache: AnalysisCache = Depends(get_analysis_cache)):
+    """
+    Get analysis cache hit/miss counters per tier
+    """
+    return analysis_cache.stats()
+
+@router.get("/analysis-store")
+async def get_analysis_store_metrics(store: AnalysisStore = Depends(get_analysis_store)):
+    """
+    Get write-behind buffer and flush counters
+    """
+    return store.stats()
+
+@router.get("/safety-index")
+async def get_safety_index_metrics(
+    safety_index: SafetyIndex = Depends(get_safety_index),
+    deferred: DeferredAnalysis = Depends(get_deferred_analysis)
+):
+    """
+    Get safety index size and hit ratio, and the deferred analysis queue
+    """
+    return {**safety_index.stats(), "deferred_analysis": deferred.stats()}
+
+@router.get("/feed-cache")
+async def get_feed_cache_metrics(
+    feed_cache: FeedCache = Depends(get_feed_cache)
+):
+    """
+    Get per-user feed cache hits and the share of candidate rows reused across requests
+    """
+    if feed_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **feed_cache.stats()}
+
+@router.get("/embeddings")
+async def get_embedding_metrics(
+    embedding_index: EmbeddingIndex = Depends(get_embedding_index),
+    deferred: DeferredEmbedding = Depends(get_deferred_embedding)
+):
+    """
+    Get embedding index size, IVF training state and rows scanned per query, and the embedding queue
+    """
+    if embedding_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **embedding_index.stats(), "deferred_embedding": deferred.stats()}
+
+@router.get("/admission")
+async def get_admission_metrics(
+    controller: AdmissionController = Depends(get_admission_controller)
+):
+    """
+    Get in-flight and queued requests, queue wait and shed counts per analysis endpoint
+    """
+    if controller is None:
+        return {"enabled": False}
+    return {"enabled": True, **controller.stats()}
+
+@router.get("/cascade")
+async def get_cascade_metrics(
+    registry: ModelRegistry = Depends(get_registry),
+    analysis_cache: AnalysisCache = Depends(get_analysis_cache)
+):
+    """
+    Get how many analyses each cascade tier decided and the share that skipped the model
+    """
+    cache_stats = analysis_cache.stats()
+    tiers = dict(registry.content_analyzer.tier_counts)
+    tiers["cache"] = cache_stats["local_hits"] + cache_stats["redis_hits"]
+    total = sum(tiers.values())
+    return {
+        "decided_by": tiers,
+        "total": total,
+        "model_skip_ratio": (total - tiers["model"]) / total if total else 0.0,
+        "deadline_skips": dict(registry.content_analyzer.deadline_skips),
+        "model_failures_total": registry.content_analyzer.model_failures_total,
+        "model_latency_ms": registry.content_analyzer.model_latency_ms
+    }
+
+@router.get("/memory")
+async def get_memory_metrics():
+    """
+    Get unique vs shared resident memory for this worker and its sibling workers
+    """
+    report = worker_memory_report(include_siblings=settings.WORKERS > 1)
+    report["shared_model_weights"] = settings.SHARED_MODEL_WEIGHTS
+    return report
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 import logging
 
 from models.schemas import (
@@ -8,23 +8,44 @@ from models.schemas import (
 )
 from services.recommendation_engine import RecommendationEngine
 from services.privacy_service import PrivacyService
+from services.user_service import UserService
+from api.dependencies import (
+    get_deferred_analysis,
+    get_deferred_embedding,
+    get_embedding_index,
+    get_feed_cache,
+    get_interest_vectors,
+    get_safety_index
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-async def get_recommendation_engine():
-    """Dependency to get recommendation engine"""
-    return RecommendationEngine()
+async def get_recommendation_engine(request: Request):
+    """Dependency to get recommendation engine (backed by the app's safety and embedding indexes)"""
+    return RecommendationEngine(
+        safety_index=get_safety_index(request),
+        deferred_analysis=get_deferred_analysis(request),
+        feed_cache=get_feed_cache(request),
+        embedding_index=get_embedding_index(request),
+        deferred_embedding=get_deferred_embedding(request),
+        interest_vectors=get_interest_vectors(request)
+    )
 
 async def get_privacy_service():
     """Dependency to get privacy service"""
     return PrivacyService()
 
+async def get_user_service():
+    """Dependency to get user service"""
+    return UserService()
+
 @router.post("/feed", response_model=RecommendationResponse)
 async def get_personalized_feed(
     request: RecommendationRequest,
     engine: RecommendationEngine = Depends(get_recommendation_engine),
-    privacy: PrivacyService = Depends(get_privacy_service)
+    privacy: PrivacyService = Depends(get_privacy_service),
+    users: UserService = Depends(get_user_service)
 ):
     """
     Get personalized and filtered content feed
@@ -32,12 +53,14 @@ async def get_personalized_feed(
     try:
         # Anonymize user data for privacy
         anonymized_profile = await privacy.anonymize_user_profile(request.user_id)
+        safety_settings = await users.get_safety_settings(request.user_id)
         
-        # Generate recommendations
+        # Filter and rank the candidate pool
         recommendations = await engine.generate_recommendations(
             anonymized_profile,
             request.content_pool,
-            request.limit
+            request.limit,
+            safety_settings=safety_settings
         )
         
         # Apply fairness checks
@@ -1,15 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 import logging
 
 from models.schemas import UserPreferences
 from services.user_service import UserService
+from api.dependencies import get_feed_cache
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-async def get_user_service():
-    """Dependency to get user service"""
-    return UserService()
+async def get_user_service(request: Request):
+    """Dependency to get user service (invalidating cached feeds on updates)"""
+    return UserService(feed_cache=get_feed_cache(request))
 
 @router.post("/preferences")
 async def update_user_preferences(
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 class Settings(BaseSettings):
     # Service
@@ -7,6 +7,9 @@ class Settings(BaseSettings):
     PORT: int = 8000
     DEBUG: bool = False
     LOG_LEVEL: str = "INFO"
+    METRICS_ENABLED: bool = True  # Prometheus exposition at /metrics
+    WORKERS: int = 1  # gunicorn worker processes (gunicorn.conf.py)
+    SHARED_MODEL_WEIGHTS: bool = False  # load models once pre-fork, share them copy-on-write
     
     # Database
     MONGODB_URI: str
@@ -15,6 +18,9 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str
     REDIS_TTL: int = 3600
+    REDIS_MAX_CONNECTIONS: int = 50
+    CACHE_COMPRESSION_MIN_BYTES: int = 4096
+    CACHE_COMPRESSION_LEVEL: int = 1
     
     # Security
     SECRET_KEY: str
@@ -25,13 +31,123 @@ class Settings(BaseSettings):
     ALLOWED_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:8080"]
     
     # ML Models
-    MODEL_PATH: str = "./models"
+    MODEL_PATH: str = "./models"  # local cache of hub models, filled on first download
+    MODEL_CACHE_ENABLED: bool = True
+    MODEL_BACKGROUND_LOADING: bool = True  # serve /health while models load; /ready gates traffic
+    LAZY_MODELS: List[str] = ["sentiment", "misinformation", "embedding"]  # loaded on first use
     TOXICITY_MODEL: str = "unitary/toxic-bert"
     SENTIMENT_MODEL: str = "cardiffnlp/twitter-roberta-base-sentiment"
     MISINFORMATION_MODEL: str = "roberta-base"
+    EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"  # sentence encoder for interest matching
+    INFERENCE_BACKEND: str = "pytorch"  # pytorch (fp32), int8 (dynamic quantization) or onnx
+    ONNX_MODEL_DIR: str = "./models/onnx"  # written by `python -m ml.models.export_onnx`
+    ONNX_INTRA_OP_THREADS: int = 0  # 0 lets ONNX Runtime decide
+    
+    # Inference batching
+    TOXICITY_BATCHING_ENABLED: bool = True
+    TOXICITY_BATCH_MAX_SIZE: int = 32
+    TOXICITY_BATCH_MAX_WAIT_MS: float = 5.0
+    TOXICITY_BATCH_MAX_QUEUE: int = 512
+    
+    # Token-length bucketing (tokenization stage before each forward pass)
+    TOKEN_BUCKETING_ENABLED: bool = True
+    TOKEN_BATCH_MAX_TOKENS: int = 8192  # padded tokens per forward pass
+    TOKEN_BATCH_MAX_SIZE: int = 64
+    TOKEN_MAX_LENGTH: int = 512  # per sequence, special tokens included
+    TOKEN_WINDOW_STRIDE: int = 128  # overlap between windows of over-long texts
+    TOKEN_MAX_CHUNKS: int = 16  # windows scored per text; 0 = unlimited
+    
+    # Tokenization
+    REQUIRE_FAST_TOKENIZERS: bool = True  # refuse to start on slow Python tokenizers
+    TOKENIZERS_PARALLELISM: bool = True
+    TOKEN_CACHE_MAX_ENTRIES: int = 20000  # token ids cached per tokenizer; 0 disables
+    TOKEN_CACHE_MAX_TEXT_CHARS: int = 4096  # longer texts are tokenized but not cached
+    
+    # Inference executor
+    INFERENCE_WORKERS: int = 1
+    INFERENCE_MAX_PENDING: int = 64
+    INFERENCE_QUEUE_TIMEOUT_MS: float = 100.0  # wait for a free slot; 0 rejects as soon as all are taken
+    TORCH_NUM_THREADS: int = 0  # 0 keeps the torch default
+    
+    # Analysis cache
+    ANALYSIS_MODEL_VERSION: str = "1.1.0"  # bump to invalidate cached analyses
+    ANALYSIS_CACHE_LOCAL_MAX_ENTRIES: int = 10000
+    ANALYSIS_CACHE_LOCAL_TTL: int = 300
+    
+    # Analysis persistence (write-behind to MongoDB)
+    ANALYSIS_STORE_FLUSH_SIZE: int = 500
+    ANALYSIS_STORE_FLUSH_INTERVAL: float = 2.0
+    ANALYSIS_STORE_MAX_PENDING: int = 20000
+    
+    # Admission control for the analysis endpoints
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_MAX_CONCURRENCY: int = 32  # analysis requests running at once, all endpoints
+    ADMISSION_ENDPOINT_LIMITS: Dict[str, int] = {"analyze": 32, "batch-analyze": 4, "batch-analyze-stream": 2}
+    ADMISSION_ENDPOINT_QUEUES: Dict[str, int] = {"analyze": 256, "batch-analyze": 16, "batch-analyze-stream": 4}
+    ADMISSION_ENDPOINT_PRIORITIES: Dict[str, str] = {
+        "analyze": "interactive",
+        "batch-analyze": "batch",
+        "batch-analyze-stream": "batch"
+    }
+    ADMISSION_QUEUE_TIMEOUT_MS: Dict[str, float] = {"interactive": 250.0, "batch": 5000.0}  # per priority class
+    
+    # Request deadlines (/analyze)
+    DEADLINE_HEADER: str = "X-Request-Deadline-Ms"  # remaining client budget in milliseconds
+    DEADLINE_RESERVE_MS: float = 5.0  # kept back for the stages after the model
+    DEADLINE_MODEL_LATENCY_PRIOR_MS: float = 20.0  # model latency assumed before any call is measured
+    
+    # Safety index (per-item decisions served to feed requests without running models)
+    SAFETY_INDEX_MAX_ENTRIES: int = 500_000  # about 10 bytes per entry plus keys
+    SAFETY_INDEX_MISSING: str = "defer"  # unindexed candidates: "defer" (exclude, analyze later) or "exclude"
+    SAFETY_INDEX_DEFER_MAX_PENDING: int = 10_000
+    SAFETY_INDEX_DEFER_BATCH_SIZE: int = 64
+    
+    # Feed filtering and ranking
+    FEED_MIN_SAFETY_SCORE: float = 0.5  # candidates below this safety score are filtered
+    FEED_DEFAULT_AGE_GROUP: str = "teen"  # applied when the user's age group is unknown
+    FEED_SAFETY_WEIGHT: float = 0.5  # rank score = relevance + weights * (safety, interest match)
+    FEED_INTEREST_WEIGHT: float = 0.5
+    FEED_CACHE_ENABLED: bool = True  # per-user materialized feeds; requests process only the delta
+    FEED_CACHE_MAX_ROWS: int = 200_000  # candidate rows across all cached feeds, about 250 bytes each
+    FEED_CACHE_TTL: int = 300
+    
+    # Interest embeddings (candidates ranked by similarity to the user's interests)
+    EMBEDDING_ENABLED: bool = True
+    EMBEDDING_DIM: int = 384  # output size of EMBEDDING_MODEL
+    EMBEDDING_BATCH_SIZE: int = 64  # texts per encoder call
+    EMBEDDING_MAX_PENDING: int = 10_000  # feed candidates queued for embedding
+    EMBEDDING_INDEX_MAX_ENTRIES: int = 100_000  # EMBEDDING_DIM bytes each with int8 storage
+    EMBEDDING_STORAGE: str = "int8"  # int8 (per-row scale) or float32
+    EMBEDDING_IVF_LISTS: int = 256  # coarse clusters, trained once 40 embeddings per list are indexed
+    EMBEDDING_IVF_NPROBE: int = 16  # clusters searched per interest; 0 = exact search
+    EMBEDDING_INTEREST_CACHE_SIZE: int = 10_000  # embedded interest strings
+    EMBEDDING_INTEREST_CACHE_TTL: int = 3600
+    EMBEDDING_LOAD_RETRY_SECONDS: int = 60  # wait after a failed encoder load, doubling per failure up to 1h
+    
+    # Fairness monitoring (online per-group counters over moderation decisions)
+    FAIRNESS_GROUP_FIELD: str = "demographic_group"  # request metadata key naming the group
+    FAIRNESS_LABEL_FIELD: str = "label"  # optional request metadata key with the reviewed ground truth
+    FAIRNESS_BUCKET_SECONDS: int = 300
+    FAIRNESS_BUCKETS: int = 2016  # 7 days of 5-minute buckets
+    FAIRNESS_MAX_GROUPS: int = 64  # further groups are counted as "other"
+    FAIRNESS_MIN_GROUP_SIZE: int = 30  # smaller groups are left out of the gaps
+    FAIRNESS_DEFAULT_RANGE: str = "24h"  # window of /api/metrics/bias and of fairness_metrics snapshots
+    FAIRNESS_TREND_POINTS: int = 12
+    FAIRNESS_PERSIST_INTERVAL: int = 300  # seconds between writes to fairness_counts and fairness_metrics; 0 = disabled
+    FAIRNESS_METRICS_RANGE: str = "1h"  # window of the fairness_gap Prometheus gauge (this process only)
+    
+    # Batch analysis
+    BATCH_ANALYSIS_CONCURRENCY: int = 16
+    STREAM_WINDOW_SIZE: int = 256
+    STREAM_WINDOWS_IN_FLIGHT: int = 2
+    STREAM_WINDOW_MAX_RETRIES: int = 10  # waits for inference capacity per window before it fails
+    STREAM_MAX_LINE_BYTES: int = 1_000_000
     
     # Thresholds
     TOXICITY_THRESHOLD: float = 0.7
+    # Weights of toxicity, severe_toxicity, obscene, threat, insult, identity_attack
+    TOXICITY_CATEGORY_WEIGHTS: List[float] = [0.3, 0.25, 0.15, 0.15, 0.1, 0.05]
+    TOXICITY_SEVERITY_BOUNDS: List[float] = [0.3, 0.6]  # low < 0.3 <= medium < 0.6 <= high
     MISINFORMATION_THRESHOLD: float = 0.6
     NSFW_THRESHOLD: float = 0.5
     
@@ -1,4 +1,5 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from config.settings import settings
 import logging
 
@@ -29,6 +30,50 @@ async def close_mongo_connection():
         mongodb.client.close()
         logger.info("MongoDB connection closed")
 
+# Index definitions for the collections in database/mongodb/collections.md
+INDEXES = {
+    "content_analysis": [
+        IndexModel([("content_id", ASCENDING)], name="content_id_unique", unique=True),
+        IndexModel([("content_hash", ASCENDING)], name="content_hash"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0)
+    ],
+    "user_preferences": [
+        IndexModel([("user_hash", ASCENDING)], name="user_hash_unique", unique=True)
+    ],
+    "fairness_metrics": [
+        IndexModel([("metric_type", ASCENDING), ("timestamp", DESCENDING)], name="metric_type_timestamp"),
+        IndexModel([("demographic_group", ASCENDING), ("timestamp", DESCENDING)], name="group_timestamp"),
+        IndexModel(
+            [("metric_type", ASCENDING), ("demographic_group", ASCENDING), ("timestamp", ASCENDING),
+             ("time_range", ASCENDING), ("model_version", ASCENDING)],
+            name="snapshot_unique",
+            unique=True
+        )
+    ],
+    "fairness_counts": [
+        IndexModel(
+            [("bucket_start", ASCENDING), ("demographic_group", ASCENDING),
+             ("bucket_seconds", ASCENDING), ("model_version", ASCENDING)],
+            name="bucket_group_unique",
+            unique=True
+        ),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0)
+    ],
+    "audit_logs": [
+        IndexModel([("content_id", ASCENDING), ("timestamp", DESCENDING)], name="content_id_timestamp"),
+        IndexModel([("user_hash", ASCENDING), ("timestamp", DESCENDING)], name="user_hash_timestamp")
+    ]
+}
+
+async def ensure_indexes():
+    """Create collection indexes (no-op for indexes that already exist)"""
+    for collection, indexes in INDEXES.items():
+        try:
+            await mongodb.db[collection].create_indexes(indexes)
+        except Exception as e:
+            logger.error(f"Failed to create indexes for {collection}: {e}")
+    logger.info("MongoDB indexes ensured")
+
 def get_database():
     """Get database instance"""
     return mongodb.db
@@ -1,14 +1,19 @@
 import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from contextlib import asynccontextmanager
+from functools import partial
 import logging
 
 from config.settings import settings
-from database.mongodb import connect_to_mongo, close_mongo_connection
+from ml.inference.executor import InferenceSaturatedError
+from services.admission import AdmissionController, AdmissionRejectedError
+from database.mongodb import connect_to_mongo, close_mongo_connection, ensure_indexes
 from api.routes import content, recommendations, user, metrics
+from api.prometheus import setup_metrics
 from utils.logger import setup_logging
+from utils.phase_timer import PhaseTimer
 
 # Setup logging
 setup_logging()
@@ -19,26 +24,96 @@ async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     # Startup
     logger.info("Starting Content Filtration Service...")
-    await connect_to_mongo()
-    logger.info("Connected to MongoDB")
+    app.state.startup = startup = PhaseTimer()
     
-    # Load ML models
-    from ml.models.model_loader import ModelLoader
-    app.state.model_loader = ModelLoader()
-    await app.state.model_loader.load_models()
-    logger.info("ML models loaded successfully")
+    # Admission control in front of the analysis endpoints
+    app.state.admission = (
+        AdmissionController.from_settings() if settings.ADMISSION_CONTROL_ENABLED else None
+    )
+    
+    # Load ML models and build the shared analyzers once. In the background
+    # by default: /health answers right away and /ready flips when loaded.
+    from ml.models.model_registry import ModelRegistry
+    from ml.models.shared_weights import preloaded_loader
+    app.state.registry = ModelRegistry(model_loader=preloaded_loader())
+    app.state.model_loader = app.state.registry.model_loader
+    if settings.MODEL_BACKGROUND_LOADING:
+        app.state.registry.start_in_background()
+    
+    with startup.phase("mongodb"):
+        await connect_to_mongo()
+        logger.info("Connected to MongoDB")
+        await ensure_indexes()
+    
+    if not settings.MODEL_BACKGROUND_LOADING:
+        with startup.phase("models"):
+            await app.state.registry.start()
+    
+    # Redis connection pool shared by all requests in this worker
+    from services.cache_service import CacheService
+    app.state.cache = CacheService()
+    with startup.phase("redis"):
+        await app.state.cache.connect()
+    
+    # Content-addressed analysis cache in front of Redis
+    from services.analysis_cache import AnalysisCache
+    app.state.analysis_cache = AnalysisCache(app.state.cache)
+    
+    # Write-behind persistence of analysis results to MongoDB
+    from services.analysis_store import AnalysisStore
+    app.state.analysis_store = AnalysisStore(app.state.cache)
+    await app.state.analysis_store.start()
+    
+    # Safety decisions for feed requests, filled by the analysis path; unindexed
+    # candidates are analyzed in the background
+    from services.safety_index import DeferredAnalysis, SafetyIndex
+    app.state.safety_index = SafetyIndex()
+    app.state.deferred_analysis = DeferredAnalysis(partial(content.analyze_in_background, app.state))
+    await app.state.deferred_analysis.start()
+    
+    # Per-user materialized feeds, invalidated by preference updates
+    from services.feed_cache import FeedCache
+    app.state.feed_cache = FeedCache() if settings.FEED_CACHE_ENABLED else None
+    
+    # Content and interest embeddings for interest ranking; the sentence
+    # encoder loads on first use and candidates are embedded in the background
+    app.state.embedding_index = app.state.deferred_embedding = app.state.interest_vectors = None
+    if settings.EMBEDDING_ENABLED:
+        from services.embedding_index import DeferredEmbedding, EmbeddingIndex, InterestVectors
+        app.state.embedding_index = EmbeddingIndex()
+        app.state.deferred_embedding = DeferredEmbedding(
+            app.state.registry.embed,
+            app.state.embedding_index,
+            app.state.safety_index
+        )
+        app.state.interest_vectors = InterestVectors(app.state.registry.embed)
+        await app.state.deferred_embedding.start()
+    
+    # Per-group fairness counters fed by the analysis endpoints, added to the
+    # shared fairness_counts collection
+    from services.fairness_service import FairnessMonitor
+    app.state.fairness = FairnessMonitor()
+    await app.state.fairness.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down Content Filtration Service...")
+    await app.state.fairness.stop()
+    if app.state.deferred_embedding is not None:
+        await app.state.deferred_embedding.stop()
+    await app.state.deferred_analysis.stop()
+    await app.state.analysis_store.stop()
+    await app.state.registry.close()
+    await app.state.cache.close()
     await close_mongo_connection()
 
 app = FastAPI(
     title="SafeFeed Content Filtration Service",
     description="Privacy-first content filtration and recommendation system",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -50,21 +125,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Health check
+# Prometheus exposition at /metrics (request latency, pipeline stages, caches, queues)
+if settings.METRICS_ENABLED:
+    setup_metrics(app)
+
+# Health check (liveness): the process is up and the event loop responsive
 @app.get("/health")
-async def health_check():
+async def health_check(request: Request):
+    registry = getattr(request.app.state, "registry", None)
+    if registry is not None and registry.startup_error is not None:
+        # Model loading failed for good; let the orchestrator restart the pod
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unhealthy", "error": registry.startup_error}
+        )
     return {
         "status": "healthy",
         "service": "content-filtration-service",
         "version": "1.0.0"
     }
 
+# Readiness: models loaded and analyzers built
+@app.get("/ready")
+async def readiness_check(request: Request):
+    registry = getattr(request.app.state, "registry", None)
+    startup = getattr(request.app.state, "startup", None)
+    readiness = registry.readiness() if registry is not None else {"status": "loading"}
+    readiness["startup"] = startup.snapshot() if startup is not None else None
+    if readiness["status"] != "ready":
+        return JSONResponse(status_code=503, content=readiness, headers={"Retry-After": "5"})
+    return readiness
+
 # Include routers
 app.include_router(content.router, prefix="/api/content", tags=["Content Analysis"])
 app.include_router(recommendations.router, prefix="/api/recommendations", tags=["Recommendations"])
 app.include_router(user.router, prefix="/api/user", tags=["User Settings"])
 app.include_router(metrics.router, prefix="/api/metrics", tags=["Metrics"])
 
+# Inference backpressure: fail fast instead of queueing without bound
+@app.exception_handler(InferenceSaturatedError)
+async def inference_saturated_handler(request: Request, exc: InferenceSaturatedError):
+    logger.warning(f"Inference saturated: {str(exc)}")
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Service overloaded", "detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+# Admission control: shed load early with a hint for when to come back
+@app.exception_handler(AdmissionRejectedError)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejectedError):
+    logger.warning(f"Request shed: {str(exc)}")
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={
+            "error": "Too many requests" if exc.status_code == 429 else "Service overloaded",
+            "detail": str(exc)
+        },
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -1,10 +1,34 @@
 import logging
 import re
-from typing import List
+from bisect import bisect_right
+from typing import Dict, List, Optional, Pattern
 from models.schemas import AgeAppropriatenessScore, AgeGroup
 
 logger = logging.getLogger(__name__)
 
+# Keywords for different age ratings
+MATURE_PATTERNS = {
+    'explicit_violence': r'\b(kill|murder|blood|gore|torture)\w*\b',
+    'sexual_content': r'\b(sex|sexual|nude|porn)\w*\b',
+    'substance_abuse': r'\b(drug|alcohol|cocaine|marijuana)\w*\b',
+    'profanity': r'\b(fuck|shit|damn|hell|bitch)\w*\b'
+}
+
+def compile_category_matcher(patterns: Dict[str, str]) -> Pattern:
+    """Combine per-category patterns into one case-insensitive alternation
+    
+    Each category becomes a named group, so a single `finditer` pass reports
+    which category every match belongs to via `match.lastgroup`. If two
+    categories could match at the same position the first one listed wins.
+    """
+    return re.compile(
+        "|".join(f"(?P<{category}>{pattern})" for category, pattern in patterns.items()),
+        re.IGNORECASE
+    )
+
+# Separator for batch scans; a non-word character keeps \b boundaries intact
+_BATCH_SEPARATOR = "\n"
+
 class AgeAppropriatenessAnalyzer:
     """Analyze content for age appropriateness"""
     
@@ -15,66 +39,114 @@ class AgeAppropriatenessAnalyzer:
             'profanity', 'weapon', 'gore', 'explicit'
         ]
         
-        # Keywords for different age ratings
-        self.mature_patterns = {
-            'explicit_violence': r'\b(kill|murder|blood|gore|torture)\w*\b',
-            'sexual_content': r'\b(sex|sexual|nude|porn)\w*\b',
-            'substance_abuse': r'\b(drug|alcohol|cocaine|marijuana)\w*\b',
-            'profanity': r'\b(fuck|shit|damn|hell|bitch)\w*\b'
-        }
+        # Keywords for different age ratings, matched in a single pass
+        self.mature_patterns = dict(MATURE_PATTERNS)
+        self.matcher = compile_category_matcher(self.mature_patterns)
+    
+    def count_categories(self, text: str) -> Dict[str, int]:
+        """Count mature-pattern matches per category in one scan"""
+        counts: Dict[str, int] = {}
+        for match in self.matcher.finditer(text):
+            category = match.lastgroup
+            counts[category] = counts.get(category, 0) + 1
+        return counts
     
-    async def analyze(self, text: str, toxicity_score: float) -> AgeAppropriatenessScore:
+    def count_categories_batch(self, texts: List[str]) -> List[Dict[str, int]]:
+        """Count matches for many texts with one scan over their concatenation"""
+        counts: List[Dict[str, int]] = [{} for _ in texts]
+        if not texts:
+            return counts
+        
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + len(_BATCH_SEPARATOR)
+        
+        for match in self.matcher.finditer(_BATCH_SEPARATOR.join(texts)):
+            item = counts[bisect_right(starts, match.start()) - 1]
+            category = match.lastgroup
+            item[category] = item.get(category, 0) + 1
+        return counts
+    
+    async def analyze(
+        self,
+        text: str,
+        toxicity_score: float,
+        mature_flags: Optional[Dict[str, int]] = None
+    ) -> AgeAppropriatenessScore:
         """Analyze content for age appropriateness"""
         try:
-            text_lower = text.lower()
-            reasons = []
-            
             # Check for mature content patterns
-            mature_flags = {}
-            for category, pattern in self.mature_patterns.items():
-                matches = re.findall(pattern, text_lower, re.IGNORECASE)
-                if matches:
-                    mature_flags[category] = len(matches)
-                    reasons.append(f"Contains {category.replace('_', ' ')}")
-            
-            # Determine minimum age based on content
-            min_age = 0
-            
-            if toxicity_score > 0.7 or mature_flags.get('explicit_violence', 0) > 2:
-                min_age = 18
-                content_rating = "R"
-            elif toxicity_score > 0.5 or any(mature_flags.values()):
-                min_age = 13
-                content_rating = "PG-13"
-            elif toxicity_score > 0.3:
-                min_age = 7
-                content_rating = "PG"
-            else:
-                min_age = 0
-                content_rating = "G"
-            
-            # Determine recommended age groups
-            recommended_age_groups = []
-            if min_age <= 12:
-                recommended_age_groups.extend([AgeGroup.CHILDREN, AgeGroup.TEEN, AgeGroup.YOUNG_ADULT, AgeGroup.ADULT, AgeGroup.SENIOR])
-            elif min_age <= 17:
-                recommended_age_groups.extend([AgeGroup.TEEN, AgeGroup.YOUNG_ADULT, AgeGroup.ADULT, AgeGroup.SENIOR])
-            else:
-                recommended_age_groups.extend([AgeGroup.YOUNG_ADULT, AgeGroup.ADULT, AgeGroup.SENIOR])
-            
-            return AgeAppropriatenessScore(
-                min_age=min_age,
-                recommended_age_groups=recommended_age_groups,
-                content_rating=content_rating,
-                reasons=reasons
-            )
-            
+            if mature_flags is None:
+                mature_flags = self.count_categories(text)
+            return self._score(mature_flags, toxicity_score)
+        
         except Exception as e:
             logger.error(f"Age appropriateness analysis failed: {e}")
-            # Return safe default
-            return AgeAppropriatenessScore(
-                min_age=0,
-                recommended_age_groups=[AgeGroup.CHILDREN, AgeGroup.TEEN, AgeGroup.YOUNG_ADULT, AgeGroup.ADULT, AgeGroup.SENIOR],
-                content_rating="G",
-                reasons=[]
-            )
+            return self._default_score()
+    
+    async def analyze_batch(
+        self,
+        texts: List[str],
+        toxicity_scores: List[float]
+    ) -> List[AgeAppropriatenessScore]:
+        """Analyze several texts with a single pattern scan"""
+        try:
+            all_flags = self.count_categories_batch(texts)
+        except Exception as e:
+            logger.error(f"Batch age appropriateness analysis failed: {e}")
+            return [self._default_score() for _ in texts]
+        return [
+            self._score(flags, score)
+            for flags, score in zip(all_flags, toxicity_scores)
+        ]
+    
+    def _score(self, mature_flags: Dict[str, int], toxicity_score: float) -> AgeAppropriatenessScore:
+        """Derive rating and age groups from category counts"""
+        reasons = [
+            f"Contains {category.replace('_', ' ')}"
+            for category in self.mature_patterns
+            if mature_flags.get(category)
+        ]
+        
+        # Determine minimum age based on content
+        min_age = 0
+        
+        if toxicity_score > 0.7 or mature_flags.get('explicit_violence', 0) > 2:
+            min_age = 18
+            content_rating = "R"
+        elif toxicity_score > 0.5 or any(mature_flags.values()):
+            min_age = 13
+            content_rating = "PG-13"
+        elif toxicity_score > 0.3:
+            min_age = 7
+            content_rating = "PG"
+        else:
+            min_age = 0
+            content_rating = "G"
+        
+        # Determine recommended age groups
+        recommended_age_groups = []
+        if min_age <= 12:
+            recommended_age_groups.extend([AgeGroup.CHILDREN, AgeGroup.TEEN, AgeGroup.YOUNG_ADULT, AgeGroup.ADULT, AgeGroup.SENIOR])
+        elif min_age <= 17:
+            recommended_age_groups.extend([AgeGroup.TEEN, AgeGroup.YOUNG_ADULT, AgeGroup.ADULT, AgeGroup.SENIOR])
+        else:
+            recommended_age_groups.extend([AgeGroup.YOUNG_ADULT, AgeGroup.ADULT, AgeGroup.SENIOR])
+        
+        return AgeAppropriatenessScore(
+            min_age=min_age,
+            recommended_age_groups=recommended_age_groups,
+            content_rating=content_rating,
+            reasons=reasons
+        )
+    
+    def _default_score(self) -> AgeAppropriatenessScore:
+        """Safe default when analysis fails"""
+        return AgeAppropriatenessScore(
+            min_age=0,
+            recommended_age_groups=[AgeGroup.CHILDREN, AgeGroup.TEEN, AgeGroup.YOUNG_ADULT, AgeGroup.ADULT, AgeGroup.SENIOR],
+            content_rating="G",
+            reasons=[]
+        )
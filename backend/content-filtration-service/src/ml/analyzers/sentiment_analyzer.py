@@ -0,0 +1,80 @@
+import logging
+from typing import Dict, List, Optional
+import numpy as np
+import torch
+
+from config.settings import settings
+from ml.inference.executor import InferenceExecutor, InferenceSaturatedError
+from ml.inference.sequence_batcher import SequenceBatcher
+
+logger = logging.getLogger(__name__)
+
+# Output order of cardiffnlp/twitter-roberta-base-sentiment
+SENTIMENT_LABELS = ["negative", "neutral", "positive"]
+
+class SentimentAnalyzer:
+    """Analyze content sentiment"""
+    
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        device: str = "cpu",
+        executor: Optional[InferenceExecutor] = None
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.executor = executor
+        
+        # Long posts are scored per window and averaged by window length
+        self.sequence_batcher: Optional[SequenceBatcher] = None
+        if settings.TOKEN_BUCKETING_ENABLED:
+            self.sequence_batcher = SequenceBatcher(
+                tokenizer,
+                self.predict_encoded,
+                aggregate="mean",
+                name="sentiment"
+            )
+    
+    def predict_encoded(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        """Class probabilities for already tokenized, padded inputs"""
+        tensors = {name: torch.as_tensor(value).to(self.device) for name, value in inputs.items()}
+        logits = self.model(**tensors).logits
+        return torch.softmax(logits, dim=-1).cpu().numpy()
+    
+    def predict_batch(self, texts: List[str]) -> List[Dict[str, float]]:
+        """Run one forward pass over a list of texts"""
+        if self.sequence_batcher is not None:
+            return [
+                dict(zip(SENTIMENT_LABELS, row.tolist()))
+                for row in self.sequence_batcher.run(texts)
+            ]
+        
+        inputs = self.tokenizer(
+            list(texts),
+            return_tensors="pt",
+            truncation=True,
+            padding=True
+        ).to(self.device)
+        logits = self.model(**inputs).logits
+        probabilities = torch.softmax(logits, dim=-1).cpu().tolist()
+        return [dict(zip(SENTIMENT_LABELS, row)) for row in probabilities]
+    
+    async def analyze(self, text: str) -> Dict[str, float]:
+        """Analyze sentiment of a single text"""
+        return (await self.analyze_batch([text]))[0]
+    
+    async def analyze_batch(self, texts: List[str]) -> List[Dict[str, float]]:
+        """Analyze sentiment of several texts"""
+        if not texts:
+            return []
+        try:
+            if self.executor is not None:
+                return await self.executor.run(self.predict_batch, texts)
+            return self.predict_batch(texts)
+        except InferenceSaturatedError:
+            raise
+        except Exception as e:
+            logger.error(f"Sentiment analysis failed: {e}")
+            return [{label: 0.0 for label in SENTIMENT_LABELS} for _ in texts]
@@ -0,0 +1,44 @@
+import logging
+from typing import List, Optional
+import numpy as np
+
+from config.settings import settings
+from ml.inference.executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+class TextEncoder:
+    """Unit-length sentence embeddings from a sentence-transformers model"""
+    
+    def __init__(
+        self,
+        model,
+        executor: Optional[InferenceExecutor] = None,
+        batch_size: int = None
+    ):
+        self.model = model
+        self.executor = executor
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.dim = model.get_sentence_embedding_dimension()
+        if self.dim != settings.EMBEDDING_DIM:
+            raise ValueError(
+                f"{settings.EMBEDDING_MODEL} produces {self.dim}-d embeddings; set EMBEDDING_DIM={self.dim}"
+            )
+    
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dim) float32 matrix, one forward pass per `batch_size` texts"""
+        return self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+    
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts off the event loop"""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if self.executor is not None:
+            return await self.executor.run(self.encode_batch, texts)
+        return self.encode_batch(texts)
@@ -1,66 +1,186 @@
 import logging
-from typing import Dict
+from bisect import bisect_right
+from typing import Dict, List, Optional
+import numpy as np
 from models.schemas import ToxicityScore, ToxicityCategory
 from config.settings import settings
+from ml.inference.executor import InferenceExecutor, InferenceSaturatedError
+from ml.inference.micro_batcher import MicroBatcher
+from ml.inference.sequence_batcher import SequenceBatcher
 
 logger = logging.getLogger(__name__)
 
+# Detoxify 'original' output heads, in the order we report them
+TOXICITY_CATEGORIES = [
+    "toxicity",
+    "severe_toxicity",
+    "obscene",
+    "threat",
+    "insult",
+    "identity_attack"
+]
+
+SEVERITY_LEVELS = ("low", "medium", "high")
+
+def severity_for(overall_score: float) -> str:
+    """Map an overall toxicity score to a severity bucket"""
+    return SEVERITY_LEVELS[bisect_right(settings.TOXICITY_SEVERITY_BOUNDS, overall_score)]
+
+class ToxicityBatch:
+    """Columnar toxicity scores for a batch of texts
+    
+    Holds the (n, categories) score matrix and the derived overall scores,
+    flags and severity codes as NumPy arrays; `score(i)` builds the Pydantic
+    `ToxicityScore` only when a response needs it.
+    """
+    
+    __slots__ = ("categories", "overall", "is_toxic", "severity")
+    
+    def __init__(
+        self,
+        categories: np.ndarray,
+        overall: np.ndarray,
+        is_toxic: np.ndarray,
+        severity: np.ndarray
+    ):
+        self.categories = categories
+        self.overall = overall
+        self.is_toxic = is_toxic
+        self.severity = severity
+    
+    def __len__(self) -> int:
+        return len(self.overall)
+    
+    def score(self, index: int) -> ToxicityScore:
+        return ToxicityScore(
+            overall_score=float(self.overall[index]),
+            categories=dict(zip(TOXICITY_CATEGORIES, self.categories[index].tolist())),
+            is_toxic=bool(self.is_toxic[index]),
+            severity=SEVERITY_LEVELS[self.severity[index]]
+        )
+    
+    def scores(self) -> List[ToxicityScore]:
+        return [self.score(index) for index in range(len(self))]
+
 class ToxicityAnalyzer:
     """Analyze content for toxic behavior"""
     
-    def __init__(self, model):
+    def __init__(
+        self,
+        model,
+        batcher: Optional[MicroBatcher] = None,
+        executor: Optional[InferenceExecutor] = None
+    ):
         self.model = model
         self.threshold = settings.TOXICITY_THRESHOLD
+        self.weights = np.asarray(settings.TOXICITY_CATEGORY_WEIGHTS, dtype=np.float64)
+        self.severity_bounds = np.asarray(settings.TOXICITY_SEVERITY_BOUNDS, dtype=np.float64)
+        if self.weights.shape != (len(TOXICITY_CATEGORIES),):
+            raise ValueError(
+                f"TOXICITY_CATEGORY_WEIGHTS needs one weight per category {TOXICITY_CATEGORIES}"
+            )
+        self.batcher = batcher
+        self.executor = executor
+        
+        # Length-bucketed, token-budgeted forward passes when the model
+        # accepts pre-tokenized input; chunk scores fold back by max.
+        self.sequence_batcher: Optional[SequenceBatcher] = None
+        if settings.TOKEN_BUCKETING_ENABLED and hasattr(model, "predict_encoded"):
+            self.sequence_batcher = SequenceBatcher(
+                model.tokenizer,
+                model.predict_encoded,
+                aggregate="max",
+                name="toxicity"
+            )
+            self._category_columns = [model.class_names.index(c) for c in TOXICITY_CATEGORIES]
+    
+    def enable_batching(
+        self,
+        max_batch_size: int = None,
+        max_wait_ms: float = None
+    ) -> MicroBatcher:
+        """Route single-item analysis through a shared micro-batcher"""
+        self.batcher = MicroBatcher(
+            self.predict_rows_async,
+            max_batch_size=max_batch_size or settings.TOXICITY_BATCH_MAX_SIZE,
+            max_wait_ms=settings.TOXICITY_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms,
+            max_queue_size=settings.TOXICITY_BATCH_MAX_QUEUE,
+            max_concurrent_batches=self.executor.max_workers if self.executor else 1,
+            name="toxicity"
+        )
+        return self.batcher
     
-    async def analyze(self, text: str) -> ToxicityScore:
-        """Analyze text for toxicity"""
+    def predict_matrix(self, texts: List[str]) -> np.ndarray:
+        """Run the model once over a list of texts: (n, categories) scores"""
+        if self.sequence_batcher is not None:
+            rows = self.sequence_batcher.run(texts)
+            return np.stack(rows)[:, self._category_columns].astype(np.float64)
+        
+        results = self.model.predict(list(texts))
+        return np.column_stack([
+            np.asarray(results[category], dtype=np.float64) for category in TOXICITY_CATEGORIES
+        ]).reshape(len(texts), len(TOXICITY_CATEGORIES))
+    
+    def predict_batch(self, texts: List[str]) -> List[Dict[str, float]]:
+        """Per-text category scores as dicts"""
+        return [
+            dict(zip(TOXICITY_CATEGORIES, row))
+            for row in self.predict_matrix(texts).tolist()
+        ]
+    
+    async def predict_matrix_async(self, texts: List[str]) -> np.ndarray:
+        """Matrix prediction, off the event loop when an executor is configured"""
+        if self.executor is not None:
+            return await self.executor.run(self.predict_matrix, texts)
+        return self.predict_matrix(texts)
+    
+    async def predict_rows_async(self, texts: List[str]) -> List[np.ndarray]:
+        """Micro-batcher entry point: one score row per submitted text"""
+        return list(await self.predict_matrix_async(texts))
+    
+    def score_matrix(self, matrix: np.ndarray) -> ToxicityBatch:
+        """Overall score, toxic flag and severity for every row in one shot"""
+        overall = np.clip(matrix @ self.weights, 0.0, 1.0)
+        return ToxicityBatch(
+            matrix,
+            overall,
+            overall > self.threshold,
+            np.searchsorted(self.severity_bounds, overall, side="right")
+        )
+    
+    async def analyze(self, text: str) -> Optional[ToxicityScore]:
+        """Analyze text for toxicity; None when the model failed (never a made-up score)"""
         try:
-            # Use Detoxify model
-            results = self.model.predict(text)
-            
-            # Extract scores
-            categories = {
-                "toxicity": float(results['toxicity']),
-                "severe_toxicity": float(results['severe_toxicity']),
-                "obscene": float(results['obscene']),
-                "threat": float(results['threat']),
-                "insult": float(results['insult']),
-                "identity_attack": float(results['identity_attack'])
-            }
-            
-            # Calculate overall score (weighted average)
-            overall_score = (
-                categories['toxicity'] * 0.3 +
-                categories['severe_toxicity'] * 0.25 +
-                categories['obscene'] * 0.15 +
-                categories['threat'] * 0.15 +
-                categories['insult'] * 0.1 +
-                categories['identity_attack'] * 0.05
-            )
-            
-            is_toxic = overall_score > self.threshold
-            
-            # Determine severity
-            if overall_score < 0.3:
-                severity = "low"
-            elif overall_score < 0.6:
-                severity = "medium"
+            if self.batcher is not None:
+                row = await self.batcher.submit(text)
             else:
-                severity = "high"
-            
-            return ToxicityScore(
-                overall_score=overall_score,
-                categories=categories,
-                is_toxic=is_toxic,
-                severity=severity
-            )
-            
+                row = (await self.predict_matrix_async([text]))[0]
+            return self.score_matrix(row[np.newaxis, :]).score(0)
+        
+        except InferenceSaturatedError:
+            # Surface backpressure to the caller instead of a fake "safe" score
+            raise
         except Exception as e:
             logger.error(f"Toxicity analysis failed: {e}")
-            # Return safe default
-            return ToxicityScore(
-                overall_score=0.0,
-                categories={},
-                is_toxic=False,
-                severity="low"
-            )
+            return None
+    
+    async def score_batch(self, texts: List[str]) -> ToxicityBatch:
+        """Analyze several texts with a single model call, keeping scores columnar
+        
+        Model failures raise: callers turn them into per-item errors rather
+        than serving made-up scores.
+        """
+        if not texts:
+            return self.score_matrix(np.zeros((0, len(TOXICITY_CATEGORIES))))
+        try:
+            return self.score_matrix(await self.predict_matrix_async(texts))
+        except InferenceSaturatedError:
+            raise
+        except Exception as e:
+            logger.error(f"Batch toxicity analysis failed: {e}")
+            raise
+    
+    async def analyze_batch(self, texts: List[str]) -> List[ToxicityScore]:
+        """Analyze several texts with a single model call"""
+        return (await self.score_batch(texts)).scores()
+
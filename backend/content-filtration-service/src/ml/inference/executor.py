@@ -0,0 +1,178 @@
+import asyncio
+import functools
+import logging
+import math
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import torch
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class InferenceSaturatedError(RuntimeError):
+    """Raised when the inference pool cannot accept more work"""
+    
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _run_without_grad(fn: Callable, *args, **kwargs):
+    # Grad mode is thread-local in torch, so it has to be set in the worker
+    with torch.inference_mode():
+        return fn(*args, **kwargs)
+
+class InferenceExecutor:
+    """Bounded thread pool for synchronous model forward passes
+    
+    Torch releases the GIL inside its kernels, so a small thread pool keeps
+    the event loop (and `/health`) responsive while models run. Admission is
+    bounded by `max_workers + max_pending`; callers that cannot get a slot
+    within `queue_timeout_ms` get an `InferenceSaturatedError` instead of
+    queueing without limit (with 0, as soon as every slot is taken). A slot
+    is held until the call finishes on its worker, even if the caller
+    stopped waiting for it.
+    """
+    
+    def __init__(
+        self,
+        max_workers: int = 1,
+        max_pending: int = 64,
+        queue_timeout_ms: float = 100.0,
+        torch_threads: int = 0
+    ):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(0, max_pending)
+        self.queue_timeout = max(0.0, queue_timeout_ms) / 1000.0
+        
+        if torch_threads > 0:
+            # Keep workers * intra-op threads within the pod CPU limit
+            torch.set_num_threads(torch_threads)
+        self.torch_threads = torch.get_num_threads()
+        
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="inference"
+        )
+        self._slots: Optional[asyncio.Semaphore] = None
+        
+        self.in_flight = 0
+        self.completed_total = 0
+        self.rejected_total = 0
+        self.failed_total = 0
+        
+        logger.info(
+            f"Inference executor ready (workers={self.max_workers}, "
+            f"max_pending={self.max_pending}, torch_threads={self.torch_threads})"
+        )
+    
+    @classmethod
+    def from_settings(cls) -> "InferenceExecutor":
+        return cls(
+            max_workers=settings.INFERENCE_WORKERS,
+            max_pending=settings.INFERENCE_MAX_PENDING,
+            queue_timeout_ms=settings.INFERENCE_QUEUE_TIMEOUT_MS,
+            torch_threads=settings.TORCH_NUM_THREADS
+        )
+    
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_pending
+    
+    @property
+    def queue_depth(self) -> int:
+        """Calls admitted but not yet running on a worker"""
+        return max(0, self.in_flight - self.max_workers)
+    
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking inference call on the pool"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.capacity)
+        
+        if self.queue_timeout == 0:
+            # Fail fast: never wait for a slot
+            if self._slots.locked():
+                self._reject()
+            await self._slots.acquire()
+        else:
+            await self._acquire()
+        
+        self.in_flight += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._pool.submit(functools.partial(_run_without_grad, fn, *args, **kwargs))
+        except BaseException:
+            self._release(None)
+            raise
+        # Released when the worker is done, not when this caller is: a
+        # cancelled caller leaves the call running on its thread
+        future.add_done_callback(lambda future: self._call_soon(loop, self._release, future))
+        return await asyncio.wrap_future(future)
+    
+    async def _acquire(self):
+        """Wait up to `queue_timeout` for a slot, rejecting the call after that
+        
+        `wait_for(acquire(), timeout)` can time out (or be cancelled) after
+        the semaphore was already granted and lose the slot, so the acquire
+        runs as its own task: if it is given up on, a slot it still obtains
+        is handed straight back.
+        """
+        acquire = asyncio.ensure_future(self._slots.acquire())
+        try:
+            done, _ = await asyncio.wait({acquire}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(acquire)
+            raise
+        if not done:
+            self._abandon(acquire)
+            self._reject()
+    
+    def _abandon(self, acquire: asyncio.Future):
+        acquire.cancel()
+        acquire.add_done_callback(self._release_if_acquired)
+    
+    def _release_if_acquired(self, acquire: asyncio.Future):
+        if not acquire.cancelled() and acquire.exception() is None:
+            self._slots.release()
+    
+    @staticmethod
+    def _call_soon(loop: asyncio.AbstractEventLoop, callback: Callable, *args):
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # Event loop already closed (shutdown)
+            pass
+    
+    def _release(self, future: Optional[Future]):
+        self.in_flight -= 1
+        self._slots.release()
+        if future is None or future.cancelled():
+            return
+        if future.exception() is None:
+            self.completed_total += 1
+        else:
+            self.failed_total += 1
+    
+    def _reject(self):
+        self.rejected_total += 1
+        raise InferenceSaturatedError(
+            f"Inference pool saturated ({self.in_flight}/{self.capacity} slots in use)",
+            retry_after=max(1, math.ceil(self.queue_timeout))
+        )
+    
+    def shutdown(self):
+        """Stop accepting work and wait for running inference to finish"""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "torch_threads": self.torch_threads,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed_total": self.completed_total,
+            "failed_total": self.failed_total,
+            "rejected_total": self.rejected_total
+        }
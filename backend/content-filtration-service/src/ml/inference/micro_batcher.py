@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ml.inference.executor import InferenceSaturatedError
+from utils.histogram import BucketHistogram
+
+logger = logging.getLogger(__name__)
+
+BatchFn = Callable[[List[Any]], Awaitable[List[Any]]]
+
+class MicroBatcher:
+    """Coalesce concurrent single-item requests into batched model calls
+    
+    Callers `await submit(item)` and get back their own result. A background
+    worker collects pending items until either `max_batch_size` items are
+    queued or the oldest item has waited `max_wait_ms`, then invokes
+    `batch_fn` once for the whole batch. At most `max_concurrent_batches`
+    batches are in flight; when `max_queue_size` items are already waiting,
+    new submissions are rejected with `InferenceSaturatedError`.
+    """
+    
+    def __init__(
+        self,
+        batch_fn: BatchFn,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_queue_size: int = 0,
+        max_concurrent_batches: int = 1,
+        name: str = "batcher"
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue_size = max(0, max_queue_size)
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.name = name
+        
+        self._pending: List[Tuple[Any, asyncio.Future, float]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._batch_slots: Optional[asyncio.Semaphore] = None
+        self._dispatches = set()
+        
+        # Tuning telemetry
+        self.batches_total = 0
+        self.items_total = 0
+        self.errors_total = 0
+        self.rejected_total = 0
+        self.batch_sizes = BucketHistogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.queue_depths = BucketHistogram([0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512])
+        self.queue_wait_ms = BucketHistogram([0.5, 1, 2, 5, 10, 25, 50, 100, 250])
+    
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+    
+    async def start(self):
+        """Start the background batching worker"""
+        if self._worker is None:
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._batch_slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = asyncio.create_task(self._run(), name=f"{self.name}-micro-batcher")
+            logger.info(
+                f"Started micro-batcher '{self.name}' "
+                f"(max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait * 1000:g})"
+            )
+    
+    async def stop(self):
+        """Stop the worker and fail anything still queued"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches, return_exceptions=True)
+        
+        pending, self._pending = self._pending, []
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError(f"Micro-batcher '{self.name}' stopped"))
+    
+    async def submit(self, item: Any) -> Any:
+        """Queue a single item and wait for its result"""
+        if self._worker is None:
+            await self.start()
+        
+        if self.max_queue_size and len(self._pending) >= self.max_queue_size:
+            self.rejected_total += 1
+            raise InferenceSaturatedError(
+                f"Micro-batcher '{self.name}' queue is full ({len(self._pending)} items)"
+            )
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        self._wakeup.set()
+        return await future
+    
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Items keep accumulating while all dispatch slots are busy
+            await self._batch_slots.acquire()
+            
+            # Give concurrent callers a chance to join the batch, bounded by
+            # the wait budget of the oldest queued item.
+            if len(self._pending) < self.max_batch_size and self.max_wait > 0:
+                waited = time.perf_counter() - self._pending[0][2]
+                remaining = self.max_wait - waited
+                if remaining > 0:
+                    try:
+                        await asyncio.wait_for(self._full.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            
+            self.queue_depths.observe(len(self._pending))
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            
+            if not self._pending:
+                self._wakeup.clear()
+            if len(self._pending) < self.max_batch_size:
+                self._full.clear()
+            
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatch_done)
+    
+    def _dispatch_done(self, task: asyncio.Task):
+        self._dispatches.discard(task)
+        self._batch_slots.release()
+    
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        # Callers that gave up (cancelled/timed out) don't need inference
+        live = [entry for entry in batch if not entry[1].done()]
+        if not live:
+            return
+        
+        now = time.perf_counter()
+        for _, _, enqueued_at in live:
+            self.queue_wait_ms.observe((now - enqueued_at) * 1000.0)
+        self.batch_sizes.observe(len(live))
+        self.batches_total += 1
+        self.items_total += len(live)
+        
+        try:
+            results = await self.batch_fn([item for item, _, _ in live])
+            if len(results) != len(live):
+                raise RuntimeError(
+                    f"Batch function returned {len(results)} results for {len(live)} items"
+                )
+        except Exception as e:
+            self.errors_total += 1
+            logger.error(f"Micro-batch '{self.name}' failed: {e}")
+            for _, future, _ in live:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future, _), result in zip(live, results):
+            if not future.done():
+                future.set_result(result)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of queue and batch-size statistics"""
+        return {
+            "name": self.name,
+            "running": self._worker is not None,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self.queue_depth,
+            "batches_total": self.batches_total,
+            "items_total": self.items_total,
+            "errors_total": self.errors_total,
+            "rejected_total": self.rejected_total,
+            "batches_in_flight": len(self._dispatches),
+            "avg_batch_size": (self.items_total / self.batches_total) if self.batches_total else 0.0,
+            "batch_size_histogram": self.batch_sizes.snapshot(),
+            "queue_depth_histogram": self.queue_depths.snapshot(),
+            "queue_wait_ms_histogram": self.queue_wait_ms.snapshot()
+        }
@@ -0,0 +1,203 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from ml.inference.token_cache import TokenCache
+
+logger = logging.getLogger(__name__)
+
+# Padded encoder inputs -> one row of probabilities per sequence
+Forward = Callable[[Dict[str, np.ndarray]], np.ndarray]
+
+def plan_token_batches(
+    lengths: Sequence[int],
+    max_tokens: int,
+    max_batch_size: int
+) -> List[List[int]]:
+    """Group sequence indices into length-sorted batches that fit a token budget
+    
+    Sorting keeps similar lengths together so padding to the longest member
+    wastes little. A batch closes when one more member would push
+    `rows * longest` past `max_tokens` or reach `max_batch_size`; a single
+    sequence longer than the budget still gets a batch of its own.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches: List[List[int]] = []
+    current: List[int] = []
+    longest = 0
+    for index in order:
+        length = lengths[index]
+        if current and (
+            len(current) >= max_batch_size
+            or (len(current) + 1) * max(longest, length) > max_tokens
+        ):
+            batches.append(current)
+            current, longest = [], 0
+        current.append(index)
+        longest = max(longest, length)
+    if current:
+        batches.append(current)
+    return batches
+
+def sliding_windows(ids: Sequence[int], window: int, stride: int, max_chunks: int = 0) -> List[Sequence[int]]:
+    """Split token ids into windows of at most `window` tokens overlapping by `stride`"""
+    if len(ids) <= window:
+        return [ids]
+    step = max(1, window - stride)
+    chunks = []
+    for start in range(0, len(ids), step):
+        chunks.append(ids[start:start + window])
+        if start + window >= len(ids) or (max_chunks and len(chunks) >= max_chunks):
+            break
+    return chunks
+
+def padded_tokens(lengths: Sequence[int], batches: List[List[int]]) -> int:
+    """Tokens actually computed when every batch is padded to its longest member"""
+    return sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+
+def pad_batch(sequences: List[List[int]], pad_token_id: int) -> Dict[str, np.ndarray]:
+    """Right-pad token ids into `input_ids` / `attention_mask` arrays"""
+    longest = max(len(ids) for ids in sequences)
+    input_ids = np.full((len(sequences), longest), pad_token_id, dtype=np.int64)
+    attention_mask = np.zeros_like(input_ids)
+    for row, ids in enumerate(sequences):
+        input_ids[row, :len(ids)] = ids
+        attention_mask[row, :len(ids)] = 1
+    return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+class SequenceBatcher:
+    """Tokenization stage in front of a transformer forward pass
+    
+    Texts are tokenized once without padding, over-long ones are split into
+    overlapping windows, and the resulting sequences are sorted by length and
+    packed into batches bounded by padded tokens rather than item count.
+    Per-chunk outputs are folded back into one row per text: `max` (a toxic
+    passage anywhere counts) or a length-weighted `mean`.
+    """
+    
+    AGGREGATIONS = ("max", "mean")
+    
+    def __init__(
+        self,
+        tokenizer,
+        forward: Forward,
+        aggregate: str = "max",
+        max_tokens: int = None,
+        max_batch_size: int = None,
+        max_length: int = None,
+        stride: int = None,
+        max_chunks: int = None,
+        name: str = "sequences"
+    ):
+        if aggregate not in self.AGGREGATIONS:
+            raise ValueError(f"aggregate must be one of {self.AGGREGATIONS}")
+        self.tokenizer = tokenizer
+        self.forward = forward
+        self.aggregate = aggregate
+        self.name = name
+        self.max_tokens = max_tokens or settings.TOKEN_BATCH_MAX_TOKENS
+        self.max_batch_size = max_batch_size or settings.TOKEN_BATCH_MAX_SIZE
+        self.max_length = min(
+            max_length or settings.TOKEN_MAX_LENGTH,
+            getattr(tokenizer, "model_max_length", None) or settings.TOKEN_MAX_LENGTH
+        )
+        # Room left for content once [CLS]/[SEP] (or <s>/</s>) are added
+        self.window = self.max_length - tokenizer.num_special_tokens_to_add(pair=False)
+        self.stride = min(settings.TOKEN_WINDOW_STRIDE if stride is None else stride, self.window - 1)
+        self.max_chunks = settings.TOKEN_MAX_CHUNKS if max_chunks is None else max_chunks
+        self.pad_token_id = tokenizer.pad_token_id or 0
+        self.token_cache = TokenCache(
+            tokenizer,
+            settings.TOKEN_CACHE_MAX_ENTRIES,
+            settings.TOKEN_CACHE_MAX_TEXT_CHARS
+        )
+        
+        # Runs in executor threads; counters are updated under a lock
+        self._lock = threading.Lock()
+        self.texts_total = 0
+        self.sequences_total = 0
+        self.chunked_texts_total = 0
+        self.batches_total = 0
+        self.real_tokens_total = 0
+        self.padded_tokens_total = 0
+    
+    def encode(self, texts: Sequence[str]) -> Tuple[List[List[int]], List[int]]:
+        """Model-ready token ids per chunk and the index of the text each came from"""
+        token_ids = self.token_cache.encode_batch(texts)
+        sequences: List[List[int]] = []
+        owners: List[int] = []
+        chunked = 0
+        for owner, ids in enumerate(token_ids):
+            chunks = sliding_windows(ids, self.window, self.stride, self.max_chunks)
+            chunked += len(chunks) > 1
+            for chunk in chunks:
+                sequences.append(self.tokenizer.build_inputs_with_special_tokens(list(chunk)))
+                owners.append(owner)
+        with self._lock:
+            self.chunked_texts_total += chunked
+        return sequences, owners
+    
+    def run(self, texts: Sequence[str]) -> List[np.ndarray]:
+        """Forward every text through token-budgeted, length-bucketed batches"""
+        if not texts:
+            return []
+        sequences, owners = self.encode(texts)
+        lengths = [len(ids) for ids in sequences]
+        batches = plan_token_batches(lengths, self.max_tokens, self.max_batch_size)
+        
+        outputs: List[Optional[np.ndarray]] = [None] * len(sequences)
+        for batch in batches:
+            rows = self.forward(pad_batch([sequences[i] for i in batch], self.pad_token_id))
+            for index, row in zip(batch, rows):
+                outputs[index] = row
+        
+        with self._lock:
+            self.texts_total += len(texts)
+            self.sequences_total += len(sequences)
+            self.batches_total += len(batches)
+            self.real_tokens_total += sum(lengths)
+            self.padded_tokens_total += padded_tokens(lengths, batches)
+        return self._fold(outputs, owners, lengths, len(texts))
+    
+    def _fold(
+        self,
+        outputs: List[np.ndarray],
+        owners: List[int],
+        lengths: List[int],
+        count: int
+    ) -> List[np.ndarray]:
+        rows: List[List[np.ndarray]] = [[] for _ in range(count)]
+        weights: List[List[int]] = [[] for _ in range(count)]
+        for output, owner, length in zip(outputs, owners, lengths):
+            rows[owner].append(output)
+            weights[owner].append(length)
+        
+        folded = []
+        for chunk_rows, chunk_weights in zip(rows, weights):
+            if len(chunk_rows) == 1:
+                folded.append(chunk_rows[0])
+            elif self.aggregate == "max":
+                folded.append(np.max(np.stack(chunk_rows), axis=0))
+            else:
+                folded.append(np.average(np.stack(chunk_rows), axis=0, weights=chunk_weights))
+        return folded
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "max_tokens": self.max_tokens,
+            "max_length": self.max_length,
+            "texts_total": self.texts_total,
+            "sequences_total": self.sequences_total,
+            "chunked_texts_total": self.chunked_texts_total,
+            "batches_total": self.batches_total,
+            "real_tokens_total": self.real_tokens_total,
+            "padded_tokens_total": self.padded_tokens_total,
+            "padding_efficiency": (
+                self.real_tokens_total / self.padded_tokens_total if self.padded_tokens_total else 1.0
+            ),
+            "token_cache": self.token_cache.stats()
+        }
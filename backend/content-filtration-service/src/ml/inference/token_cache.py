@@ -0,0 +1,75 @@
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Sequence
+
+def text_key(text: str) -> bytes:
+    """Compact digest of the exact text (tokenization is case/space sensitive)"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+class TokenCache:
+    """Bounded LRU of token ids in front of a tokenizer
+    
+    Reposts, templates and spam waves repeat the same texts; those are served
+    from the cache and only the misses go to the tokenizer, in one batched
+    (Rust, parallel) call. Ids are stored as compact `array('I')`. Safe to
+    share between executor threads.
+    """
+    
+    def __init__(self, tokenizer, max_entries: int, max_text_chars: int = 0):
+        self.tokenizer = tokenizer
+        self.max_entries = max(0, max_entries)
+        self.max_text_chars = max_text_chars
+        self._entries: "OrderedDict[bytes, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def encode_batch(self, texts: Sequence[str]) -> List[Sequence[int]]:
+        """Token ids (no special tokens, untruncated) for every text, in order"""
+        keys = [text_key(text) for text in texts]
+        results: List[Any] = [None] * len(texts)
+        missing: Dict[bytes, List[int]] = {}
+        with self._lock:
+            for position, key in enumerate(keys):
+                ids = self._entries.get(key)
+                if ids is not None:
+                    self._entries.move_to_end(key)
+                    results[position] = ids
+                else:
+                    # Duplicates within the batch are tokenized once
+                    missing.setdefault(key, []).append(position)
+            self.hits += len(texts) - sum(len(p) for p in missing.values())
+            self.misses += len(missing)
+        
+        if missing:
+            miss_texts = [texts[positions[0]] for positions in missing.values()]
+            encoded = self.tokenizer(
+                miss_texts,
+                add_special_tokens=False,
+                truncation=False,
+                verbose=False
+            )["input_ids"]
+            with self._lock:
+                for (key, positions), text, ids in zip(missing.items(), miss_texts, encoded):
+                    ids = array("I", ids)
+                    for position in positions:
+                        results[position] = ids
+                    if self.max_entries and not (self.max_text_chars and len(text) > self.max_text_chars):
+                        self._entries[key] = ids
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return results
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,189 @@
+"""CPU inference backends for the toxicity and sentiment models
+
+`pytorch` serves the fp32 models as loaded, `int8` applies dynamic int8
+quantization to their Linear layers, and `onnx` runs graph-optimized ONNX
+Runtime sessions exported by `ml.models.export_onnx`. Every backend keeps
+the interface the analyzers already call: Detoxify-style `predict(texts)`
+for toxicity and HF-style `model(**inputs).logits` for sentiment.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+from transformers.modeling_outputs import SequenceClassifierOutput
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKENDS = ("pytorch", "int8", "onnx")
+
+# Layout of exported/cached model directories, one per model
+ONNX_MODEL_FILE = "model.onnx"
+LABELS_FILE = "labels.json"
+
+def quantize_dynamic_int8(model: torch.nn.Module) -> torch.nn.Module:
+    """Int8 weights for Linear layers, activations quantized on the fly (CPU only)"""
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def save_labels(model_dir: str, labels: List[str]):
+    with open(os.path.join(model_dir, LABELS_FILE), "w") as f:
+        json.dump(list(labels), f)
+
+def load_labels(model_dir: str) -> List[str]:
+    with open(os.path.join(model_dir, LABELS_FILE)) as f:
+        return json.load(f)
+
+def create_onnx_session(path: str, intra_op_threads: int = None):
+    """ONNX Runtime CPU session with all graph optimizations enabled"""
+    import onnxruntime as ort
+    
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    threads = settings.ONNX_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+    if threads > 0:
+        options.intra_op_num_threads = threads
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+class _LogitsOnly(torch.nn.Module):
+    """Positional-input wrapper so `torch.onnx.export` sees a plain tensor graph"""
+    
+    def __init__(self, model: torch.nn.Module, input_names: Sequence[str]):
+        super().__init__()
+        self.model = model
+        self.input_names = list(input_names)
+    
+    def forward(self, *inputs):
+        return self.model(**dict(zip(self.input_names, inputs)))[0]
+
+def export_sequence_classifier(
+    model: torch.nn.Module,
+    tokenizer,
+    output_dir: str,
+    labels: List[str],
+    opset: int = 14
+) -> str:
+    """Export a HF sequence classifier with dynamic batch/sequence axes"""
+    os.makedirs(output_dir, exist_ok=True)
+    model.eval()
+    sample = tokenizer(["export sample text"], return_tensors="pt")
+    input_names = [
+        name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample
+    ]
+    path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.inference_mode():
+        torch.onnx.export(
+            _LogitsOnly(model, input_names),
+            tuple(sample[name] for name in input_names),
+            path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes={
+                **{name: {0: "batch", 1: "sequence"} for name in input_names},
+                "logits": {0: "batch"}
+            },
+            opset_version=opset
+        )
+    tokenizer.save_pretrained(output_dir)
+    save_labels(output_dir, labels)
+    return path
+
+class TorchToxicityModel:
+    """Detoxify-compatible `predict()` over a locally cached HF classifier
+    
+    Detoxify resolves its checkpoint and config through the hub on every
+    start; once cached under `MODEL_PATH`, this loads the same weights
+    straight from disk.
+    """
+    
+    def __init__(self, model: torch.nn.Module, tokenizer, class_names: List[str]):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.class_names = class_names
+    
+    @classmethod
+    def from_pretrained(cls, model_dir: str, device: str = "cpu") -> "TorchToxicityModel":
+        model = AutoModelForSequenceClassification.from_pretrained(model_dir).to(device)
+        model.eval()
+        return cls(model, AutoTokenizer.from_pretrained(model_dir, use_fast=True), load_labels(model_dir))
+    
+    @classmethod
+    def from_detoxify(cls, detox) -> "TorchToxicityModel":
+        """Wrap a loaded Detoxify model with the fast (Rust) build of its tokenizer
+        
+        Detoxify constructs the slow Python tokenizer class named in its
+        checkpoint; the same vocabulary loads as a fast tokenizer.
+        """
+        tokenizer = AutoTokenizer.from_pretrained(detox.tokenizer.name_or_path, use_fast=True)
+        return cls(detox.model, tokenizer, list(detox.class_names))
+    
+    def save_pretrained(self, model_dir: str):
+        os.makedirs(model_dir, exist_ok=True)
+        self.model.save_pretrained(model_dir)
+        self.tokenizer.save_pretrained(model_dir)
+        save_labels(model_dir, self.class_names)
+    
+    def predict(self, texts: List[str]) -> Dict[str, List[float]]:
+        inputs = self.tokenizer(list(texts), return_tensors="np", truncation=True, padding=True)
+        scores = self.predict_encoded(inputs)
+        return {name: scores[:, i].tolist() for i, name in enumerate(self.class_names)}
+    
+    def predict_encoded(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        """Sigmoid scores for already tokenized, padded inputs"""
+        tensors = {name: torch.as_tensor(value).to(self.model.device) for name, value in inputs.items()}
+        return torch.sigmoid(self.model(**tensors)[0]).cpu().numpy()
+
+class OnnxSequenceClassifier:
+    """ONNX Runtime session behind the `model(**inputs).logits` call convention"""
+    
+    def __init__(self, session):
+        self.session = session
+        self.input_names = [i.name for i in session.get_inputs()]
+    
+    def __call__(self, **inputs) -> SequenceClassifierOutput:
+        feed = {
+            name: np.asarray(value.cpu() if torch.is_tensor(value) else value)
+            for name, value in inputs.items()
+            if name in self.input_names
+        }
+        # Pre-tokenized batches carry no segment ids; single-segment means zeros
+        if "token_type_ids" in self.input_names and "token_type_ids" not in feed:
+            feed["token_type_ids"] = np.zeros_like(feed["input_ids"])
+        logits = self.session.run(["logits"], feed)[0]
+        return SequenceClassifierOutput(logits=torch.from_numpy(logits))
+
+class OnnxToxicityModel:
+    """ONNX Runtime replacement for `Detoxify.predict` on lists of texts"""
+    
+    def __init__(self, classifier: OnnxSequenceClassifier, tokenizer, class_names: List[str]):
+        self.classifier = classifier
+        self.tokenizer = tokenizer
+        self.class_names = class_names
+    
+    def predict(self, texts: List[str]) -> Dict[str, List[float]]:
+        inputs = self.tokenizer(list(texts), return_tensors="np", truncation=True, padding=True)
+        scores = self.predict_encoded(inputs)
+        return {name: scores[:, i].tolist() for i, name in enumerate(self.class_names)}
+    
+    def predict_encoded(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        """Sigmoid scores for already tokenized, padded inputs"""
+        logits = self.classifier(**inputs).logits.numpy()
+        return 1.0 / (1.0 + np.exp(-logits))
+
+def load_onnx_model(model_dir: str) -> Dict[str, Any]:
+    """Load an exported model directory: session, tokenizer and label order"""
+    path = os.path.join(model_dir, ONNX_MODEL_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"{path} not found; run `python -m ml.models.export_onnx` first"
+        )
+    return {
+        "classifier": OnnxSequenceClassifier(create_onnx_session(path)),
+        "tokenizer": AutoTokenizer.from_pretrained(model_dir, use_fast=True),
+        "labels": load_labels(model_dir)
+    }
@@ -0,0 +1,151 @@
+"""Export the toxicity and sentiment models to ONNX and validate every backend
+
+Writes `<output-dir>/toxicity` and `<output-dir>/sentiment` (graph, tokenizer
+and label order), then scores a validation set with the fp32 PyTorch models
+and compares the int8 and ONNX backends against them. Exits non-zero when a
+backend drifts past the tolerance, so it can gate a deploy:
+
+    cd src && python -m ml.models.export_onnx --output-dir ./models/onnx
+    cd src && python -m ml.models.export_onnx --validate-only --texts samples.txt
+"""
+import argparse
+import copy
+import os
+import sys
+from typing import Callable, Dict, List
+
+from detoxify import Detoxify
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+from config.settings import settings
+from ml.analyzers.sentiment_analyzer import SENTIMENT_LABELS, SentimentAnalyzer
+from ml.analyzers.toxicity_analyzer import ToxicityAnalyzer
+from ml.models.backends import (
+    OnnxToxicityModel,
+    export_sequence_classifier,
+    load_onnx_model,
+    quantize_dynamic_int8
+)
+
+VALIDATION_TEXTS = [
+    "Thank you so much for volunteering at the food drive this weekend!",
+    "The shelter is collecting winter coats for families in need.",
+    "You are an idiot and nobody wants you here.",
+    "I will find you and hurt you.",
+    "This policy is a disaster and the people behind it should be ashamed.",
+    "What a wonderful community event, the kids loved it.",
+    "Shut up, you worthless piece of garbage.",
+    "The meeting has been moved to Thursday at 5pm.",
+    "People like you don't deserve to live in this country.",
+    "Honestly not sure how I feel about the new schedule.",
+    "Donations are down this month; any help is appreciated.",
+    "That was a damn good game last night."
+]
+
+Scorer = Callable[[List[str]], List[Dict[str, float]]]
+
+def compare(reference: List[Dict[str, float]], candidate: List[Dict[str, float]], decide) -> Dict[str, float]:
+    """Max absolute score difference and decision agreement against the reference"""
+    max_diff = max(
+        abs(ref[key] - cand[key]) for ref, cand in zip(reference, candidate) for key in ref
+    )
+    agreement = sum(
+        decide(ref) == decide(cand) for ref, cand in zip(reference, candidate)
+    ) / len(reference)
+    return {"max_abs_diff": max_diff, "agreement": agreement}
+
+def load_reference():
+    """fp32 PyTorch models on CPU, the reference every backend is scored against"""
+    detox = Detoxify('original', device="cpu")
+    tokenizer = AutoTokenizer.from_pretrained(settings.SENTIMENT_MODEL)
+    sentiment = AutoModelForSequenceClassification.from_pretrained(settings.SENTIMENT_MODEL)
+    return detox, sentiment, tokenizer
+
+def build_scorers(detox, sentiment, tokenizer, onnx_dir: str) -> Dict[str, Dict[str, Scorer]]:
+    """predict_batch functions per backend, built from the real analyzers"""
+    detox_int8 = copy.copy(detox)
+    detox_int8.model = quantize_dynamic_int8(detox.model)
+    toxicity_onnx = load_onnx_model(os.path.join(onnx_dir, "toxicity"))
+    sentiment_onnx = load_onnx_model(os.path.join(onnx_dir, "sentiment"))
+    
+    return {
+        "pytorch": {
+            "toxicity": ToxicityAnalyzer(detox).predict_batch,
+            "sentiment": SentimentAnalyzer(sentiment, tokenizer).predict_batch
+        },
+        "int8": {
+            "toxicity": ToxicityAnalyzer(detox_int8).predict_batch,
+            "sentiment": SentimentAnalyzer(quantize_dynamic_int8(sentiment), tokenizer).predict_batch
+        },
+        "onnx": {
+            "toxicity": ToxicityAnalyzer(OnnxToxicityModel(
+                toxicity_onnx["classifier"],
+                toxicity_onnx["tokenizer"],
+                toxicity_onnx["labels"]
+            )).predict_batch,
+            "sentiment": SentimentAnalyzer(
+                sentiment_onnx["classifier"],
+                sentiment_onnx["tokenizer"]
+            ).predict_batch
+        }
+    }
+
+def export(output_dir: str, detox, sentiment, tokenizer):
+    path = export_sequence_classifier(
+        detox.model,
+        detox.tokenizer,
+        os.path.join(output_dir, "toxicity"),
+        list(detox.class_names)
+    )
+    print(f"Exported toxicity model to {path}")
+    path = export_sequence_classifier(
+        sentiment,
+        tokenizer,
+        os.path.join(output_dir, "sentiment"),
+        SENTIMENT_LABELS
+    )
+    print(f"Exported sentiment model to {path}")
+
+def validate(scorers: Dict[str, Dict[str, Scorer]], texts: List[str], tolerance: float, min_agreement: float) -> bool:
+    deciders = {
+        "toxicity": lambda scores: scores["toxicity"] > settings.TOXICITY_THRESHOLD,
+        "sentiment": lambda scores: max(scores, key=scores.get)
+    }
+    reference = {model: fn(texts) for model, fn in scorers["pytorch"].items()}
+    ok = True
+    for backend, models in scorers.items():
+        if backend == "pytorch":
+            continue
+        for model, fn in models.items():
+            result = compare(reference[model], fn(texts), deciders[model])
+            passed = result["max_abs_diff"] <= tolerance and result["agreement"] >= min_agreement
+            ok = ok and passed
+            print(
+                f"{backend:>6} {model:<9} max_abs_diff={result['max_abs_diff']:.4f} "
+                f"agreement={result['agreement']:.3f} {'ok' if passed else 'FAIL'}"
+            )
+    return ok
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output-dir", default=settings.ONNX_MODEL_DIR)
+    parser.add_argument("--validate-only", action="store_true", help="skip the export step")
+    parser.add_argument("--texts", help="file with one validation text per line")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="max allowed absolute score difference")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="min share of matching decisions")
+    args = parser.parse_args(argv)
+    
+    texts = VALIDATION_TEXTS
+    if args.texts:
+        with open(args.texts) as f:
+            texts = [line.strip() for line in f if line.strip()]
+    
+    detox, sentiment, tokenizer = load_reference()
+    if not args.validate_only:
+        export(args.output_dir, detox, sentiment, tokenizer)
+    
+    scorers = build_scorers(detox, sentiment, tokenizer, args.output_dir)
+    return 0 if validate(scorers, texts, args.tolerance, args.min_agreement) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
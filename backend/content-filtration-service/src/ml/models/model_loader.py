@@ -1,49 +1,190 @@
+import asyncio
 import logging
-from typing import Dict, Any
+import os
+import shutil
+from typing import Any, Callable, Dict, Iterable, List
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 from detoxify import Detoxify
+from sentence_transformers import SentenceTransformer
 
 from config.settings import settings
+from ml.models.backends import (
+    INFERENCE_BACKENDS,
+    OnnxToxicityModel,
+    TorchToxicityModel,
+    load_onnx_model,
+    quantize_dynamic_int8
+)
+from utils.phase_timer import PhaseTimer
 
 logger = logging.getLogger(__name__)
 
+MODEL_NAMES = ("toxicity", "sentiment", "misinformation", "embedding")
+
 class ModelLoader:
-    """Load and manage ML models"""
+    """Load and manage ML models
+    
+    Models load concurrently in worker threads so the event loop keeps
+    serving `/health` meanwhile. Names listed in `LAZY_MODELS` are skipped at
+    startup and loaded on first `ensure_loaded()`. Hub models are saved under
+    `MODEL_PATH` after the first download and read from there afterwards.
+    """
     
-    def __init__(self):
+    def __init__(self, backend: str = None):
+        self.backend = backend or settings.INFERENCE_BACKEND
+        if self.backend not in INFERENCE_BACKENDS:
+            raise ValueError(
+                f"Unknown inference backend {self.backend!r}; expected one of {INFERENCE_BACKENDS}"
+            )
         self.models: Dict[str, Any] = {}
         self.tokenizers: Dict[str, Any] = {}
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        logger.info(f"Using device: {self.device}")
+        # Quantized and ONNX backends are CPU-only
+        if self.backend == "pytorch" and torch.cuda.is_available():
+            self.device = "cuda"
+        else:
+            self.device = "cpu"
+        self.timer = PhaseTimer("model loading")
+        self._loaders: Dict[str, Callable[[], None]] = {
+            "toxicity": self._load_toxicity,
+            "sentiment": self._load_sentiment,
+            "misinformation": self._load_misinformation,
+            "embedding": self._load_embedding
+        }
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Rust tokenizers encode batches on several threads when allowed
+        os.environ["TOKENIZERS_PARALLELISM"] = "true" if settings.TOKENIZERS_PARALLELISM else "false"
+        logger.info(f"Using device: {self.device} (backend: {self.backend})")
     
-    async def load_models(self):
-        """Load all required models"""
+    @property
+    def eager_models(self) -> List[str]:
+        return [name for name in MODEL_NAMES if name not in settings.LAZY_MODELS]
+    
+    async def load_models(self, names: Iterable[str] = None):
+        """Load the given models (default: all non-lazy ones) concurrently"""
+        names = list(names) if names is not None else self.eager_models
         try:
-            # Load toxicity detection model
-            logger.info("Loading toxicity detection model...")
-            self.models['toxicity'] = Detoxify('original', device=self.device)
-            
-            # Load sentiment analysis model
-            logger.info("Loading sentiment analysis model...")
-            self.tokenizers['sentiment'] = AutoTokenizer.from_pretrained(
-                settings.SENTIMENT_MODEL
-            )
-            self.models['sentiment'] = AutoModelForSequenceClassification.from_pretrained(
-                settings.SENTIMENT_MODEL
-            ).to(self.device)
-            
-            # Load misinformation detection model (placeholder)
-            logger.info("Loading misinformation detection model...")
-            # In production, load a custom-trained model
-            self.models['misinformation'] = None  # Placeholder
-            
-            logger.info("All models loaded successfully")
-            
+            await asyncio.gather(*(self.ensure_loaded(name) for name in names))
+            logger.info(f"Models loaded: {', '.join(names)}")
         except Exception as e:
             logger.error(f"Failed to load models: {e}")
             raise
     
+    async def ensure_loaded(self, model_name: str):
+        """Load a model once, off the event loop; concurrent callers share the load"""
+        if model_name in self.models:
+            return self.models[model_name]
+        lock = self._locks.setdefault(model_name, asyncio.Lock())
+        async with lock:
+            if model_name not in self.models:
+                with self.timer.phase(model_name):
+                    await asyncio.to_thread(self._loaders[model_name])
+                try:
+                    self.check_fast_tokenizer(model_name)
+                except RuntimeError:
+                    self.models.pop(model_name, None)
+                    self.tokenizers.pop(model_name, None)
+                    raise
+        return self.models[model_name]
+    
+    def check_fast_tokenizer(self, model_name: str):
+        """Fail if a model would tokenize with a slow Python tokenizer"""
+        model = self.models.get(model_name)
+        tokenizer = self.tokenizers.get(model_name) or getattr(model, "tokenizer", None)
+        if not settings.REQUIRE_FAST_TOKENIZERS or tokenizer is None:
+            return
+        if not getattr(tokenizer, "is_fast", False):
+            raise RuntimeError(
+                f"{model_name} uses a slow Python tokenizer ({type(tokenizer).__name__}); "
+                "install `tokenizers` or set REQUIRE_FAST_TOKENIZERS=false"
+            )
+    
+    def is_loaded(self, model_name: str) -> bool:
+        return model_name in self.models
+    
+    def _local_dir(self, model_name: str) -> str:
+        return os.path.join(settings.MODEL_PATH, model_name)
+    
+    def _cached(self, model_name: str) -> bool:
+        return settings.MODEL_CACHE_ENABLED and os.path.isdir(self._local_dir(model_name))
+    
+    def _save_local(self, model_name: str, save: Callable[[str], None]):
+        """Write into a temp dir and rename, so a crash never leaves a partial cache"""
+        target = self._local_dir(model_name)
+        staging = f"{target}.tmp-{os.getpid()}"
+        try:
+            save(staging)
+            os.replace(staging, target)
+            logger.info(f"Cached {model_name} model at {target}")
+        except OSError as e:
+            shutil.rmtree(staging, ignore_errors=True)
+            logger.warning(f"Could not cache {model_name} model: {e}")
+    
+    def _load_toxicity(self):
+        logger.info("Loading toxicity detection model...")
+        if self.backend == "onnx":
+            toxicity = load_onnx_model(os.path.join(settings.ONNX_MODEL_DIR, "toxicity"))
+            self.models['toxicity'] = OnnxToxicityModel(
+                toxicity["classifier"],
+                toxicity["tokenizer"],
+                toxicity["labels"]
+            )
+            return
+        
+        if self._cached('toxicity'):
+            model = TorchToxicityModel.from_pretrained(self._local_dir('toxicity'), self.device)
+        else:
+            model = TorchToxicityModel.from_detoxify(Detoxify('original', device=self.device))
+            if settings.MODEL_CACHE_ENABLED:
+                self._save_local('toxicity', model.save_pretrained)
+        
+        if self.backend == "int8":
+            model.model = quantize_dynamic_int8(model.model)
+        self.models['toxicity'] = model
+    
+    def _load_sentiment(self):
+        logger.info("Loading sentiment analysis model...")
+        if self.backend == "onnx":
+            sentiment = load_onnx_model(os.path.join(settings.ONNX_MODEL_DIR, "sentiment"))
+            self.tokenizers['sentiment'] = sentiment["tokenizer"]
+            self.models['sentiment'] = sentiment["classifier"]
+            return
+        
+        cached = self._cached('sentiment')
+        source = self._local_dir('sentiment') if cached else settings.SENTIMENT_MODEL
+        tokenizer = AutoTokenizer.from_pretrained(source, use_fast=True)
+        model = AutoModelForSequenceClassification.from_pretrained(source)
+        if settings.MODEL_CACHE_ENABLED and not cached:
+            def save(model_dir: str):
+                tokenizer.save_pretrained(model_dir)
+                model.save_pretrained(model_dir)
+            self._save_local('sentiment', save)
+        
+        model = model.to(self.device)
+        if self.backend == "int8":
+            model = quantize_dynamic_int8(model)
+        self.tokenizers['sentiment'] = tokenizer
+        self.models['sentiment'] = model
+    
+    def _load_misinformation(self):
+        logger.info("Loading misinformation detection model...")
+        # In production, load a custom-trained model
+        self.models['misinformation'] = None  # Placeholder
+    
+    def _load_embedding(self):
+        logger.info("Loading sentence embedding model...")
+        # No ONNX export for the encoder; the onnx backend serves it with torch on CPU
+        cached = self._cached('embedding')
+        source = self._local_dir('embedding') if cached else settings.EMBEDDING_MODEL
+        model = SentenceTransformer(source, device=self.device)
+        if settings.MODEL_CACHE_ENABLED and not cached:
+            self._save_local('embedding', model.save)
+        
+        model.eval()
+        if self.backend == "int8":
+            model = quantize_dynamic_int8(model)
+        self.models['embedding'] = model
+    
     def get_model(self, model_name: str):
         """Get a specific model"""
         return self.models.get(model_name)
@@ -51,3 +192,12 @@ class ModelLoader:
     def get_tokenizer(self, model_name: str):
         """Get a specific tokenizer"""
         return self.tokenizers.get(model_name)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "device": self.device,
+            "loaded": sorted(self.models),
+            "lazy": [name for name in MODEL_NAMES if name in settings.LAZY_MODELS],
+            **self.timer.snapshot()
+        }
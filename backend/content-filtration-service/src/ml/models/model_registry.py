@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Dict, List, Optional
+
+from config.settings import settings
+from ml.models.model_loader import ModelLoader
+from ml.inference.executor import InferenceExecutor, InferenceSaturatedError
+from ml.inference.micro_batcher import MicroBatcher
+from ml.analyzers.toxicity_analyzer import ToxicityAnalyzer
+from ml.analyzers.sentiment_analyzer import SentimentAnalyzer
+from ml.analyzers.age_analyzer import AgeAppropriatenessAnalyzer
+from ml.analyzers.text_encoder import TextEncoder
+from services.content_analyzer import ContentAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# Longest wait between attempts to load a lazy model that failed
+_LOAD_RETRY_MAX_SECONDS = 3600
+
+class ModelRegistry:
+    """App-scoped holder for loaded models and the analyzers built on them
+    
+    Created once in the app lifespan and handed to routes through FastAPI
+    dependencies, so requests never construct models, loaders or analyzers.
+    `ready` flips once the eager models are loaded; lazy ones (see
+    `LAZY_MODELS`) are loaded by their getters on first use.
+    """
+    
+    def __init__(self, model_loader: Optional[ModelLoader] = None):
+        self.model_loader = model_loader or ModelLoader()
+        self.executor: Optional[InferenceExecutor] = None
+        self.toxicity_analyzer: Optional[ToxicityAnalyzer] = None
+        self.sentiment_analyzer: Optional[SentimentAnalyzer] = None
+        self.age_analyzer = AgeAppropriatenessAnalyzer()
+        self.text_encoder: Optional[TextEncoder] = None
+        self.toxicity_batcher: Optional[MicroBatcher] = None
+        self.content_analyzer: Optional[ContentAnalyzer] = None
+        self.ready = False
+        self.startup_error: Optional[str] = None
+        self._startup: Optional[asyncio.Task] = None
+        self._encoder_load: Optional[asyncio.Task] = None
+        # Failed encoder loads back off exponentially from EMBEDDING_LOAD_RETRY_SECONDS
+        self.encoder_error: Optional[str] = None
+        self.encoder_load_failures = 0
+        self._encoder_retry_at = 0.0
+    
+    def start_in_background(self) -> asyncio.Task:
+        """Run `start()` as a task so the app can serve liveness meanwhile"""
+        self._startup = asyncio.create_task(self.start(), name="model-registry-startup")
+        # Failures are kept in `startup_error`; retrieve them so asyncio doesn't warn
+        self._startup.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._startup
+    
+    async def start(self):
+        """Load models and build the shared analyzers"""
+        try:
+            # Shared executor keeps torch forward passes off the event loop
+            self.executor = InferenceExecutor.from_settings()
+            
+            await self.model_loader.load_models()
+            
+            self.toxicity_analyzer = ToxicityAnalyzer(
+                self.model_loader.get_model('toxicity'),
+                executor=self.executor
+            )
+            if settings.TOXICITY_BATCHING_ENABLED:
+                self.toxicity_batcher = self.toxicity_analyzer.enable_batching()
+                await self.toxicity_batcher.start()
+            
+            if self.model_loader.is_loaded('sentiment'):
+                await self.get_sentiment_analyzer()
+            
+            self.content_analyzer = ContentAnalyzer(
+                toxicity_analyzer=self.toxicity_analyzer,
+                age_analyzer=self.age_analyzer
+            )
+        except Exception as e:
+            self.startup_error = str(e)
+            logger.error(f"Model registry failed to start: {e}")
+            raise
+        
+        self.ready = True
+        logger.info("Model registry ready")
+    
+    async def get_sentiment_analyzer(self) -> SentimentAnalyzer:
+        """Sentiment analyzer, loading the model on first use if it is lazy"""
+        if self.sentiment_analyzer is None:
+            await self.model_loader.ensure_loaded('sentiment')
+            if self.sentiment_analyzer is None:
+                self.sentiment_analyzer = SentimentAnalyzer(
+                    self.model_loader.get_model('sentiment'),
+                    self.model_loader.get_tokenizer('sentiment'),
+                    device=self.model_loader.device,
+                    executor=self.executor
+                )
+        return self.sentiment_analyzer
+    
+    async def get_text_encoder(self) -> TextEncoder:
+        """Sentence encoder, loading the model on first use if it is lazy"""
+        if self.text_encoder is None:
+            await self.model_loader.ensure_loaded('embedding')
+            if self.text_encoder is None:
+                self.text_encoder = TextEncoder(
+                    self.model_loader.get_model('embedding'),
+                    executor=self.executor
+                )
+        return self.text_encoder
+    
+    async def embed(self, texts: List[str]):
+        """Embeddings of texts without waiting for a model load
+        
+        Until the encoder is built this starts loading it (in the background)
+        and raises InferenceSaturatedError, so callers fall back or retry.
+        After a failed load the next attempt waits out a growing backoff.
+        """
+        if self.text_encoder is None:
+            wait = self._encoder_retry_at - time.monotonic()
+            if self.ready and wait <= 0 and (self._encoder_load is None or self._encoder_load.done()):
+                self._encoder_load = asyncio.create_task(self.get_text_encoder(), name="text-encoder-load")
+                self._encoder_load.add_done_callback(self._encoder_load_done)
+            if self.encoder_error is not None:
+                raise InferenceSaturatedError(
+                    f"Text encoder failed to load: {self.encoder_error}",
+                    retry_after=max(5, math.ceil(wait))
+                )
+            raise InferenceSaturatedError("Text encoder is not loaded yet", retry_after=5)
+        return await self.text_encoder.encode(texts)
+    
+    def _encoder_load_done(self, task: asyncio.Task):
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is None:
+            self.encoder_error = None
+            self.encoder_load_failures = 0
+            return
+        self.encoder_load_failures += 1
+        delay = min(
+            settings.EMBEDDING_LOAD_RETRY_SECONDS * 2 ** (self.encoder_load_failures - 1),
+            _LOAD_RETRY_MAX_SECONDS
+        )
+        self._encoder_retry_at = time.monotonic() + delay
+        self.encoder_error = str(error) or type(error).__name__
+        logger.error(
+            f"Loading the text encoder failed (attempt {self.encoder_load_failures}), "
+            f"retrying in {delay:.0f}s: {self.encoder_error}"
+        )
+    
+    async def close(self):
+        """Stop background workers and release the executor"""
+        if self._startup is not None and not self._startup.done():
+            self._startup.cancel()
+            try:
+                await self._startup
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._encoder_load is not None and not self._encoder_load.done():
+            self._encoder_load.cancel()
+        if self.toxicity_batcher is not None:
+            await self.toxicity_batcher.stop()
+        if self.executor is not None:
+            self.executor.shutdown()
+    
+    def readiness(self) -> Dict[str, Any]:
+        if self.ready:
+            status = "ready"
+        elif self.startup_error is not None:
+            status = "failed"
+        else:
+            status = "loading"
+        return {
+            "status": status,
+            "error": self.startup_error,
+            "models": self.model_loader.stats()
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "text_encoder": {
+                "loaded": self.text_encoder is not None,
+                "error": self.encoder_error,
+                "load_failures": self.encoder_load_failures
+            },
+            "toxicity_batcher": self.toxicity_batcher.stats() if self.toxicity_batcher else None,
+            "executor": self.executor.stats() if self.executor else None,
+            "token_batching": {
+                analyzer.sequence_batcher.name: analyzer.sequence_batcher.stats()
+                for analyzer in (self.toxicity_analyzer, self.sentiment_analyzer)
+                if analyzer is not None and analyzer.sequence_batcher is not None
+            }
+        }
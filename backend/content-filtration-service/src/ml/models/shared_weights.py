@@ -0,0 +1,54 @@
+"""Load model weights once in the gunicorn master and share them with workers
+
+With `SHARED_MODEL_WEIGHTS` the master process loads every model before
+forking; workers inherit the weights as copy-on-write pages and the lifespan
+picks the loaded `ModelLoader` up instead of loading its own. Tensor data is
+never written after loading, so those pages stay shared. What would dirty
+them is the cyclic GC touching every object header, hence the
+`gc.disable()` / `gc.freeze()` / `gc.enable()` sequence around the fork
+(see `gunicorn.conf.py`); the master and the workers both collect again
+afterwards, only never the frozen objects.
+"""
+import asyncio
+import gc
+import logging
+from typing import Optional
+
+from config.settings import settings
+from ml.models.model_loader import MODEL_NAMES, ModelLoader
+
+logger = logging.getLogger(__name__)
+
+_preloaded: Optional[ModelLoader] = None
+
+def preload_models() -> ModelLoader:
+    """Load all models (lazy ones included) in the current, pre-fork process"""
+    global _preloaded
+    if _preloaded is None:
+        # Objects allocated from here on are frozen before the fork
+        gc.disable()
+        loader = ModelLoader()
+        with loader.timer.phase("preload"):
+            asyncio.run(loader.load_models(MODEL_NAMES))
+        _preloaded = loader
+        logger.info(f"Preloaded models for sharing across workers: {', '.join(MODEL_NAMES)}")
+    return _preloaded
+
+def freeze_before_fork():
+    """Move everything allocated so far out of the GC's reach (call in the master)
+    
+    Collection is re-enabled right away: later master allocations are
+    collected as usual, the frozen ones never are.
+    """
+    gc.freeze()
+    gc.enable()
+
+def after_fork():
+    """Re-enable collection in the worker; frozen objects stay untouched"""
+    gc.enable()
+
+def preloaded_loader() -> Optional[ModelLoader]:
+    """The loader inherited from the master, when shared weights are enabled"""
+    if not settings.SHARED_MODEL_WEIGHTS:
+        return None
+    return _preloaded
@@ -54,7 +54,7 @@ class RecommendationRequest(BaseModel):
     user_id: str
     content_pool: List[Dict[str, Any]]
     limit: int = 20
-    
+
 # Response Models
 class ToxicityScore(BaseModel):
     overall_score: float = Field(..., ge=0.0, le=1.0)
@@ -82,8 +82,21 @@ class ContentAnalysisResponse(BaseModel):
     sensitivity: SensitivityLevel
     is_safe: bool
     recommendations: Dict[str, Any]
+    decided_by: str = "model"  # cache, model, or lexical (pattern-only fallback)
+    skipped_analyses: List[str] = []  # stages left out to meet the request deadline, or that failed
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+class BatchAnalysisItemResult(BaseModel):
+    index: int
+    content_id: Optional[str] = None
+    result: Optional[ContentAnalysisResponse] = None
+    error: Optional[str] = None
+
+class BatchAnalysisResponse(BaseModel):
+    results: List[BatchAnalysisItemResult]
+    total: int
+    failed: int
+
 class FilteredContent(BaseModel):
     content_id: str
     original_rank: int
@@ -100,11 +113,18 @@ class RecommendationResponse(BaseModel):
     fairness_metrics: Dict[str, float]
 
 class BiasMetrics(BaseModel):
-    demographic_parity: float
-    equal_opportunity: float
-    treatment_equality: float
+    # 1 - gap across groups; None until two groups have enough decisions
+    demographic_parity: Optional[float] = None
+    equal_opportunity: Optional[float] = None
+    treatment_equality: Optional[float] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+class FairnessLabel(BaseModel):
+    demographic_group: str
+    flagged: bool  # the decision served (not is_safe)
+    label: bool  # whether the content actually violates policy
+    timestamp: Optional[datetime] = None  # time of the decision; defaults to now
+
 class ExplainabilityResponse(BaseModel):
     content_id: str
     decision: str
@@ -0,0 +1,199 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+from config.settings import settings
+from utils.histogram import BucketHistogram
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most important first
+PRIORITY_CLASSES = ("interactive", "batch")
+
+class AdmissionRejectedError(RuntimeError):
+    """Raised when a request is shed instead of admitted"""
+    
+    def __init__(self, message: str, status_code: int, retry_after: int = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class EndpointPool:
+    """Concurrency limit, queue bound and priority class of one endpoint"""
+    
+    def __init__(self, name: str, limit: int, max_queue: int, priority: str):
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class for {name}: {priority}")
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.priority = priority
+        self.rank = PRIORITY_CLASSES.index(priority)
+        
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted_total = 0
+        self.shed_total = {"queue_full": 0, "deadline": 0}
+        self.abandoned_total = 0
+        self.queue_wait_ms = BucketHistogram([0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000])
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "priority": self.priority,
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted_total": self.admitted_total,
+            "shed_total": dict(self.shed_total),
+            "abandoned_total": self.abandoned_total,
+            "queue_wait_ms": self.queue_wait_ms.snapshot()
+        }
+
+class AdmissionController:
+    """Admission control and load shedding for the analysis endpoints
+    
+    Every endpoint has its own concurrency limit and bounded queue, and all
+    of them share `max_concurrency` slots. Freed slots go to queued requests
+    in priority-class order (interactive before batch), FIFO within a class,
+    skipping requests whose endpoint is at its own limit. A request that
+    finds its endpoint queue full is shed at once with 429; one that is not
+    admitted within its class's queue timeout is shed with 503. Both carry
+    a Retry-After.
+    """
+    
+    def __init__(
+        self,
+        max_concurrency: int,
+        pools: List[EndpointPool],
+        queue_timeout_ms: Dict[str, float]
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.pools = {pool.name: pool for pool in pools}
+        self.queue_timeouts = {
+            priority: max(0.0, queue_timeout_ms.get(priority, 0.0)) / 1000.0
+            for priority in PRIORITY_CLASSES
+        }
+        self.in_flight = 0
+        # Heap of [rank, sequence, pool, future]; abandoned entries are dropped lazily
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+    
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        return cls(
+            max_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+            pools=[
+                EndpointPool(
+                    name,
+                    limit,
+                    settings.ADMISSION_ENDPOINT_QUEUES.get(name, 0),
+                    settings.ADMISSION_ENDPOINT_PRIORITIES.get(name, "batch")
+                )
+                for name, limit in settings.ADMISSION_ENDPOINT_LIMITS.items()
+            ],
+            queue_timeout_ms=settings.ADMISSION_QUEUE_TIMEOUT_MS
+        )
+    
+    @asynccontextmanager
+    async def admit(self, endpoint: str):
+        """Hold one slot of `endpoint` for the duration of the block"""
+        pool = self.pools.get(endpoint)
+        if pool is None:
+            yield
+            return
+        await self._acquire(pool)
+        try:
+            yield
+        finally:
+            self._release(pool)
+    
+    def _can_run(self, pool: EndpointPool) -> bool:
+        return self.in_flight < self.max_concurrency and pool.in_flight < pool.limit
+    
+    def _grant(self, pool: EndpointPool):
+        self.in_flight += 1
+        pool.in_flight += 1
+        pool.admitted_total += 1
+    
+    async def _acquire(self, pool: EndpointPool):
+        if self._can_run(pool):
+            self._grant(pool)
+            pool.queue_wait_ms.observe(0.0)
+            return
+        
+        timeout = self.queue_timeouts[pool.priority]
+        if pool.queued >= pool.max_queue or timeout == 0:
+            self._shed(pool, "queue_full", 429, timeout)
+        
+        if len(self._waiters) > 2 * sum(p.max_queue for p in self.pools.values()):
+            # Drop entries of requests that timed out or went away
+            self._waiters = [entry for entry in self._waiters if not entry[3].done()]
+            heapq.heapify(self._waiters)
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [pool.rank, next(self._sequence), pool, future])
+        pool.queued += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self._shed(pool, "deadline", 503, timeout)
+        except asyncio.CancelledError:
+            # Client went away while queued; hand a granted slot straight back
+            if future.done() and not future.cancelled():
+                self._release(pool)
+            else:
+                future.cancel()
+            pool.abandoned_total += 1
+            raise
+        finally:
+            pool.queued -= 1
+        pool.queue_wait_ms.observe((time.perf_counter() - started) * 1000)
+    
+    def _release(self, pool: EndpointPool):
+        self.in_flight -= 1
+        pool.in_flight -= 1
+        self._dispatch()
+    
+    def _dispatch(self):
+        """Grant freed slots to queued requests, highest priority class first"""
+        blocked = []
+        while self._waiters and self.in_flight < self.max_concurrency:
+            entry = heapq.heappop(self._waiters)
+            pool, future = entry[2], entry[3]
+            if future.done():
+                continue
+            if pool.in_flight >= pool.limit:
+                blocked.append(entry)
+                continue
+            self._grant(pool)
+            future.set_result(None)
+        for entry in blocked:
+            heapq.heappush(self._waiters, entry)
+    
+    def _shed(self, pool: EndpointPool, reason: str, status_code: int, timeout: float):
+        pool.shed_total[reason] += 1
+        raise AdmissionRejectedError(
+            f"{pool.name} over capacity ({reason}: {pool.in_flight} running, {pool.queued} queued)",
+            status_code=status_code,
+            retry_after=max(1, math.ceil(timeout))
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": sum(pool.queued for pool in self.pools.values()),
+            "queue_timeout_ms": {
+                priority: timeout * 1000 for priority, timeout in self.queue_timeouts.items()
+            },
+            "endpoints": {name: pool.stats() for name, pool in self.pools.items()}
+        }
@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import logging
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from config.settings import settings
+from models.schemas import ContentAnalysisResponse
+from services.cache_service import CacheService
+from utils.histogram import LATENCY_BOUNDS_SECONDS, BucketHistogram
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for content addressing (NFKC, collapsed whitespace)"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+def analysis_model_version() -> str:
+    """Configured model version, qualified by the inference backend when it is not fp32
+    
+    Quantized and ONNX scores differ slightly from fp32, so they get their
+    own cache namespace.
+    """
+    if settings.INFERENCE_BACKEND == "pytorch":
+        return settings.ANALYSIS_MODEL_VERSION
+    return f"{settings.ANALYSIS_MODEL_VERSION}+{settings.INFERENCE_BACKEND}"
+
+def content_digest(text: str, model_version: str = None) -> str:
+    """Stable digest of normalized text plus the model version that scored it
+    
+    Unlike `hash()`, this is identical across processes and pods.
+    """
+    model_version = model_version or analysis_model_version()
+    payload = f"{model_version}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+def encode_analysis(result: ContentAnalysisResponse) -> bytes:
+    """Cacheable JSON for an analysis, encoded once with orjson
+    
+    `content_id` is left out and `decided_by` comes first: both vary per
+    request and are spliced in by `render_analysis` without parsing.
+    """
+    payload = result.model_dump(exclude={"content_id", "decided_by"})
+    return orjson.dumps({"decided_by": result.decided_by, **payload})
+
+# Every `encode_analysis` payload starts with this; `render_analysis` relies on it
+_DECIDED_BY_FIELD = b'{"decided_by":'
+
+def render_analysis(payload: bytes, content_id: str, decided_by: str = None) -> bytes:
+    """Response body for an encoded analysis, optionally overriding `decided_by`
+    
+    Payloads in any other layout (not from `encode_analysis`) are parsed
+    and re-encoded instead of spliced.
+    """
+    if not payload.startswith(_DECIDED_BY_FIELD):
+        logger.warning("Analysis payload does not start with decided_by; re-encoding it")
+        return orjson.dumps(decode_analysis(payload, content_id, decided_by))
+    head = b'{"content_id":' + orjson.dumps(content_id) + b","
+    if decided_by is None:
+        return head + payload[1:]
+    # Tier names contain no commas, so the first one ends the decided_by field
+    return head + b'"decided_by":' + orjson.dumps(decided_by) + payload[payload.index(b","):]
+
+def is_complete(payload: bytes) -> bool:
+    """Whether an encoded analysis ran every stage (partial ones must not be cached or stored)"""
+    return not orjson.loads(payload).get("skipped_analyses")
+
+def decode_analysis(payload: bytes, content_id: str, decided_by: str = None) -> Dict[str, Any]:
+    """JSON-mode dict for an encoded analysis (for callers that need the fields)"""
+    analysis = orjson.loads(payload)
+    analysis["content_id"] = content_id
+    if decided_by is not None:
+        analysis["decided_by"] = decided_by
+    return analysis
+
+class LocalTTLCache:
+    """Bounded in-process LRU with a per-entry TTL"""
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+    
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+    
+    def set(self, key: str, value: Any):
+        if self.max_entries == 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+class AnalysisCache:
+    """Content-addressed, two-tier cache for analysis results
+    
+    Lookups go to the in-process LRU first, then Redis, and only then to the
+    model. Concurrent misses for the same digest share a single computation
+    (single-flight). Both tiers hold the `encode_analysis` bytes, so a hit
+    is never parsed on the way to the client.
+    """
+    
+    # v2: payloads are `encode_analysis` bytes, not whole response dicts
+    KEY_PREFIX = "content_analysis:v2:"
+    TIERS = ("local", "redis", "coalesced", "model")
+    
+    def __init__(
+        self,
+        cache_service: Optional[CacheService] = None,
+        max_entries: int = None,
+        local_ttl: float = None,
+        model_version: str = None
+    ):
+        self.cache_service = cache_service or CacheService()
+        self.local = LocalTTLCache(
+            settings.ANALYSIS_CACHE_LOCAL_MAX_ENTRIES if max_entries is None else max_entries,
+            settings.ANALYSIS_CACHE_LOCAL_TTL if local_ttl is None else local_ttl
+        )
+        self.model_version = model_version or analysis_model_version()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiting: Dict[str, int] = {}
+        self.counters = {
+            "local_hits": 0,
+            "local_misses": 0,
+            "redis_hits": 0,
+            "redis_misses": 0,
+            "coalesced": 0,
+            "computed": 0
+        }
+        # Time to a hit or a confirmed miss (local, then Redis) on the single path
+        self.lookup_seconds = BucketHistogram(LATENCY_BOUNDS_SECONDS)
+    
+    def digest(self, text: str) -> str:
+        return content_digest(text, self.model_version)
+    
+    async def get_or_compute(
+        self,
+        text: str,
+        compute: Callable[[], Awaitable[bytes]],
+        coalesce: bool = True
+    ) -> Tuple[bytes, str]:
+        """Return the encoded analysis payload for `text` and the tier that served it
+        
+        With `coalesce=False` (deadline-bound requests, whose result may be
+        partial) a miss is computed for this caller alone and not cached;
+        the caller stores complete results with `set_many`. Partial results
+        (`is_complete`) are never cached.
+        """
+        started = time.perf_counter()
+        digest = self.digest(text)
+        
+        payload = self.local.get(digest)
+        if payload is not None:
+            self.counters["local_hits"] += 1
+            self.lookup_seconds.observe(time.perf_counter() - started)
+            return payload, "local"
+        self.counters["local_misses"] += 1
+        
+        if not coalesce:
+            return await self._load(digest, compute, store=False, started=started)
+        
+        task = self._inflight.get(digest)
+        if task is not None:
+            self.counters["coalesced"] += 1
+            payload, _ = await self._join(digest, task)
+            return payload, "coalesced"
+        
+        # The load runs as its own task so followers still get a result if
+        # the request that started it is cancelled.
+        task = asyncio.ensure_future(self._load(digest, compute, started=started))
+        self._inflight[digest] = task
+        task.add_done_callback(lambda _: self._inflight.pop(digest, None))
+        return await self._join(digest, task)
+    
+    async def _join(self, digest: str, task: asyncio.Task) -> Tuple[bytes, str]:
+        """Wait for a shared load; the last caller to give up cancels it"""
+        self._waiting[digest] = self._waiting.get(digest, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiting[digest] == 1:
+                task.cancel()
+            raise
+        finally:
+            self._waiting[digest] -= 1
+            if not self._waiting[digest]:
+                del self._waiting[digest]
+    
+    async def _load(
+        self,
+        digest: str,
+        compute: Callable[[], Awaitable[bytes]],
+        store: bool = True,
+        started: float = None
+    ) -> Tuple[bytes, str]:
+        payload = await self.cache_service.get(self.KEY_PREFIX + digest, parse=False)
+        if started is not None:
+            self.lookup_seconds.observe(time.perf_counter() - started)
+        if payload is not None:
+            self.counters["redis_hits"] += 1
+            self.local.set(digest, payload)
+            return payload, "redis"
+        self.counters["redis_misses"] += 1
+        
+        payload = await compute()
+        # Deadline-degraded or model-failure fallbacks are served, never cached
+        if store and is_complete(payload):
+            self.counters["computed"] += 1
+            self.local.set(digest, payload)
+            await self.cache_service.set(self.KEY_PREFIX + digest, payload)
+        return payload, "model"
+    
+    async def get_many(self, digests: List[str]) -> Dict[str, bytes]:
+        """Bulk lookup: local tier first, then a single Redis MGET for the rest"""
+        found: Dict[str, bytes] = {}
+        remote = []
+        for digest in dict.fromkeys(digests):
+            payload = self.local.get(digest)
+            if payload is not None:
+                self.counters["local_hits"] += 1
+                found[digest] = payload
+            else:
+                self.counters["local_misses"] += 1
+                remote.append(digest)
+        
+        if remote:
+            values = await self.cache_service.mget(
+                [self.KEY_PREFIX + d for d in remote],
+                parse=False
+            )
+            for digest, payload in zip(remote, values):
+                if payload is None:
+                    self.counters["redis_misses"] += 1
+                    continue
+                self.counters["redis_hits"] += 1
+                self.local.set(digest, payload)
+                found[digest] = payload
+        return found
+    
+    async def set_many(self, payloads: Dict[str, bytes]):
+        """Store freshly computed payloads in both tiers (one pipelined write)"""
+        if not payloads:
+            return
+        self.counters["computed"] += len(payloads)
+        for digest, payload in payloads.items():
+            self.local.set(digest, payload)
+        await self.cache_service.mset_with_ttl({
+            self.KEY_PREFIX + digest: payload for digest, payload in payloads.items()
+        })
+    
+    def stats(self) -> Dict[str, Any]:
+        local_lookups = self.counters["local_hits"] + self.counters["local_misses"]
+        redis_lookups = self.counters["redis_hits"] + self.counters["redis_misses"]
+        return {
+            **self.counters,
+            "local_entries": len(self.local),
+            "inflight": len(self._inflight),
+            "local_hit_ratio": self.counters["local_hits"] / local_lookups if local_lookups else 0.0,
+            "redis_hit_ratio": self.counters["redis_hits"] / redis_lookups if redis_lookups else 0.0,
+            "model_version": self.model_version
+        }
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple, Union
+
+import orjson
+from pymongo import UpdateOne
+
+from config.settings import settings
+from database.mongodb import get_database
+from services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+def score_summary(content_id: str, analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact safety score served by `/api/content/{content_id}/score`"""
+    toxicity = analysis.get("toxicity") or {}
+    age = analysis.get("age_appropriateness") or {}
+    return {
+        "content_id": content_id,
+        "is_safe": analysis.get("is_safe"),
+        "sensitivity": analysis.get("sensitivity"),
+        "toxicity_score": toxicity.get("overall_score"),
+        "is_toxic": toxicity.get("is_toxic"),
+        "min_age": age.get("min_age"),
+        "content_rating": age.get("content_rating")
+    }
+
+class AnalysisStore:
+    """Write-behind persistence of analysis results to MongoDB
+    
+    `record()` only buffers; a background task flushes the buffer with one
+    unordered `bulk_write` when it reaches `flush_size` items or every
+    `flush_interval` seconds, and warms the Redis score keys in the same
+    pass. Reads go Redis -> write buffer -> MongoDB. Encoded payloads are
+    buffered as is and only parsed when a document is built.
+    """
+    
+    COLLECTION = "content_analysis"
+    SCORE_KEY_PREFIX = "content_score:"
+    
+    def __init__(
+        self,
+        cache: CacheService,
+        flush_size: int = None,
+        flush_interval: float = None,
+        max_pending: int = None
+    ):
+        self.cache = cache
+        self.flush_size = flush_size or settings.ANALYSIS_STORE_FLUSH_SIZE
+        self.flush_interval = flush_interval or settings.ANALYSIS_STORE_FLUSH_INTERVAL
+        self.max_pending = max_pending or settings.ANALYSIS_STORE_MAX_PENDING
+        
+        # content_id -> (content_hash, payload, created_at)
+        self._buffer: "OrderedDict[str, Tuple[str, Any, datetime]]" = OrderedDict()
+        self._writing: Dict[str, Tuple[str, Any, datetime]] = {}
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        
+        self.written_total = 0
+        self.flushes_total = 0
+        self.dropped_total = 0
+        self.failed_flushes_total = 0
+    
+    @property
+    def collection(self):
+        db = get_database()
+        return db[self.COLLECTION] if db is not None else None
+    
+    async def start(self):
+        """Start the background flusher"""
+        if self._flusher is None:
+            self._flush_requested = asyncio.Event()
+            self._flusher = asyncio.create_task(self._run(), name="analysis-store-flusher")
+    
+    async def stop(self):
+        """Stop the flusher and write out whatever is still buffered"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+    
+    def record(
+        self,
+        content_hash: str,
+        analysis: Union[Dict[str, Any], bytes],
+        content_id: str = None
+    ):
+        """Buffer one analysis result (JSON-mode payload or encoded JSON) for persistence"""
+        content_id = content_id or analysis["content_id"]
+        self._buffer[content_id] = (content_hash, analysis, datetime.utcnow())
+        self._buffer.move_to_end(content_id)
+        
+        # Bound memory if MongoDB is unavailable for a while
+        while len(self._buffer) > self.max_pending:
+            self._buffer.popitem(last=False)
+            self.dropped_total += 1
+        
+        if len(self._buffer) >= self.flush_size and self._flush_requested is not None:
+            self._flush_requested.set()
+    
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+    
+    def _document(self, content_id: str, entry: Tuple[str, Any, datetime]) -> Dict[str, Any]:
+        """MongoDB document for a buffered entry"""
+        content_hash, analysis, created_at = entry
+        if isinstance(analysis, bytes):
+            analysis = orjson.loads(analysis)
+        return {
+            "content_id": content_id,
+            "content_hash": content_hash,
+            "analysis": {
+                "toxicity": analysis.get("toxicity"),
+                "sentiment": analysis.get("sentiment"),
+                "age_appropriateness": analysis.get("age_appropriateness"),
+                "sensitivity": analysis.get("sensitivity")
+            },
+            "is_safe": analysis.get("is_safe"),
+            "created_at": created_at,
+            "expires_at": created_at + timedelta(days=settings.DATA_RETENTION_DAYS)
+        }
+    
+    async def flush(self):
+        """Write buffered results with one unordered bulk write"""
+        async with self._flush_lock:
+            if not self._buffer or self.collection is None:
+                return
+            batch, self._buffer = self._buffer, OrderedDict()
+            self._writing = batch
+            docs = {
+                content_id: self._document(content_id, entry)
+                for content_id, entry in batch.items()
+            }
+            
+            try:
+                await self.collection.bulk_write(
+                    [
+                        UpdateOne({"content_id": content_id}, {"$set": doc}, upsert=True)
+                        for content_id, doc in docs.items()
+                    ],
+                    ordered=False
+                )
+                self.written_total += len(batch)
+                self.flushes_total += 1
+            except Exception as e:
+                self.failed_flushes_total += 1
+                logger.error(f"Analysis bulk write failed ({len(batch)} docs): {e}")
+                # Put the batch back ahead of newer results; record() bounds it
+                batch.update(self._buffer)
+                self._buffer = batch
+                return
+            finally:
+                self._writing = {}
+            
+            await self.cache.mset_with_ttl({
+                self.SCORE_KEY_PREFIX + content_id: score_summary(content_id, self._flatten(doc))
+                for content_id, doc in docs.items()
+            })
+    
+    async def get_score(self, content_id: str) -> Optional[Dict[str, Any]]:
+        """Read-through lookup: Redis, then the write buffer, then MongoDB"""
+        key = self.SCORE_KEY_PREFIX + content_id
+        score = await self.cache.get(key)
+        if score:
+            return score
+        
+        entry = self._buffer.get(content_id) or self._writing.get(content_id)
+        doc = self._document(content_id, entry) if entry is not None else None
+        if doc is None and self.collection is not None:
+            doc = await self.collection.find_one({"content_id": content_id}, {"_id": 0})
+        if doc is None:
+            return None
+        
+        score = score_summary(content_id, self._flatten(doc))
+        await self.cache.set(key, score)
+        return score
+    
+    def _flatten(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {**doc.get("analysis", {}), "is_safe": doc.get("is_safe")}
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._buffer),
+            "written_total": self.written_total,
+            "flushes_total": self.flushes_total,
+            "failed_flushes_total": self.failed_flushes_total,
+            "dropped_total": self.dropped_total
+        }
@@ -1,33 +1,68 @@
 import logging
-import json
-from typing import Any, Optional
+import zlib
+from typing import Any, Dict, List, Optional
+import orjson
 import redis.asyncio as redis
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# One-byte headers; JSON text never starts with a control character, so
+# values written by older versions (plain JSON) are still readable.
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+
+def encode_value(value: Any) -> bytes:
+    """Serialize with orjson, compressing payloads above the configured size
+    
+    `bytes` are taken to be already-encoded JSON and stored as is.
+    """
+    data = value if isinstance(value, bytes) else orjson.dumps(value)
+    if len(data) >= settings.CACHE_COMPRESSION_MIN_BYTES:
+        return _ZLIB + zlib.compress(data, settings.CACHE_COMPRESSION_LEVEL)
+    return _RAW + data
+
+def decode_value(raw: bytes, parse: bool = True) -> Any:
+    """Inverse of `encode_value`; with `parse=False` the JSON bytes are returned unparsed"""
+    header = raw[:1]
+    if header == _ZLIB:
+        data = zlib.decompress(raw[1:])
+    elif header == _RAW:
+        data = raw[1:]
+    else:
+        data = raw
+    return orjson.loads(data) if parse else data
+
 class CacheService:
     """Redis cache service"""
     
-    def __init__(self):
+    def __init__(self, pool: Optional[redis.ConnectionPool] = None):
+        self.pool = pool
         self.redis_client = None
     
     async def connect(self):
-        """Connect to Redis"""
+        """Connect to Redis (shared connection pool, created once)"""
         if not self.redis_client:
-            self.redis_client = await redis.from_url(
-                settings.REDIS_URL,
-                encoding="utf-8",
-                decode_responses=True
-            )
+            if self.pool is None:
+                self.pool = redis.ConnectionPool.from_url(
+                    settings.REDIS_URL,
+                    max_connections=settings.REDIS_MAX_CONNECTIONS
+                )
+            self.redis_client = redis.Redis(connection_pool=self.pool)
+    
+    async def close(self):
+        """Close pooled connections"""
+        if self.pool is not None:
+            await self.pool.disconnect()
+        self.redis_client = None
     
-    async def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
+    async def get(self, key: str, parse: bool = True) -> Optional[Any]:
+        """Get value from cache (encoded JSON bytes with `parse=False`)"""
         try:
             await self.connect()
             value = await self.redis_client.get(key)
             if value:
-                return json.loads(value)
+                return decode_value(value, parse)
             return None
         except Exception as e:
             logger.error(f"Cache get error: {e}")
@@ -41,11 +76,37 @@ class CacheService:
             await self.redis_client.setex(
                 key,
                 ttl,
-                json.dumps(value)
+                encode_value(value)
             )
         except Exception as e:
             logger.error(f"Cache set error: {e}")
     
+    async def mget(self, keys: List[str], parse: bool = True) -> List[Optional[Any]]:
+        """Get several values in one round trip (None for misses)"""
+        if not keys:
+            return []
+        try:
+            await self.connect()
+            values = await self.redis_client.mget(keys)
+            return [decode_value(value, parse) if value else None for value in values]
+        except Exception as e:
+            logger.error(f"Cache mget error: {e}")
+            return [None] * len(keys)
+    
+    async def mset_with_ttl(self, items: Dict[str, Any], ttl: int = None):
+        """Set several values with a TTL using one pipelined round trip"""
+        if not items:
+            return
+        try:
+            await self.connect()
+            ttl = ttl or settings.REDIS_TTL
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.setex(key, ttl, encode_value(value))
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Cache mset error: {e}")
+    
     async def delete(self, key: str):
         """Delete value from cache"""
         try:
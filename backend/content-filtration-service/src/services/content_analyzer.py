@@ -1,95 +1,355 @@
+import asyncio
 import logging
-from typing import List
+import time
+from typing import Dict, List, Optional, Tuple
 import uuid
 from datetime import datetime
 
+from config.settings import settings
 from models.schemas import (
+    AgeAppropriatenessScore,
+    BatchAnalysisItemResult,
     ContentAnalysisRequest,
     ContentAnalysisResponse,
-    SensitivityLevel
+    SensitivityLevel,
+    ToxicityScore
 )
-from ml.analyzers.toxicity_analyzer import ToxicityAnalyzer
+from ml.analyzers.toxicity_analyzer import ToxicityAnalyzer, ToxicityBatch, severity_for
 from ml.analyzers.age_analyzer import AgeAppropriatenessAnalyzer
+from ml.inference.executor import InferenceSaturatedError
+from utils.deadline import Deadline
+from utils.histogram import LATENCY_BOUNDS_SECONDS, BucketHistogram
 
 logger = logging.getLogger(__name__)
 
+# Cascade tiers: "cache" is decided before the analyzer runs, "lexical" marks
+# pattern-only fallbacks (deadline skips, model failures), "model" the rest
+CASCADE_TIERS = ("cache", "lexical", "model")
+
+# Timed stages of `analyze` (the cache stage is timed by AnalysisCache)
+ANALYSIS_STAGES = ("lexical", "toxicity", "age", "sensitivity")
+
+# Smoothing of the model-stage latency estimate used against deadlines
+_LATENCY_EWMA_ALPHA = 0.2
+# Decay of the estimate per deadline skip, so a probe call eventually runs
+# and re-measures the model after a slow spell
+_LATENCY_SKIP_DECAY = 0.9
+
+# Pattern-only score per mature-pattern hit when the model is skipped
+_LEXICAL_HIT_SCORE = 0.1
+
 class ContentAnalyzer:
     """Main content analysis service"""
     
-    def __init__(self):
-        # Models will be loaded from app state
-        self.toxicity_analyzer = None
-        self.age_analyzer = AgeAppropriatenessAnalyzer()
+    def __init__(
+        self,
+        toxicity_analyzer: Optional[ToxicityAnalyzer] = None,
+        age_analyzer: Optional[AgeAppropriatenessAnalyzer] = None
+    ):
+        # Analyzers are built once by the app-scoped ModelRegistry
+        self.toxicity_analyzer = toxicity_analyzer
+        self.age_analyzer = age_analyzer or AgeAppropriatenessAnalyzer()
+        
+        # Which cascade tier decided each result
+        self.tier_counts = {tier: 0 for tier in CASCADE_TIERS}
+        
+        # Model-stage latency (EWMA, seeded with a prior) and stages skipped to meet deadlines
+        self.model_latency_ms = settings.DEADLINE_MODEL_LATENCY_PRIOR_MS
+        self.deadline_skips = {"toxicity_model": 0}
+        # Model calls that failed and fell back to the pattern-only score
+        self.model_failures_total = 0
+        
+        # Per-stage latency, read by the /metrics collector at scrape time
+        self.stage_seconds = {
+            stage: BucketHistogram(LATENCY_BOUNDS_SECONDS) for stage in ANALYSIS_STAGES
+        }
+        self.errors_total = 0
     
-    async def analyze(self, request: ContentAnalysisRequest) -> ContentAnalysisResponse:
-        """Analyze a single piece of content"""
+    async def analyze(
+        self,
+        request: ContentAnalysisRequest,
+        deadline: Optional[Deadline] = None
+    ) -> ContentAnalysisResponse:
+        """Analyze a single piece of content
+        
+        With a deadline, the toxicity model is skipped when it cannot finish
+        in the remaining budget; the score then comes from the mature-pattern
+        counts alone and the response lists the model under `skipped_analyses`.
+        The same happens when the model fails. Such partial results must not
+        be cached, persisted or indexed.
+        """
         try:
-            content_id = request.content_id or str(uuid.uuid4())
-            
-            # TODO: Get model from app state
-            # For now, create placeholder analyzers
-            from ml.models.model_loader import ModelLoader
-            loader = ModelLoader()
-            # await loader.load_models()
+            # Mature-pattern scan, shared by the age stage and the fallback score
+            start = time.perf_counter()
+            mature_flags = self.age_analyzer.count_categories(request.content)
+            decided_by = "model"
+            skipped = []
+            self.stage_seconds["lexical"].observe(time.perf_counter() - start)
             
-            # Analyze toxicity (placeholder for now)
-            from models.schemas import ToxicityScore
-            toxicity = ToxicityScore(
-                overall_score=0.1,
-                categories={},
-                is_toxic=False,
-                severity="low"
-            )
+            # Analyze toxicity (batched through the shared micro-batcher)
+            if self.toxicity_analyzer is not None:
+                start = time.perf_counter()
+                toxicity = await self._model_toxicity(request.content, deadline)
+                self.stage_seconds["toxicity"].observe(time.perf_counter() - start)
+                if toxicity is None:
+                    decided_by = "lexical"
+                    toxicity = self._lexical_toxicity(mature_flags)
+                    skipped.append("toxicity_model")
+            else:
+                toxicity = self._placeholder_toxicity()
             
-            # Analyze age appropriateness
-            age_appropriateness = await self.age_analyzer.analyze(
+            age_appropriateness, sensitivity, is_safe = await self._assess(
                 request.content,
-                toxicity.overall_score
+                toxicity.overall_score,
+                toxicity.is_toxic,
+                mature_flags=mature_flags
             )
-            
-            # Determine sensitivity level
-            sensitivity = self._determine_sensitivity(toxicity, age_appropriateness)
-            
-            # Determine if content is safe
-            is_safe = (
-                not toxicity.is_toxic and
-                age_appropriateness.min_age < 18 and
-                sensitivity in [SensitivityLevel.SAFE, SensitivityLevel.MILD]
+            self.tier_counts[decided_by] += 1
+            return self._build_response(
+                request,
+                toxicity,
+                age_appropriateness,
+                sensitivity,
+                is_safe,
+                decided_by=decided_by,
+                skipped_analyses=skipped
             )
-            
-            return ContentAnalysisResponse(
-                content_id=content_id,
-                toxicity=toxicity,
-                age_appropriateness=age_appropriateness,
-                sensitivity=sensitivity,
-                is_safe=is_safe,
-                recommendations={
-                    "action": "allow" if is_safe else "review",
-                    "confidence": 0.85
-                }
-            )
-            
+        
         except Exception as e:
+            self.errors_total += 1
             logger.error(f"Content analysis failed: {e}")
             raise
     
-    async def batch_analyze(self, items: List[ContentAnalysisRequest]) -> List[ContentAnalysisResponse]:
-        """Analyze multiple content items"""
+    async def batch_analyze(
+        self,
+        items: List[ContentAnalysisRequest],
+        max_concurrency: Optional[int] = None
+    ) -> List[BatchAnalysisItemResult]:
+        """Analyze multiple content items
+        
+        Identical texts are analyzed once, toxicity runs as batched model
+        calls, and the age/sensitivity stage runs concurrently (bounded by
+        `max_concurrency`). Each item gets its own result or error, in input
+        order, so one bad item does not fail the batch: the texts of a model
+        chunk that failed get errors, never fallback scores. Only when every
+        chunk was rejected for saturation does the whole batch raise
+        InferenceSaturatedError, so callers can back off and retry.
+        """
+        # Dedupe identical texts, keeping first-seen order
+        unique_texts = list(dict.fromkeys(item.content for item in items))
+        
+        # Mature-pattern counts for every unique text in one scan
+        mature_flags = dict(zip(
+            unique_texts,
+            self.age_analyzer.count_categories_batch(unique_texts)
+        ))
+        
+        # One model call per batch-size chunk. Scores stay columnar
+        # (text -> batch row) until a response is built.
+        scored: Dict[str, Tuple[ToxicityBatch, int]] = {}
+        failed: Dict[str, Exception] = {}
+        placeholder = None
+        if self.toxicity_analyzer is not None:
+            chunk_size = max(1, settings.TOXICITY_BATCH_MAX_SIZE)
+            chunks = [
+                unique_texts[start:start + chunk_size]
+                for start in range(0, len(unique_texts), chunk_size)
+            ]
+            batches = await asyncio.gather(
+                *(self.toxicity_analyzer.score_batch(chunk) for chunk in chunks),
+                return_exceptions=True
+            )
+            if batches and all(isinstance(batch, InferenceSaturatedError) for batch in batches):
+                raise batches[0]
+            for chunk, batch in zip(chunks, batches):
+                if isinstance(batch, asyncio.CancelledError):
+                    raise batch
+                if isinstance(batch, BaseException):
+                    self.model_failures_total += 1
+                    failed.update((text, batch) for text in chunk)
+                else:
+                    scored.update((text, (batch, row)) for row, text in enumerate(chunk))
+        else:
+            placeholder = self._placeholder_toxicity()
+        
+        def toxicity_fields(text: str) -> Tuple[float, bool]:
+            if placeholder is not None:
+                return placeholder.overall_score, placeholder.is_toxic
+            batch, row = scored[text]
+            return float(batch.overall[row]), bool(batch.is_toxic[row])
+        
+        # Age/sensitivity stage per unique text, with per-text isolation
+        semaphore = asyncio.Semaphore(max_concurrency or settings.BATCH_ANALYSIS_CONCURRENCY)
+        
+        async def assess(text: str):
+            async with semaphore:
+                try:
+                    return await self._assess(
+                        text,
+                        *toxicity_fields(text),
+                        mature_flags=mature_flags[text]
+                    )
+                except Exception as e:
+                    logger.error(f"Batch item analysis failed: {e}")
+                    return e
+        
+        assessments = dict(zip(
+            unique_texts,
+            await asyncio.gather(*(assess(text) for text in unique_texts if text not in failed))
+        ))
+        assessments.update(failed)
+        
         results = []
-        for item in items:
-            result = await self.analyze(item)
-            results.append(result)
+        for index, item in enumerate(items):
+            assessment = assessments[item.content]
+            if isinstance(assessment, Exception):
+                results.append(BatchAnalysisItemResult(
+                    index=index,
+                    content_id=item.content_id,
+                    error=str(assessment)
+                ))
+                continue
+            
+            if placeholder is not None:
+                toxicity = placeholder
+            else:
+                batch, row = scored[item.content]
+                toxicity = batch.score(row)
+            self.tier_counts["model"] += 1
+            response = self._build_response(item, toxicity, *assessment)
+            results.append(BatchAnalysisItemResult(
+                index=index,
+                content_id=response.content_id,
+                result=response
+            ))
         return results
     
-    def _determine_sensitivity(self, toxicity, age_appropriateness) -> SensitivityLevel:
+    async def _assess(
+        self,
+        text: str,
+        toxicity_score: float,
+        is_toxic: bool,
+        mature_flags: Optional[Dict[str, int]] = None
+    ) -> Tuple[AgeAppropriatenessScore, SensitivityLevel, bool]:
+        """Run the age/sensitivity stage on top of a toxicity score"""
+        # Analyze age appropriateness
+        start = time.perf_counter()
+        age_appropriateness = await self.age_analyzer.analyze(
+            text,
+            toxicity_score,
+            mature_flags=mature_flags
+        )
+        age_done = time.perf_counter()
+        
+        # Determine sensitivity level
+        sensitivity = self._determine_sensitivity(toxicity_score, age_appropriateness)
+        self.stage_seconds["age"].observe(age_done - start)
+        self.stage_seconds["sensitivity"].observe(time.perf_counter() - age_done)
+        
+        # Determine if content is safe
+        is_safe = (
+            not is_toxic and
+            age_appropriateness.min_age < 18 and
+            sensitivity in [SensitivityLevel.SAFE, SensitivityLevel.MILD]
+        )
+        return age_appropriateness, sensitivity, is_safe
+    
+    def _build_response(
+        self,
+        request: ContentAnalysisRequest,
+        toxicity: ToxicityScore,
+        age_appropriateness: AgeAppropriatenessScore,
+        sensitivity: SensitivityLevel,
+        is_safe: bool,
+        decided_by: str = "model",
+        skipped_analyses: Optional[List[str]] = None
+    ) -> ContentAnalysisResponse:
+        return ContentAnalysisResponse(
+            content_id=request.content_id or str(uuid.uuid4()),
+            toxicity=toxicity,
+            age_appropriateness=age_appropriateness,
+            sensitivity=sensitivity,
+            is_safe=is_safe,
+            recommendations={
+                "action": "allow" if is_safe else "review",
+                "confidence": 0.85
+            },
+            decided_by=decided_by,
+            skipped_analyses=skipped_analyses or []
+        )
+    
+    async def _model_toxicity(self, text: str, deadline: Optional[Deadline]) -> Optional[ToxicityScore]:
+        """Model toxicity score, or None when the model failed or would not be ready by the deadline"""
+        if deadline is None:
+            return await self._timed_model_call(text)
+        
+        budget = deadline.remaining() - settings.DEADLINE_RESERVE_MS / 1000.0
+        if budget <= 0:
+            self.deadline_skips["toxicity_model"] += 1
+            return None
+        if self.model_latency_ms / 1000.0 > budget:
+            # Skips never measure the model; decay instead so the estimate
+            # cannot stay pinned above the budgets clients send
+            self.model_latency_ms *= _LATENCY_SKIP_DECAY
+            self.deadline_skips["toxicity_model"] += 1
+            return None
+        try:
+            return await asyncio.wait_for(self._timed_model_call(text), budget)
+        except asyncio.TimeoutError:
+            self.deadline_skips["toxicity_model"] += 1
+            return None
+    
+    async def _timed_model_call(self, text: str) -> Optional[ToxicityScore]:
+        start = time.perf_counter()
+        completed = False
+        try:
+            result = await self.toxicity_analyzer.analyze(text)
+            completed = result is not None
+            if not completed:
+                self.model_failures_total += 1
+            return result
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            # A call cut off by a deadline only shows the model takes at least
+            # that long: it can raise the estimate, with half the weight
+            if completed:
+                self.model_latency_ms += _LATENCY_EWMA_ALPHA * (elapsed_ms - self.model_latency_ms)
+            elif elapsed_ms > self.model_latency_ms:
+                self.model_latency_ms += _LATENCY_EWMA_ALPHA / 2 * (elapsed_ms - self.model_latency_ms)
+    
+    def _lexical_toxicity(self, mature_flags: Dict[str, int]) -> ToxicityScore:
+        """Pattern-only estimate used when the model is skipped or fails
+        
+        Pattern prefixes also match benign words ("hello", "blood drive"), so
+        they never mark content toxic on their own; the score is capped at
+        the toxicity threshold and only feeds the sensitivity level.
+        """
+        score = min(settings.TOXICITY_THRESHOLD, _LEXICAL_HIT_SCORE * sum(mature_flags.values()))
+        return ToxicityScore(
+            overall_score=score,
+            categories={},
+            is_toxic=False,
+            severity=severity_for(score)
+        )
+    
+    def _placeholder_toxicity(self) -> ToxicityScore:
+        """Placeholder until the toxicity model is available"""
+        return ToxicityScore(
+            overall_score=0.1,
+            categories={},
+            is_toxic=False,
+            severity="low"
+        )
+    
+    def _determine_sensitivity(self, toxicity_score: float, age_appropriateness) -> SensitivityLevel:
         """Determine overall sensitivity level"""
-        if toxicity.overall_score > 0.7:
+        if toxicity_score > 0.7:
             return SensitivityLevel.EXPLICIT
-        elif toxicity.overall_score > 0.5 or age_appropriateness.min_age >= 18:
+        elif toxicity_score > 0.5 or age_appropriateness.min_age >= 18:
             return SensitivityLevel.HIGH
-        elif toxicity.overall_score > 0.3 or age_appropriateness.min_age >= 13:
+        elif toxicity_score > 0.3 or age_appropriateness.min_age >= 13:
             return SensitivityLevel.MODERATE
-        elif toxicity.overall_score > 0.1:
+        elif toxicity_score > 0.1:
             return SensitivityLevel.MILD
         else:
             return SensitivityLevel.SAFE
@@ -0,0 +1,375 @@
+"""Content and interest embeddings for ranking feed candidates by interest
+
+Content embeddings live in an `EmbeddingIndex`: a preallocated int8 (or
+float32) matrix with one row per embedded text, keyed by the text's
+`SafetyIndex` sequence number, so the bulk safety lookup a feed request
+already does also finds its embeddings. The index is an IVF: once enough
+rows are stored, spherical k-means (plain NumPy) trains `n_lists` coarse
+centroids and every row records its nearest one. A query only reads the
+rows of the `nprobe` lists closest to it; rows elsewhere are treated as
+unrelated (similarity 0). `python benchmarks/bench_embedding_index.py`
+measures latency and recall against exact search.
+
+Feed candidates that are indexed but not yet embedded are queued on
+`DeferredEmbedding` when they carry their text; interest strings are
+embedded on demand and cached in `InterestVectors`.
+"""
+import asyncio
+import logging
+from itertools import repeat
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from ml.inference.executor import InferenceSaturatedError
+from services.analysis_cache import LocalTTLCache
+from services.feed_ranking import top_k
+from services.safety_index import SafetyIndex
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_STORAGES = ("int8", "float32")
+
+# Training waits for this many stored rows per list
+_TRAIN_POINTS_PER_LIST = 40
+
+# Rows dequantized per matrix product, bounds the float32 scratch space
+_CHUNK_ROWS = 8192
+
+Encode = Callable[[List[str]], Awaitable[np.ndarray]]
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 codes and the scales that restore them"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """k unit-length centroids of unit-length vectors (cosine k-means)"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        # Empty clusters keep their previous centroid
+        filled = norms > 0
+        centroids[filled] = sums[filled] / norms[filled, None]
+    return centroids
+
+def train_ivf(vectors: np.ndarray, n_lists: int) -> Tuple[np.ndarray, np.ndarray]:
+    """IVF centroids and the list of every training vector"""
+    centroids = spherical_kmeans(vectors, n_lists)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+class EmbeddingIndex:
+    """Bounded store of unit-length embeddings with an IVF coarse quantizer
+    
+    Rows form a ring: when the index is full the oldest row is reused and
+    its key dropped. Keys are `SafetyIndex` sequence numbers, which are
+    never reused, so a key names one indexed text for good.
+    """
+    
+    def __init__(
+        self,
+        capacity: int = None,
+        dim: int = None,
+        storage: str = None,
+        n_lists: int = None,
+        nprobe: int = None
+    ):
+        self.capacity = max(1, capacity or settings.EMBEDDING_INDEX_MAX_ENTRIES)
+        self.dim = dim or settings.EMBEDDING_DIM
+        self.storage = storage or settings.EMBEDDING_STORAGE
+        if self.storage not in EMBEDDING_STORAGES:
+            raise ValueError(
+                f"Unknown embedding storage {self.storage!r}; expected one of {EMBEDDING_STORAGES}"
+            )
+        self.n_lists = settings.EMBEDDING_IVF_LISTS if n_lists is None else n_lists
+        self.nprobe = settings.EMBEDDING_IVF_NPROBE if nprobe is None else nprobe
+        
+        dtype = np.int8 if self.storage == "int8" else np.float32
+        self.codes = np.zeros((self.capacity, self.dim), dtype=dtype)
+        self.scales = np.ones(self.capacity, dtype=np.float32)
+        # IVF list of every row, -1 before training
+        self.lists = np.full(self.capacity, -1, dtype=np.int16 if self.n_lists < 2 ** 15 else np.int32)
+        self.centroids: Optional[np.ndarray] = None
+        self._row_key = np.full(self.capacity, -1, dtype=np.int64)
+        self._by_key: Dict[int, int] = {}
+        self._next_row = 0
+        
+        self.added_total = 0
+        self.queries_total = 0
+        self.rows_scanned_total = 0
+    
+    def __len__(self) -> int:
+        return len(self._by_key)
+    
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Row of every key, -1 for keys without an embedding"""
+        return np.fromiter(
+            map(self._by_key.get, keys.tolist(), repeat(-1)),
+            dtype=np.int64,
+            count=len(keys)
+        )
+    
+    def add(self, keys: Sequence[int], vectors: np.ndarray) -> int:
+        """Store unit-length embeddings under their keys, returning how many were new"""
+        rows = []
+        for key in keys:
+            row = self._by_key.get(key)
+            if row is None:
+                row = self._next_row % self.capacity
+                self._next_row += 1
+                evicted = self._row_key[row]
+                if evicted >= 0:
+                    del self._by_key[int(evicted)]
+                self._row_key[row] = key
+                self._by_key[key] = row
+                self.added_total += 1
+            rows.append(row)
+        rows = np.asarray(rows, dtype=np.int64)
+        
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.storage == "int8":
+            self.codes[rows], self.scales[rows] = quantize_int8(vectors)
+        else:
+            self.codes[rows] = vectors
+        if self.centroids is not None:
+            self.lists[rows] = np.argmax(vectors @ self.centroids.T, axis=1)
+        return len(rows)
+    
+    @property
+    def needs_training(self) -> bool:
+        return (
+            self.centroids is None
+            and self.n_lists > 1
+            and len(self) >= _TRAIN_POINTS_PER_LIST * self.n_lists
+        )
+    
+    def training_sample(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Rows, keys and float32 copies of the stored embeddings, for training off the event loop"""
+        rows = np.flatnonzero(self._row_key >= 0)
+        return rows, self._row_key[rows], self.vectors(rows)
+    
+    def set_centroids(
+        self,
+        centroids: np.ndarray,
+        rows: np.ndarray,
+        keys: np.ndarray,
+        assignment: np.ndarray
+    ):
+        """Install trained centroids with the list assignment of the training sample
+        
+        Rows reused or added while training ran are assigned here.
+        """
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        unchanged = self._row_key[rows] == keys
+        self.lists[rows[unchanged]] = assignment[unchanged]
+        rest = np.flatnonzero(self._row_key >= 0)
+        rest = rest[np.isin(rest, rows[unchanged], assume_unique=True, invert=True)]
+        if len(rest):
+            self.lists[rest] = np.argmax(self.vectors(rest) @ self.centroids.T, axis=1)
+        logger.info(f"Embedding index trained {len(self.centroids)} IVF lists on {len(rows)} rows")
+    
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Stored embeddings of rows as float32"""
+        if self.storage == "int8":
+            return self.codes[rows].astype(np.float32) * self.scales[rows, None]
+        return self.codes[rows]
+    
+    def _probed(self, queries: np.ndarray, nprobe: Optional[int]) -> Optional[np.ndarray]:
+        """Mask of the lists closest to any query, None for an exact search"""
+        nprobe = self.nprobe if nprobe is None else nprobe
+        if self.centroids is None or nprobe <= 0 or nprobe >= len(self.centroids):
+            return None
+        closest = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        probed = np.zeros(len(self.centroids), dtype=bool)
+        probed[closest.ravel()] = True
+        return probed
+    
+    def _in_probed(self, rows: np.ndarray, probed: np.ndarray) -> np.ndarray:
+        lists = self.lists[rows]
+        # Rows without a list yet are always read
+        return (lists < 0) | probed[lists]
+    
+    def _max_similarity(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Best cosine similarity of every row to any of the queries"""
+        similarity = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), _CHUNK_ROWS):
+            chunk = rows[start:start + _CHUNK_ROWS]
+            if chunk[-1] - chunk[0] == len(chunk) - 1:
+                # Sorted, contiguous rows (exhaustive scans): a view instead of a copy
+                chunk = slice(chunk[0], chunk[-1] + 1)
+            # Row scales commute with the product: (s * codes) @ q == s * (codes @ q)
+            products = self.codes[chunk].astype(np.float32, copy=False) @ queries.T
+            if self.storage == "int8":
+                products *= self.scales[chunk, None]
+            similarity[start:start + len(products)] = products.max(axis=1)
+        self.queries_total += 1
+        self.rows_scanned_total += len(rows)
+        return similarity
+    
+    def similarity(self, queries: np.ndarray, rows: np.ndarray, nprobe: int = None) -> np.ndarray:
+        """Similarity (clipped to 0-1) of the given rows to the closest query
+        
+        Rows outside the probed lists are not read and score 0.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        similarity = np.zeros(len(rows), dtype=np.float32)
+        probed = self._probed(queries, nprobe)
+        scanned = np.arange(len(rows)) if probed is None else np.flatnonzero(self._in_probed(rows, probed))
+        if len(scanned):
+            similarity[scanned] = np.clip(self._max_similarity(queries, rows[scanned]), 0.0, 1.0)
+        return similarity
+    
+    def search(self, queries: np.ndarray, k: int, nprobe: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Keys and similarities of the `k` stored embeddings closest to any query, best first
+        
+        `nprobe=0` searches exhaustively. List membership is a scan of the
+        narrow `lists` column; only vectors in probed lists are read.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        rows = np.flatnonzero(self._row_key >= 0)
+        probed = self._probed(queries, nprobe)
+        if probed is not None:
+            rows = rows[self._in_probed(rows, probed)]
+        similarity = self._max_similarity(queries, rows)
+        best = top_k(similarity, np.ones(len(rows), dtype=bool), k)
+        return self._row_key[rows[best]], similarity[best]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self),
+            "capacity": self.capacity,
+            "dim": self.dim,
+            "storage": self.storage,
+            "bytes": self.codes.nbytes + self.scales.nbytes + self.lists.nbytes,
+            "ivf_lists": 0 if self.centroids is None else len(self.centroids),
+            "nprobe": self.nprobe,
+            "added_total": self.added_total,
+            "queries_total": self.queries_total,
+            "avg_rows_scanned": self.rows_scanned_total / self.queries_total if self.queries_total else 0.0
+        }
+
+class InterestVectors:
+    """Embeddings of users' interest strings, cached per string"""
+    
+    def __init__(self, encode: Encode, max_entries: int = None, ttl_seconds: float = None):
+        self.encode = encode
+        self._cache = LocalTTLCache(
+            settings.EMBEDDING_INTEREST_CACHE_SIZE if max_entries is None else max_entries,
+            ttl_seconds or settings.EMBEDDING_INTEREST_CACHE_TTL
+        )
+    
+    async def get(self, interests: Sequence[str]) -> np.ndarray:
+        """(len(interests), dim) matrix; misses are embedded in one batch"""
+        vectors = [self._cache.get(interest) for interest in interests]
+        missing = sorted({interest for interest, vector in zip(interests, vectors) if vector is None})
+        if missing:
+            encoded = dict(zip(missing, await self.encode(missing)))
+            for interest, vector in encoded.items():
+                self._cache.set(interest, vector)
+            vectors = [
+                encoded[interest] if vector is None else vector
+                for interest, vector in zip(interests, vectors)
+            ]
+        return np.stack(vectors)
+
+class DeferredEmbedding:
+    """Background embedding of indexed feed candidates that have none yet
+    
+    `submit()` never waits: (safety index key, text) pairs are queued up to
+    `max_pending` and embedded `batch_size` at a time. New embeddings mark
+    their safety index rows as updated, so cached feeds re-rank them. The
+    IVF lists are trained in a worker thread once enough rows are stored.
+    """
+    
+    def __init__(
+        self,
+        encode: Encode,
+        index: EmbeddingIndex,
+        safety_index: SafetyIndex,
+        max_pending: int = None,
+        batch_size: int = None
+    ):
+        self.encode = encode
+        self.index = index
+        self.safety_index = safety_index
+        self.max_pending = max_pending or settings.EMBEDDING_MAX_PENDING
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self._queue: "asyncio.Queue[Tuple[int, str]]" = asyncio.Queue()
+        self._pending: Set[int] = set()
+        self._worker: Optional[asyncio.Task] = None
+        
+        self.submitted_total = 0
+        self.embedded_total = 0
+        self.dropped_total = 0
+        self.failed_total = 0
+    
+    def submit(self, items: Sequence[Tuple[int, str]]) -> int:
+        """Queue (key, text) pairs, returning how many were accepted"""
+        accepted = 0
+        for key, text in items:
+            if key in self._pending:
+                continue
+            if len(self._pending) >= self.max_pending:
+                self.dropped_total += 1
+                continue
+            self._pending.add(key)
+            self._queue.put_nowait((key, text))
+            accepted += 1
+        self.submitted_total += accepted
+        return accepted
+    
+    async def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run(), name="deferred-embedding")
+    
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+    
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            keys = [key for key, _ in batch]
+            try:
+                while True:
+                    try:
+                        vectors = await self.encode([text for _, text in batch])
+                        break
+                    except InferenceSaturatedError as e:
+                        await asyncio.sleep(e.retry_after)
+                self.index.add(keys, vectors)
+                self.safety_index.touch(keys)
+                self.embedded_total += len(batch)
+                if self.index.needs_training:
+                    rows, sample_keys, sample = self.index.training_sample()
+                    centroids, assignment = await asyncio.to_thread(train_ivf, sample, self.index.n_lists)
+                    self.index.set_centroids(centroids, rows, sample_keys, assignment)
+            except Exception as e:
+                self.failed_total += len(batch)
+                logger.error(f"Embedding {len(batch)} feed candidates failed: {e}")
+            finally:
+                self._pending.difference_update(keys)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "submitted_total": self.submitted_total,
+            "embedded_total": self.embedded_total,
+            "dropped_total": self.dropped_total,
+            "failed_total": self.failed_total
+        }
@@ -1,32 +1,487 @@
+"""Online fairness monitoring of moderation decisions per demographic group
+
+Every analysis whose request names a demographic group (in `metadata`,
+see `FAIRNESS_GROUP_FIELD`) counts as one decision for that group;
+flagged (not `is_safe`) decisions are positives. Reviewed ground truth
+(`FAIRNESS_LABEL_FIELD` in the same metadata, or later through
+`record_label`) adds label positives, true positives and false positives.
+Counters live in a ring of time buckets, one (groups, buckets, counters)
+int64 array, so any time range is a sum over its buckets: O(groups x
+buckets), never a scan of raw decisions. The gaps follow the offline
+`FairnessEvaluator` (ml-models/evaluation): demographic parity is the
+max - min positive rate across groups; equal opportunity is the max - min
+true positive rate (the offline script reports fairlearn's equalized odds
+difference, which also includes false positive rates). Each worker
+process counts its own decisions and adds them to the shared per-bucket
+counters in `fairness_counts` with `$inc`, so reports read from MongoDB
+cover every process and replica. Gaps and per-group rates over
+`FAIRNESS_DEFAULT_RANGE` are also written to `fairness_metrics` as
+snapshots, one per bucket, for dashboards and history.
+"""
+import asyncio
 import logging
-from datetime import datetime
-from models.schemas import BiasMetrics
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import orjson
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config.settings import settings
+from database.mongodb import get_database
+from models.schemas import BiasMetrics, ContentAnalysisRequest
 
 logger = logging.getLogger(__name__)
 
+FAIRNESS_COUNTERS = ("decisions", "positives", "label_positives", "true_positives", "false_positives")
+DECISIONS, POSITIVES, LABEL_POSITIVES, TRUE_POSITIVES, FALSE_POSITIVES = range(len(FAIRNESS_COUNTERS))
+
+# Groups beyond FAIRNESS_MAX_GROUPS are counted together
+OTHER_GROUP = "other"
+
+_TIME_RANGE_UNITS = {"m": 60, "h": 3600, "d": 86400}
+
+def parse_time_range(time_range: str) -> int:
+    """Seconds in a range such as "30m", "24h" or "7d" """
+    unit = _TIME_RANGE_UNITS.get(time_range[-1:])
+    amount = time_range[:-1]
+    if unit is None or not amount.isdigit() or int(amount) == 0:
+        raise ValueError(f"Invalid time range {time_range!r}; expected e.g. 30m, 24h or 7d")
+    return int(amount) * unit
+
+def _rates(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Per-group rates, NaN where the group has no denominator"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1), np.nan)
+
+def _gap(numerator: np.ndarray, denominator: np.ndarray, min_size: int) -> Optional[float]:
+    """max - min rate over groups with at least `min_size` in the denominator (None below two)"""
+    eligible = denominator >= max(min_size, 1)
+    if np.count_nonzero(eligible) < 2:
+        return None
+    rates = numerator[eligible] / denominator[eligible]
+    return float(rates.max() - rates.min())
+
+def _gaps(counts: np.ndarray, min_size: int) -> Dict[str, Optional[float]]:
+    """Fairness gaps from per-group counter totals, shape (groups, counters)"""
+    false_negatives = counts[:, LABEL_POSITIVES] - counts[:, TRUE_POSITIVES]
+    errors = false_negatives + counts[:, FALSE_POSITIVES]
+    return {
+        "demographic_parity_gap": _gap(counts[:, POSITIVES], counts[:, DECISIONS], min_size),
+        "equal_opportunity_gap": _gap(counts[:, TRUE_POSITIVES], counts[:, LABEL_POSITIVES], min_size),
+        # Share of a group's errors that are false negatives
+        "treatment_equality_gap": _gap(false_negatives, errors, min_size)
+    }
+
+class FairnessMonitor:
+    """Per-group decision counters in time-bucketed ring buffers
+    
+    A bucket slot is cleared when the clock first reaches a new bucket
+    epoch for it, so old counts drop out as the ring wraps. Increments not
+    yet written are also kept in `unflushed`; every
+    `FAIRNESS_PERSIST_INTERVAL` seconds a background task adds them to the
+    `fairness_counts` documents of their bucket and group. While that write
+    is in flight they sit in `flushing`, which reads still include. Counters,
+    not rates, are stored, so writes from any number of processes sum up and
+    `shared_report()` computes rates and gaps on read.
+    """
+    
+    COLLECTION = "fairness_counts"
+    METRICS_COLLECTION = "fairness_metrics"
+    
+    def __init__(
+        self,
+        bucket_seconds: int = None,
+        buckets: int = None,
+        max_groups: int = None,
+        min_group_size: int = None
+    ):
+        self.bucket_seconds = max(1, bucket_seconds or settings.FAIRNESS_BUCKET_SECONDS)
+        self.buckets = max(1, buckets or settings.FAIRNESS_BUCKETS)
+        self.max_groups = max(2, max_groups or settings.FAIRNESS_MAX_GROUPS)
+        self.min_group_size = settings.FAIRNESS_MIN_GROUP_SIZE if min_group_size is None else min_group_size
+        
+        self.counts = np.zeros((self.max_groups, self.buckets, len(FAIRNESS_COUNTERS)), dtype=np.int64)
+        # Increments not yet added to the shared counters, and those being added
+        self.unflushed = np.zeros_like(self.counts)
+        self.flushing = np.zeros_like(self.counts)
+        # Bucket epoch (time // bucket_seconds) each slot currently holds
+        self.bucket_epoch = np.full(self.buckets, -1, dtype=np.int64)
+        self.groups: Dict[str, int] = {}
+        self._persister: Optional[asyncio.Task] = None
+        
+        self.decisions_total = 0
+        self.labels_total = 0
+        self.stale_total = 0
+        self.persisted_total = 0
+        self.failed_persists_total = 0
+    
+    def _group(self, group: str) -> int:
+        index = self.groups.get(group)
+        if index is None:
+            if len(self.groups) >= self.max_groups - 1 and group != OTHER_GROUP:
+                return self._group(OTHER_GROUP)
+            index = self.groups[group] = len(self.groups)
+        return index
+    
+    def _slot(self, at: float) -> Optional[int]:
+        """Ring slot of the bucket holding time `at`, None outside the ring (or in the future)"""
+        epoch = int(at // self.bucket_seconds)
+        slot = epoch % self.buckets
+        held = self.bucket_epoch[slot]
+        current = int(time.time() // self.bucket_seconds)
+        if held > epoch or epoch > current or current - epoch >= self.buckets:
+            return None
+        if held < epoch:
+            self.counts[:, slot] = 0
+            self.unflushed[:, slot] = 0
+            self.flushing[:, slot] = 0
+            self.bucket_epoch[slot] = epoch
+        return slot
+    
+    def _add(self, group: str, at: Optional[float], counters: List[int]) -> bool:
+        """Increment counters of `group` in the bucket of `at`; False if it is outside the ring"""
+        slot = self._slot(time.time() if at is None else at)
+        if slot is None:
+            self.stale_total += 1
+            return False
+        index = self._group(group)
+        self.counts[index, slot, counters] += 1
+        self.unflushed[index, slot, counters] += 1
+        return True
+    
+    @staticmethod
+    def _label_counters(flagged: bool, label: bool) -> List[int]:
+        if label:
+            return [LABEL_POSITIVES, TRUE_POSITIVES] if flagged else [LABEL_POSITIVES]
+        return [FALSE_POSITIVES] if flagged else []
+    
+    def record_decision(self, group: str, flagged: bool, label: Optional[bool] = None, at: float = None):
+        """Count one moderation decision (and its ground truth, when known)"""
+        counters = [DECISIONS, POSITIVES] if flagged else [DECISIONS]
+        if label is not None:
+            counters += self._label_counters(flagged, label)
+        if not self._add(group, at, counters):
+            return
+        self.decisions_total += 1
+        if label is not None:
+            self.labels_total += 1
+    
+    def record_label(self, group: str, flagged: bool, label: bool, at: float = None):
+        """Count reviewed ground truth for a decision already counted (at its decision time)"""
+        if self._add(group, at, self._label_counters(flagged, label)):
+            self.labels_total += 1
+    
+    def record_analysis(self, request: ContentAnalysisRequest, analysis: Union[Dict[str, Any], bytes]):
+        """Count an analysis served for `request` if its metadata names a demographic group"""
+        metadata = request.metadata or {}
+        group = metadata.get(settings.FAIRNESS_GROUP_FIELD)
+        if group is None:
+            return
+        if isinstance(analysis, bytes):
+            analysis = orjson.loads(analysis)
+        label = metadata.get(settings.FAIRNESS_LABEL_FIELD)
+        if label is not None:
+            label = bool(label)
+        self.record_decision(str(group), not analysis.get("is_safe", True), label)
+    
+    def _window(self, start_epoch: int, end_epoch: int) -> np.ndarray:
+        """Slots holding the buckets from `start_epoch` to `end_epoch` (inclusive)"""
+        return np.flatnonzero((self.bucket_epoch >= start_epoch) & (self.bucket_epoch <= end_epoch))
+    
+    def _span(self, time_range: str, now: Optional[float]):
+        """(now, first and last bucket epoch, buckets) of the window ending at `now`"""
+        seconds = parse_time_range(time_range)
+        now = time.time() if now is None else now
+        end_epoch = int(now // self.bucket_seconds)
+        span = min(math.ceil(seconds / self.bucket_seconds), self.buckets)
+        return now, end_epoch - span + 1, end_epoch, span
+    
+    def report(self, time_range: str, trend_points: int = None, now: float = None) -> Dict[str, Any]:
+        """Rates and gaps over `time_range` from this process's counters alone"""
+        now, start_epoch, end_epoch, span = self._span(time_range, now)
+        slots = self._window(start_epoch, end_epoch)
+        return self._report(
+            time_range, now, start_epoch, span, list(self.groups),
+            self.bucket_epoch[slots], self.counts[:len(self.groups)][:, slots], trend_points, "process"
+        )
+    
+    async def shared_report(self, time_range: str, trend_points: int = None, now: float = None) -> Dict[str, Any]:
+        """Rates and gaps over `time_range` from the counters of all processes
+        
+        Sums the `fairness_counts` documents of the window plus this
+        process's increments not yet written (or still being written);
+        without MongoDB, `report()`.
+        """
+        db = get_database()
+        if db is None:
+            return self.report(time_range, trend_points, now)
+        now, start_epoch, end_epoch, span = self._span(time_range, now)
+        groups = list(self.groups)
+        index = {group: position for position, group in enumerate(groups)}
+        counts = np.zeros((len(groups), span, len(FAIRNESS_COUNTERS)), dtype=np.int64)
+        slots = self._window(start_epoch, end_epoch)
+        pending = self.unflushed[:len(groups)][:, slots] + self.flushing[:len(groups)][:, slots]
+        counts[:, self.bucket_epoch[slots] - start_epoch] += pending
+        
+        cursor = db[self.COLLECTION].find(
+            {
+                "bucket_seconds": self.bucket_seconds,
+                "bucket_start": {
+                    "$gte": datetime.utcfromtimestamp(start_epoch * self.bucket_seconds),
+                    "$lte": datetime.utcfromtimestamp(end_epoch * self.bucket_seconds)
+                }
+            },
+            {"_id": 0, "bucket_start": 1, "demographic_group": 1, **{name: 1 for name in FAIRNESS_COUNTERS}}
+        )
+        async for doc in cursor:
+            group = doc["demographic_group"]
+            if group not in index:
+                index[group] = len(groups)
+                groups.append(group)
+                counts = np.concatenate([counts, np.zeros_like(counts[:1])])
+            epoch = int((doc["bucket_start"] - datetime(1970, 1, 1)).total_seconds()) // self.bucket_seconds
+            counts[index[group], epoch - start_epoch] += [doc.get(name, 0) for name in FAIRNESS_COUNTERS]
+        
+        return self._report(
+            time_range, now, start_epoch, span, groups,
+            np.arange(start_epoch, end_epoch + 1), counts, trend_points, "shared"
+        )
+    
+    def _report(
+        self,
+        time_range: str,
+        now: float,
+        start_epoch: int,
+        span: int,
+        groups: List[str],
+        epochs: np.ndarray,
+        counts: np.ndarray,
+        trend_points: Optional[int],
+        source: str
+    ) -> Dict[str, Any]:
+        """Report over per-bucket counts of shape (groups, len(epochs), counters)"""
+        totals = counts.sum(axis=1)
+        
+        positive_rate = _rates(totals[:, POSITIVES], totals[:, DECISIONS])
+        true_positive_rate = _rates(totals[:, TRUE_POSITIVES], totals[:, LABEL_POSITIVES])
+        gaps = _gaps(totals, self.min_group_size)
+        known = [gap for gap in gaps.values() if gap is not None]
+        
+        # Trend: the window split into equal sub-windows, by bucket epoch
+        points = min(max(1, trend_points or settings.FAIRNESS_TREND_POINTS), span)
+        point_of = (epochs - start_epoch) * points // span
+        per_point = np.zeros((len(groups), points, len(FAIRNESS_COUNTERS)), dtype=np.int64)
+        np.add.at(per_point, (slice(None), point_of), counts)
+        trends = [
+            {
+                "start": datetime.utcfromtimestamp(
+                    (start_epoch + point * span // points) * self.bucket_seconds
+                ),
+                "decisions": int(per_point[:, point, DECISIONS].sum()),
+                **_gaps(per_point[:, point], self.min_group_size)
+            }
+            for point in range(points)
+        ]
+        
+        return {
+            "time_range": time_range,
+            # "shared" sums every process's counters, "process" only this one's
+            "source": source,
+            "window_start": datetime.utcfromtimestamp(start_epoch * self.bucket_seconds),
+            "window_end": datetime.utcfromtimestamp(now),
+            "groups": {
+                group: {
+                    **{name: int(totals[index, counter]) for counter, name in enumerate(FAIRNESS_COUNTERS)},
+                    "positive_rate": None if np.isnan(positive_rate[index]) else float(positive_rate[index]),
+                    "true_positive_rate": (
+                        None if np.isnan(true_positive_rate[index]) else float(true_positive_rate[index])
+                    )
+                }
+                for index, group in enumerate(groups)
+            },
+            **gaps,
+            "overall_fairness_score": 1.0 - max(known) if known else None,
+            "min_group_size": self.min_group_size,
+            "trends": trends
+        }
+    
+    async def persist(self) -> int:
+        """Add the increments not yet written to `fairness_counts`, returning the documents updated
+        
+        The increments move to `flushing` for the duration of the write and
+        are dropped from it only once the write has settled: applied ones
+        are then in the shared documents, failed ones go back to `unflushed`.
+        """
+        db = get_database()
+        groups, slots = np.nonzero(self.unflushed.any(axis=2))
+        if db is None or not len(groups):
+            return 0
+        names = list(self.groups)
+        epochs = self.bucket_epoch[slots]
+        deltas = self.unflushed[groups, slots]
+        self.unflushed[groups, slots] = 0
+        self.flushing[groups, slots] += deltas
+        operations = []
+        for group, epoch, delta in zip(groups.tolist(), epochs.tolist(), deltas):
+            bucket_start = datetime.utcfromtimestamp(epoch * self.bucket_seconds)
+            operations.append(UpdateOne(
+                {
+                    "bucket_start": bucket_start,
+                    "bucket_seconds": self.bucket_seconds,
+                    "demographic_group": names[group],
+                    "model_version": settings.ANALYSIS_MODEL_VERSION
+                },
+                {
+                    "$inc": {name: int(value) for name, value in zip(FAIRNESS_COUNTERS, delta) if value},
+                    "$setOnInsert": {
+                        "expires_at": bucket_start + timedelta(seconds=self.buckets * self.bucket_seconds)
+                    }
+                },
+                upsert=True
+            ))
+        
+        failed = np.zeros(len(operations), dtype=bool)
+        try:
+            await db[self.COLLECTION].bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Only the failed updates are retried; the rest were applied
+            failed[[error["index"] for error in e.details.get("writeErrors", [])]] = True
+            raise
+        except Exception:
+            failed[:] = True
+            raise
+        finally:
+            # Slots that moved on to a newer bucket meanwhile were cleared
+            current = self.bucket_epoch[slots] == epochs
+            self.flushing[groups[current], slots[current]] -= deltas[current]
+            retry = current & failed
+            self.unflushed[groups[retry], slots[retry]] += deltas[retry]
+        self.persisted_total += len(operations)
+        return len(operations)
+    
+    async def persist_metrics(self, time_range: str = None, now: float = None) -> int:
+        """Write the gaps and per-group rates over `time_range` to `fairness_metrics`
+        
+        One snapshot per metric and bucket, keyed by the start of the bucket
+        holding `now`: every process computes it from the same shared
+        counters, so concurrent writers upsert the same documents. Gaps use
+        `demographic_group: "all"`; metrics without enough samples are skipped.
+        """
+        db = get_database()
+        if db is None:
+            return 0
+        time_range = time_range or settings.FAIRNESS_DEFAULT_RANGE
+        report = await self.shared_report(time_range, now=now)
+        now = time.time() if now is None else now
+        timestamp = datetime.utcfromtimestamp(int(now // self.bucket_seconds) * self.bucket_seconds)
+        total = sum(group["decisions"] for group in report["groups"].values())
+        
+        metrics = [
+            (name, "all", report[name], total)
+            for name in ("demographic_parity_gap", "equal_opportunity_gap", "treatment_equality_gap")
+        ]
+        for group, stats in report["groups"].items():
+            metrics.append(("positive_rate", group, stats["positive_rate"], stats["decisions"]))
+            metrics.append(("true_positive_rate", group, stats["true_positive_rate"], stats["label_positives"]))
+        
+        operations = [
+            UpdateOne(
+                {
+                    "metric_type": metric_type,
+                    "demographic_group": group,
+                    "timestamp": timestamp,
+                    "time_range": time_range,
+                    "model_version": settings.ANALYSIS_MODEL_VERSION
+                },
+                {"$set": {"value": value, "sample_size": sample_size}},
+                upsert=True
+            )
+            for metric_type, group, value, sample_size in metrics
+            if value is not None
+        ]
+        if operations:
+            await db[self.METRICS_COLLECTION].bulk_write(operations, ordered=False)
+        return len(operations)
+    
+    async def start(self):
+        """Start periodic persistence (unless FAIRNESS_PERSIST_INTERVAL is 0)"""
+        if self._persister is None and settings.FAIRNESS_PERSIST_INTERVAL > 0:
+            self._persister = asyncio.create_task(self._run(), name="fairness-persister")
+    
+    async def stop(self):
+        """Stop periodic persistence, writing the increments still pending"""
+        if self._persister is not None:
+            self._persister.cancel()
+            try:
+                await self._persister
+            except asyncio.CancelledError:
+                pass
+            self._persister = None
+            try:
+                await self.persist()
+            except Exception as e:
+                self.failed_persists_total += 1
+                logger.error(f"Persisting fairness counters failed: {e}")
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.FAIRNESS_PERSIST_INTERVAL)
+            try:
+                await self.persist()
+            except Exception as e:
+                self.failed_persists_total += 1
+                logger.error(f"Persisting fairness counters failed: {e}")
+            try:
+                await self.persist_metrics()
+            except Exception as e:
+                self.failed_persists_total += 1
+                logger.error(f"Persisting fairness metrics failed: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "groups": len(self.groups),
+            "bucket_seconds": self.bucket_seconds,
+            "buckets": self.buckets,
+            "decisions_total": self.decisions_total,
+            "labels_total": self.labels_total,
+            "stale_total": self.stale_total,
+            "unflushed_buckets": int(np.count_nonzero(self.unflushed.any(axis=2))),
+            "flushing_buckets": int(np.count_nonzero(self.flushing.any(axis=2))),
+            "persisted_total": self.persisted_total,
+            "failed_persists_total": self.failed_persists_total
+        }
+
 class FairnessService:
     """Fairness and bias monitoring service"""
     
-    def __init__(self):
-        pass
+    def __init__(self, monitor: Optional[FairnessMonitor] = None):
+        # App-scoped counters fed by the analysis endpoints
+        self.monitor = monitor or FairnessMonitor()
     
     async def calculate_bias_metrics(self) -> BiasMetrics:
-        """Calculate current bias metrics"""
-        # TODO: Implement actual bias calculation
+        """Calculate current bias metrics
+        
+        Parity scores over `FAIRNESS_DEFAULT_RANGE`: 1 - gap, so 1.0 is
+        parity; None until two groups have `FAIRNESS_MIN_GROUP_SIZE` samples.
+        """
+        report = await self.monitor.shared_report(settings.FAIRNESS_DEFAULT_RANGE)
+        
+        def score(gap: Optional[float]) -> Optional[float]:
+            return None if gap is None else 1.0 - gap
+        
         return BiasMetrics(
-            demographic_parity=0.95,
-            equal_opportunity=0.92,
-            treatment_equality=0.94
+            demographic_parity=score(report["demographic_parity_gap"]),
+            equal_opportunity=score(report["equal_opportunity_gap"]),
+            treatment_equality=score(report["treatment_equality_gap"])
         )
     
     async def analyze_fairness(self, time_range: str):
-        """Analyze fairness over time"""
-        # TODO: Implement fairness analysis
-        return {
-            "time_range": time_range,
-            "overall_fairness_score": 0.93,
-            "trends": []
-        }
+        """Analyze fairness over time (raises ValueError for malformed ranges)"""
+        return await self.monitor.shared_report(time_range)
     
     async def trigger_retrain(self, model_name: str):
         """Trigger model retraining with fairness constraints"""
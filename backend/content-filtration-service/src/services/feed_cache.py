@@ -0,0 +1,217 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+from config.settings import settings
+from services.feed_ranking import ContentColumns
+from services.privacy_service import pseudonymize
+from services.safety_index import SafetyIndex
+
+# Candidate fields that feed evaluation reads besides content_id; changes to
+# other fields do not invalidate a cached row
+FINGERPRINT_FIELDS = (
+    "content",
+    "content_hash",
+    "safety_score",
+    "min_age",
+    "sensitivity",
+    "is_toxic",
+    "is_misinformation",
+    "is_nsfw",
+    "relevance",
+    "topics"
+)
+
+def pool_fingerprints(content_pool: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """64-bit digest of the `FINGERPRINT_FIELDS` of every candidate"""
+    return np.fromiter(
+        (
+            int.from_bytes(
+                hashlib.blake2b(
+                    orjson.dumps([item.get(field) for field in FINGERPRINT_FIELDS], default=str),
+                    digest_size=8
+                ).digest(),
+                "little"
+            )
+            for item in content_pool
+        ),
+        dtype=np.uint64,
+        count=len(content_pool)
+    )
+
+class MaterializedFeed:
+    """One user's evaluated candidate pool, as of their last feed request
+    
+    Holds a fingerprint of every pool item it was computed from (not the
+    items), their columns (with index decisions applied), the safety index
+    rows and versions they resolved to, and the filter reason, interest
+    match and rank score of every row under the policy and preference
+    version recorded alongside.
+    """
+    
+    __slots__ = (
+        "fingerprints",
+        "rows",
+        "columns",
+        "index_found",
+        "index_seq",
+        "index_updated",
+        "reasons",
+        "interest",
+        "scores",
+        "policy_key",
+        "preference_version",
+        "topic_vocab"
+    )
+    
+    def __init__(
+        self,
+        fingerprints: np.ndarray,
+        columns: ContentColumns,
+        index_found: np.ndarray,
+        index_seq: np.ndarray,
+        index_updated: np.ndarray,
+        reasons: np.ndarray,
+        interest: np.ndarray,
+        scores: np.ndarray,
+        policy_key: Tuple,
+        preference_version: int,
+        topic_vocab: Dict[str, int]
+    ):
+        self.fingerprints = fingerprints
+        # content_id -> row (the last one for repeated ids)
+        self.rows = dict(zip(columns.content_ids, range(len(columns))))
+        self.columns = columns
+        self.index_found = index_found
+        self.index_seq = index_seq
+        self.index_updated = index_updated
+        self.reasons = reasons
+        self.interest = interest
+        self.scores = scores
+        self.policy_key = policy_key
+        self.preference_version = preference_version
+        # Topic ids in `columns` are only meaningful with this vocabulary
+        self.topic_vocab = topic_vocab
+    
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+    
+    def match(
+        self,
+        content_pool: Sequence[Dict[str, Any]],
+        fingerprints: np.ndarray,
+        safety_index: Optional[SafetyIndex] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Pool positions that can reuse a cached row, and those rows
+        
+        A row is reused when the candidate with the same content_id has the
+        same fingerprint (`pool_fingerprints`) and, with a safety index, was
+        found there and its index row has not been updated since.
+        Everything else is part of the delta.
+        """
+        rows = np.fromiter(
+            (self.rows.get(item.get("content_id"), -1) for item in content_pool),
+            dtype=np.int64,
+            count=len(content_pool)
+        )
+        positions = np.flatnonzero(rows >= 0)
+        rows = rows[positions]
+        unchanged = self.fingerprints[rows] == fingerprints[positions]
+        positions, rows = positions[unchanged], rows[unchanged]
+        if safety_index is not None and len(rows):
+            current = self.index_found[rows] & ~safety_index.changed_since(
+                self.index_seq[rows],
+                self.index_updated[rows]
+            )
+            positions, rows = positions[current], rows[current]
+        return positions, rows
+
+class FeedCache:
+    """Per-user materialized feeds, an LRU with a TTL bounded by total rows
+    
+    Keys are pseudonymous user ids. Least recently used feeds are dropped
+    until the cached feeds hold at most `max_rows` candidate rows; a feed
+    larger than that is not cached. `invalidate()` bumps the user's
+    preference version (called when preferences or safety settings change);
+    a feed computed under an older version keeps its columns but has its
+    filters and scores re-evaluated. Versions are per process; the policy
+    fingerprint stored with each feed also catches changes made elsewhere.
+    """
+    
+    def __init__(self, max_rows: int = None, ttl_seconds: float = None):
+        self.max_rows = settings.FEED_CACHE_MAX_ROWS if max_rows is None else max_rows
+        self.ttl = ttl_seconds or settings.FEED_CACHE_TTL
+        self._entries: "OrderedDict[str, Tuple[float, MaterializedFeed]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self.rows = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions_total = 0
+        self.rows_reused_total = 0
+        self.rows_computed_total = 0
+        self.invalidations_total = 0
+    
+    def _remove(self, key: str):
+        _, feed = self._entries.pop(key)
+        self.rows -= len(feed)
+    
+    def get(self, key: str) -> Optional[MaterializedFeed]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[1]
+    
+    def set(self, key: str, feed: MaterializedFeed):
+        if key in self._entries:
+            self._remove(key)
+        if len(feed) > self.max_rows:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, feed)
+        self.rows += len(feed)
+        while self.rows > self.max_rows:
+            self._remove(next(iter(self._entries)))
+            self.evictions_total += 1
+    
+    def preference_version(self, key: str) -> int:
+        return self._versions.get(key, 0)
+    
+    def invalidate(self, user_id: str):
+        """Mark a user's cached feed as computed from outdated preferences"""
+        key = pseudonymize(user_id)
+        self._versions[key] = self._versions.get(key, 0) + 1
+        self.invalidations_total += 1
+        if len(self._versions) > 2 * len(self._entries) + 1000:
+            # Versions only matter while a feed is cached
+            self._versions = {key: version for key, version in self._versions.items() if key in self._entries}
+    
+    def record(self, reused: int, computed: int):
+        self.rows_reused_total += reused
+        self.rows_computed_total += computed
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        rows = self.rows_reused_total + self.rows_computed_total
+        return {
+            "users": len(self._entries),
+            "rows": self.rows,
+            "max_rows": self.max_rows,
+            "evictions_total": self.evictions_total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "rows_reused_total": self.rows_reused_total,
+            "rows_computed_total": self.rows_computed_total,
+            "row_reuse_ratio": self.rows_reused_total / rows if rows else 0.0,
+            "invalidations_total": self.invalidations_total
+        }
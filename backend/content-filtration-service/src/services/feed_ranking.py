@@ -0,0 +1,308 @@
+"""Columnar, vectorized safety filtering and ranking of candidate pools
+
+A pool of candidate dicts is turned into NumPy columns once; the user's
+safety settings then become boolean masks over whole columns and the top
+`limit` survivors are picked with `argpartition`, so the per-call cost is a
+handful of array passes rather than Python work per candidate.
+
+Candidate dicts may carry `content_id`, `safety_score` (0-1, higher is
+safer), `min_age`, `sensitivity` (a `SensitivityLevel` value), `is_toxic`,
+`is_misinformation`, `is_nsfw`, `topics` (list of strings) and `relevance`
+(upstream ranking score). Candidates without a safety score are excluded as
+unscored. With a safety index, the indexed analyses decide and these fields
+can only tighten them (see `ContentColumns.apply_index`).
+"""
+from itertools import chain, repeat
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from models.schemas import AgeGroup, SensitivityLevel
+
+# Fixed-width codes, ordered from least to most restrictive
+SENSITIVITY_CODES = {level.value: code for code, level in enumerate(SensitivityLevel)}
+AGE_GROUP_CODES = {group.value: code for code, group in enumerate(AgeGroup)}
+ALL_AGE_GROUPS = (1 << len(AGE_GROUP_CODES)) - 1
+
+# Oldest age in each group; content whose min_age exceeds it is withheld
+AGE_GROUP_MAX_AGE = {
+    AgeGroup.CHILDREN.value: 12,
+    AgeGroup.TEEN.value: 17,
+    AgeGroup.YOUNG_ADULT.value: 25,
+    AgeGroup.ADULT.value: 64,
+    AgeGroup.SENIOR.value: 150
+}
+
+# Filter reasons in the order they are checked; index = reason code
+FILTER_REASONS = (
+    "unscored",
+    "toxicity",
+    "misinformation",
+    "nsfw",
+    "age_restricted",
+    "sensitivity",
+    "low_safety_score",
+    "pending_analysis"  # set by the engine for candidates queued for analysis
+)
+KEEP = -1
+
+def age_group_mask(age_groups: Iterable[str]) -> int:
+    """Bitmask of AGE_GROUP_CODES for a list of age groups"""
+    mask = 0
+    for group in age_groups:
+        code = AGE_GROUP_CODES.get(group)
+        if code is not None:
+            mask |= 1 << code
+    return mask
+
+class ContentColumns:
+    """A candidate pool as parallel NumPy arrays (one row per candidate)"""
+    
+    __slots__ = (
+        "content_ids",
+        "safety",
+        "min_age",
+        "sensitivity",
+        "age_groups",
+        "is_toxic",
+        "is_misinformation",
+        "is_nsfw",
+        "relevance",
+        "topic_ids",
+        "topic_owner"
+    )
+    
+    # Arrays with one entry per row
+    _ROW_ARRAYS = (
+        "safety",
+        "min_age",
+        "sensitivity",
+        "age_groups",
+        "is_toxic",
+        "is_misinformation",
+        "is_nsfw",
+        "relevance"
+    )
+    
+    def __init__(
+        self,
+        content_ids: List[Optional[str]],
+        safety: np.ndarray,
+        min_age: np.ndarray,
+        sensitivity: np.ndarray,
+        age_groups: np.ndarray,
+        is_toxic: np.ndarray,
+        is_misinformation: np.ndarray,
+        is_nsfw: np.ndarray,
+        relevance: np.ndarray,
+        topic_ids: np.ndarray,
+        topic_owner: np.ndarray
+    ):
+        self.content_ids = content_ids
+        self.safety = safety
+        self.min_age = min_age
+        self.sensitivity = sensitivity
+        # Bitmask of age groups the content is recommended for
+        self.age_groups = age_groups
+        self.is_toxic = is_toxic
+        self.is_misinformation = is_misinformation
+        self.is_nsfw = is_nsfw
+        self.relevance = relevance
+        # Flattened topics: topic_ids[j] belongs to row topic_owner[j]
+        self.topic_ids = topic_ids
+        self.topic_owner = topic_owner
+    
+    def __len__(self) -> int:
+        return len(self.content_ids)
+    
+    def content_id(self, row: int) -> str:
+        """Content id of a row, the row number for candidates without one"""
+        content_id = self.content_ids[row]
+        return str(row) if content_id is None else str(content_id)
+    
+    @classmethod
+    def from_pool(cls, pool: Sequence[Dict[str, Any]], topic_vocab: Dict[str, int]) -> "ContentColumns":
+        """Build columns from candidate dicts; new topics are added to `topic_vocab`"""
+        count = len(pool)
+        
+        def column(key: str, dtype, default) -> np.ndarray:
+            return np.fromiter(
+                (default if (value := item.get(key)) is None else value for item in pool),
+                dtype=dtype,
+                count=count
+            )
+        
+        topic_ids: List[int] = []
+        topic_owner: List[int] = []
+        for row, item in enumerate(pool):
+            for topic in item.get("topics") or ():
+                topic_ids.append(topic_vocab.setdefault(topic, len(topic_vocab)))
+                topic_owner.append(row)
+        
+        # Missing sensitivity is SAFE; unknown values get the most restrictive level
+        sensitivity_codes = {None: 0, **SENSITIVITY_CODES}
+        explicit = SENSITIVITY_CODES[SensitivityLevel.EXPLICIT.value]
+        return cls(
+            content_ids=[item.get("content_id") for item in pool],
+            safety=column("safety_score", np.float64, np.nan),
+            min_age=column("min_age", np.int16, 0),
+            sensitivity=np.fromiter(
+                map(
+                    sensitivity_codes.get,
+                    [item.get("sensitivity") for item in pool],
+                    repeat(explicit, count)
+                ),
+                dtype=np.int8,
+                count=count
+            ),
+            age_groups=np.full(count, ALL_AGE_GROUPS, dtype=np.uint8),
+            is_toxic=column("is_toxic", np.bool_, False),
+            is_misinformation=column("is_misinformation", np.bool_, False),
+            is_nsfw=column("is_nsfw", np.bool_, False),
+            relevance=column("relevance", np.float32, 0.0),
+            topic_ids=np.asarray(topic_ids, dtype=np.int32),
+            topic_owner=np.asarray(topic_owner, dtype=np.int32)
+        )
+    
+    def take(self, rows: np.ndarray) -> "ContentColumns":
+        """Columns of `rows`, in that order"""
+        position = np.full(len(self), -1, dtype=np.int64)
+        position[rows] = np.arange(len(rows))
+        owner = position[self.topic_owner]
+        kept = owner >= 0
+        return ContentColumns(
+            content_ids=list(map(self.content_ids.__getitem__, rows.tolist())),
+            topic_ids=self.topic_ids[kept],
+            topic_owner=owner[kept].astype(np.int32),
+            **{name: getattr(self, name)[rows] for name in self._ROW_ARRAYS}
+        )
+    
+    @classmethod
+    def concat(cls, parts: Sequence["ContentColumns"]) -> "ContentColumns":
+        """Rows of all `parts`, one after the other"""
+        offsets = np.cumsum([0] + [len(part) for part in parts[:-1]])
+        return cls(
+            content_ids=list(chain.from_iterable(part.content_ids for part in parts)),
+            topic_ids=np.concatenate([part.topic_ids for part in parts]),
+            topic_owner=np.concatenate(
+                [part.topic_owner + offset for part, offset in zip(parts, offsets)]
+            ).astype(np.int32),
+            **{name: np.concatenate([getattr(part, name) for part in parts]) for name in cls._ROW_ARRAYS}
+        )
+    
+    def apply_index(self, lookup):
+        """Take safety decisions from a `SafetyLookup`
+        
+        Pool fields can only make an indexed decision stricter; candidates
+        missing from the index become unscored.
+        """
+        found = lookup.found
+        self.safety = np.where(found, np.fmin(self.safety, lookup.safety), np.nan)
+        self.min_age = np.where(found, np.maximum(self.min_age, lookup.min_age), self.min_age)
+        self.sensitivity = np.where(found, np.maximum(self.sensitivity, lookup.sensitivity), self.sensitivity)
+        self.age_groups = np.where(found, self.age_groups & lookup.age_groups, self.age_groups)
+        self.is_toxic = self.is_toxic | (found & lookup.is_toxic)
+        self.is_misinformation = self.is_misinformation | (found & lookup.is_misinformation)
+
+class FeedPolicy:
+    """A user's safety settings and interests, in column-comparable form"""
+    
+    def __init__(
+        self,
+        block_toxicity: bool = True,
+        block_misinformation: bool = True,
+        block_nsfw: bool = True,
+        sensitivity_level: str = SensitivityLevel.MODERATE.value,
+        age_group: Optional[str] = None,
+        interests: Iterable[str] = (),
+        min_safety_score: Optional[float] = None,
+        interest_vectors: Optional[np.ndarray] = None
+    ):
+        self.block_toxicity = block_toxicity
+        self.block_misinformation = block_misinformation
+        self.block_nsfw = block_nsfw
+        self.max_sensitivity = SENSITIVITY_CODES[sensitivity_level]
+        age_group = age_group or settings.FEED_DEFAULT_AGE_GROUP
+        self.max_min_age = AGE_GROUP_MAX_AGE[age_group]
+        self.age_group_bit = 1 << AGE_GROUP_CODES[age_group]
+        self.interests = list(interests)
+        self.min_safety_score = settings.FEED_MIN_SAFETY_SCORE if min_safety_score is None else min_safety_score
+        # Embeddings of `interests`; without them interest match is topic overlap
+        self.interest_vectors = interest_vectors
+    
+    def fingerprint(self) -> Tuple:
+        """Everything filtering and ranking depend on, for cache validation"""
+        return (
+            self.block_toxicity,
+            self.block_misinformation,
+            self.block_nsfw,
+            self.max_sensitivity,
+            self.max_min_age,
+            self.age_group_bit,
+            tuple(self.interests),
+            self.min_safety_score,
+            self.interest_vectors is not None,
+            settings.FEED_SAFETY_WEIGHT,
+            settings.FEED_INTEREST_WEIGHT
+        )
+    
+    @classmethod
+    def from_settings(cls, safety_settings: Dict[str, Any]) -> "FeedPolicy":
+        """Policy from `UserService.get_safety_settings()` output (optionally with interests)"""
+        return cls(
+            block_toxicity=safety_settings.get("block_toxicity", True),
+            block_misinformation=safety_settings.get("block_misinformation", True),
+            block_nsfw=safety_settings.get("block_nsfw", True),
+            sensitivity_level=safety_settings.get("sensitivity_level") or SensitivityLevel.MODERATE.value,
+            age_group=safety_settings.get("age_group"),
+            interests=safety_settings.get("interests") or (),
+            min_safety_score=safety_settings.get("min_safety_score")
+        )
+
+def filter_reasons(columns: ContentColumns, policy: FeedPolicy) -> np.ndarray:
+    """Per-row index into FILTER_REASONS of the first failed check, KEEP when none failed"""
+    off = np.zeros(len(columns), dtype=bool)
+    not_recommended = (columns.age_groups & policy.age_group_bit) == 0
+    checks = [
+        np.isnan(columns.safety),
+        columns.is_toxic if policy.block_toxicity else off,
+        columns.is_misinformation if policy.block_misinformation else off,
+        columns.is_nsfw if policy.block_nsfw else off,
+        (columns.min_age > policy.max_min_age) | not_recommended,
+        columns.sensitivity > policy.max_sensitivity,
+        columns.safety < policy.min_safety_score
+    ]
+    return np.select(checks, np.arange(len(checks)), default=KEEP).astype(np.int8)
+
+def interest_match(columns: ContentColumns, interest_ids: np.ndarray) -> np.ndarray:
+    """Share of each row's topics that are among the user's interests (0-1)"""
+    count = len(columns)
+    if not len(interest_ids) or not len(columns.topic_ids):
+        return np.zeros(count, dtype=np.float32)
+    hits = np.bincount(
+        columns.topic_owner[np.isin(columns.topic_ids, interest_ids)],
+        minlength=count
+    )
+    totals = np.bincount(columns.topic_owner, minlength=count)
+    return (hits / np.maximum(totals, 1)).astype(np.float32)
+
+def rank_scores(columns: ContentColumns, interest: np.ndarray) -> np.ndarray:
+    """Ranking score: upstream relevance plus weighted safety and interest match"""
+    return (
+        columns.relevance
+        + settings.FEED_SAFETY_WEIGHT * np.nan_to_num(columns.safety)
+        + settings.FEED_INTEREST_WEIGHT * interest
+    )
+
+def top_k(scores: np.ndarray, keep: np.ndarray, k: int) -> np.ndarray:
+    """Rows of the `k` best kept scores, best first (ties keep pool order)
+    
+    `argpartition` selects the top k in linear time; only those k are sorted.
+    """
+    candidates = np.flatnonzero(keep)
+    if k <= 0 or not len(candidates):
+        return candidates[:0]
+    if k < len(candidates):
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
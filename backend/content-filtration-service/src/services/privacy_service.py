@@ -4,6 +4,10 @@ from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
+def pseudonymize(user_id: str) -> str:
+    """Stable pseudonymous id for a user"""
+    return hashlib.sha256(user_id.encode()).hexdigest()[:16]
+
 class PrivacyService:
     """Privacy-preserving data handling"""
     
@@ -12,11 +16,8 @@ class PrivacyService:
     
     async def anonymize_user_profile(self, user_id: str) -> Dict[str, Any]:
         """Anonymize user profile while preserving utility"""
-        # Generate pseudonymous ID
-        pseudo_id = hashlib.sha256(user_id.encode()).hexdigest()[:16]
-        
         return {
-            "user_id": pseudo_id,
+            "user_id": pseudonymize(user_id),
             "is_anonymized": True
         }
     
@@ -1,28 +1,272 @@
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from config.settings import settings
+from ml.inference.executor import InferenceSaturatedError
+from models.schemas import ContentAnalysisRequest, FilteredContent
+from services.feed_ranking import (
+    FILTER_REASONS,
+    KEEP,
+    ContentColumns,
+    FeedPolicy,
+    filter_reasons,
+    interest_match,
+    rank_scores,
+    top_k
+)
+from services.embedding_index import DeferredEmbedding, EmbeddingIndex, InterestVectors
+from services.feed_cache import FeedCache, MaterializedFeed, pool_fingerprints
+from services.privacy_service import pseudonymize
+from services.safety_index import DeferredAnalysis, SafetyIndex
+from services.user_service import UserService
 
 logger = logging.getLogger(__name__)
 
 class RecommendationEngine:
     """Privacy-first recommendation engine"""
     
-    def __init__(self):
-        pass
+    def __init__(
+        self,
+        user_service: Optional[UserService] = None,
+        safety_index: Optional[SafetyIndex] = None,
+        deferred_analysis: Optional[DeferredAnalysis] = None,
+        feed_cache: Optional[FeedCache] = None,
+        embedding_index: Optional[EmbeddingIndex] = None,
+        deferred_embedding: Optional[DeferredEmbedding] = None,
+        interest_vectors: Optional[InterestVectors] = None
+    ):
+        self.user_service = user_service or UserService()
+        self.safety_index = safety_index
+        self.deferred_analysis = deferred_analysis
+        self.feed_cache = feed_cache
+        # Content embeddings are keyed by safety index rows
+        self.embedding_index = embedding_index if safety_index is not None else None
+        self.deferred_embedding = deferred_embedding
+        self.interest_vectors = interest_vectors
+    
+    async def _policy(self, safety_settings: Dict[str, Any]) -> FeedPolicy:
+        """Feed policy with the user's interests embedded when the encoder is available"""
+        policy = FeedPolicy.from_settings(safety_settings)
+        if policy.interests and self.embedding_index is not None and self.interest_vectors is not None:
+            try:
+                policy.interest_vectors = await self.interest_vectors.get(policy.interests)
+            except InferenceSaturatedError:
+                # Encoder still loading or busy; topic overlap ranks this request
+                pass
+            except Exception as e:
+                logger.warning(f"Embedding interests failed: {e}")
+        return policy
+    
+    def _resolve(self, content_pool: List[Dict[str, Any]], topic_vocab: Dict[str, int]):
+        """Columns of candidates with safety decisions from the index, plus pending rows
+        
+        No model runs here. Candidates missing from the index are excluded
+        and, under the "defer" policy, queued for background analysis if
+        they carry their text; those rows are returned as pending.
+        """
+        columns = ContentColumns.from_pool(content_pool, topic_vocab)
+        if self.safety_index is None:
+            return columns, None, []
+        
+        lookup = self.safety_index.lookup_pool(content_pool)
+        columns.apply_index(lookup)
+        pending = []
+        if settings.SAFETY_INDEX_MISSING == "defer" and self.deferred_analysis is not None:
+            pending = [
+                row for row in np.flatnonzero(~lookup.found).tolist() if content_pool[row].get("content")
+            ]
+            self.deferred_analysis.submit(
+                ContentAnalysisRequest(
+                    content_id=None if columns.content_ids[row] is None else str(columns.content_ids[row]),
+                    content=content_pool[row]["content"]
+                )
+                for row in pending
+            )
+        return columns, lookup, pending
+    
+    def _submit_embeddings(self, content_pool: List[Dict[str, Any]], found: np.ndarray, seqs: np.ndarray):
+        """Queue indexed candidates without a content embedding for background embedding"""
+        if self.embedding_index is None or self.deferred_embedding is None:
+            return
+        unembedded = found & (self.embedding_index.lookup(seqs) < 0)
+        self.deferred_embedding.submit([
+            (int(seqs[row]), content_pool[row]["content"])
+            for row in np.flatnonzero(unembedded).tolist()
+            if content_pool[row].get("content")
+        ])
+    
+    def _evaluate(
+        self,
+        policy: FeedPolicy,
+        columns: ContentColumns,
+        pending: np.ndarray,
+        seqs: np.ndarray,
+        topic_vocab: Dict[str, int]
+    ):
+        """Filter reason code, interest match and rank score of every row
+        
+        Kept rows with a content embedding match interests by embedding
+        similarity (IVF search over the kept rows); the rest by topic overlap.
+        """
+        reasons = filter_reasons(columns, policy)
+        reasons[pending] = FILTER_REASONS.index("pending_analysis")
+        interest_ids = np.fromiter(
+            (topic_vocab[topic] for topic in policy.interests if topic in topic_vocab),
+            dtype=np.int32
+        )
+        interest = interest_match(columns, interest_ids)
+        if policy.interest_vectors is not None:
+            kept = np.flatnonzero(reasons == KEEP)
+            rows = self.embedding_index.lookup(seqs[kept])
+            embedded = rows >= 0
+            interest[kept[embedded]] = self.embedding_index.similarity(
+                policy.interest_vectors,
+                rows[embedded]
+            )
+        return reasons, interest, rank_scores(columns, interest)
+    
+    def _materialize(self, policy: FeedPolicy, content_pool: List[Dict[str, Any]], user_key: str):
+        """Columns, filter reasons, interest match and rank scores of the pool, in pool order
+        
+        With a feed cache only the delta since the user's previous request
+        is resolved and evaluated: candidates that are new or changed, were
+        missing from the safety index, or whose index entry was updated.
+        Unchanged candidates keep their cached columns, and their cached
+        reasons and scores too unless the policy or preference version
+        changed, in which case all rows are re-evaluated (still without
+        resolving them again).
+        """
+        count = len(content_pool)
+        cached = None
+        if self.feed_cache is not None:
+            cached = self.feed_cache.get(user_key)
+            fingerprints = pool_fingerprints(content_pool)
+        if cached is not None:
+            topic_vocab = cached.topic_vocab
+            reuse_positions, reuse_rows = cached.match(content_pool, fingerprints, self.safety_index)
+        else:
+            topic_vocab = {}
+            reuse_positions = reuse_rows = np.zeros(0, dtype=np.int64)
+        
+        delta_positions = np.setdiff1d(np.arange(count), reuse_positions, assume_unique=True)
+        delta_pool = [content_pool[position] for position in delta_positions.tolist()]
+        delta, lookup, pending = self._resolve(delta_pool, topic_vocab)
+        delta_pending = np.zeros(len(delta_pool), dtype=bool)
+        delta_pending[pending] = True
+        if lookup is None:
+            lookup_columns = (
+                np.ones(len(delta_pool), dtype=bool),
+                np.zeros(len(delta_pool), dtype=np.int64),
+                np.zeros(len(delta_pool), dtype=np.int64)
+            )
+        else:
+            lookup_columns = (lookup.found, lookup.seq, lookup.updated)
+        
+        policy_key = policy.fingerprint()
+        preference_version = 0
+        if self.feed_cache is not None:
+            preference_version = self.feed_cache.preference_version(user_key)
+        reuse_evaluation = (
+            cached is not None
+            and cached.policy_key == policy_key
+            and cached.preference_version == preference_version
+        )
+        
+        if cached is None:
+            columns, pending = delta, delta_pending
+            found, seqs, updated = lookup_columns
+            reasons, interest, scores = self._evaluate(policy, columns, pending, seqs, topic_vocab)
+        else:
+            # Row of every pool position in cached rows followed by delta rows
+            source = np.empty(count, dtype=np.int64)
+            source[reuse_positions] = reuse_rows
+            source[delta_positions] = len(cached.columns) + np.arange(len(delta_pool))
+            
+            def gather(cached_values: np.ndarray, delta_values: np.ndarray) -> np.ndarray:
+                return np.concatenate([cached_values, delta_values])[source]
+            
+            columns = ContentColumns.concat([cached.columns, delta]).take(source)
+            pending = gather(np.zeros(len(cached.columns), dtype=bool), delta_pending)
+            found, seqs, updated = (
+                gather(cached_values, delta_values)
+                for cached_values, delta_values in zip(
+                    (cached.index_found, cached.index_seq, cached.index_updated),
+                    lookup_columns
+                )
+            )
+            if reuse_evaluation:
+                delta_reasons, delta_interest, delta_scores = self._evaluate(
+                    policy,
+                    delta,
+                    delta_pending,
+                    lookup_columns[1],
+                    topic_vocab
+                )
+                reasons = gather(cached.reasons, delta_reasons)
+                interest = gather(cached.interest, delta_interest)
+                scores = gather(cached.scores, delta_scores)
+            else:
+                reasons, interest, scores = self._evaluate(policy, columns, pending, seqs, topic_vocab)
+        
+        # Embeddings are only read for users with interests; pools of other
+        # users never load the encoder
+        if policy.interests:
+            self._submit_embeddings(content_pool, found, seqs)
+        
+        if self.feed_cache is not None:
+            self.feed_cache.set(user_key, MaterializedFeed(
+                fingerprints=fingerprints,
+                columns=columns,
+                index_found=found,
+                index_seq=seqs,
+                index_updated=updated,
+                reasons=reasons,
+                interest=interest,
+                scores=scores,
+                policy_key=policy_key,
+                preference_version=preference_version,
+                topic_vocab=topic_vocab
+            ))
+            self.feed_cache.record(len(reuse_rows), len(delta_pool))
+        return columns, reasons, interest, scores
     
     async def generate_recommendations(
         self,
         user_profile: Dict[str, Any],
         content_pool: List[Dict[str, Any]],
-        limit: int
+        limit: int,
+        safety_settings: Optional[Dict[str, Any]] = None
     ):
-        """Generate personalized recommendations"""
-        # TODO: Implement recommendation logic
+        """Generate personalized recommendations
+        
+        The pool is filtered with the user's safety settings and the best
+        `limit` survivors are returned in rank order. The personalization
+        score is the mean interest match of the returned items.
+        """
         logger.info(f"Generating recommendations for user profile")
+        user_key = user_profile.get("user_id", "anonymous")
+        policy = await self._policy(safety_settings or {})
+        columns, reasons, interest, scores = self._materialize(policy, content_pool, user_key)
+        keep = reasons == KEEP
+        selected = top_k(scores, keep, limit)
+        
+        filtered_content = [
+            FilteredContent(
+                content_id=columns.content_id(row),
+                original_rank=int(row),
+                filtered_rank=rank,
+                is_filtered=False,
+                safety_score=round(float(columns.safety[row]), 4)
+            )
+            for rank, row in enumerate(selected.tolist())
+        ]
         return {
-            "user_id": user_profile.get("user_id", "anonymous"),
-            "filtered_content": [],
-            "total_filtered": 0,
-            "personalization_score": 0.8,
+            "user_id": user_key,
+            "filtered_content": filtered_content,
+            "total_filtered": int(len(columns) - np.count_nonzero(keep)),
+            "personalization_score": round(float(interest[selected].mean()), 4) if len(selected) else 0.0,
             "fairness_metrics": {}
         }
     
@@ -32,9 +276,25 @@ class RecommendationEngine:
         return recommendations
     
     async def filter_unsafe_content(self, user_id: str, content_pool: List[Dict[str, Any]]):
-        """Filter out unsafe content"""
-        # TODO: Implement filtering logic
-        return {"filtered_items": [], "removed_count": 0}
+        """Filter out unsafe content
+        
+        Kept items are returned in pool order; removed ones are listed with
+        the first safety check they failed.
+        """
+        policy = await self._policy(await self.user_service.get_safety_settings(user_id))
+        columns, reasons, _, _ = self._materialize(policy, content_pool, pseudonymize(user_id))
+        removed = np.flatnonzero(reasons != KEEP)
+        return {
+            "filtered_items": [content_pool[row] for row in np.flatnonzero(reasons == KEEP).tolist()],
+            "removed_count": len(removed),
+            "removed": [
+                {
+                    "content_id": columns.content_id(row),
+                    "filter_reason": FILTER_REASONS[reasons[row]]
+                }
+                for row in removed.tolist()
+            ]
+        }
     
     async def explain_decision(self, user_id: str, content_id: str):
         """Explain recommendation decision"""
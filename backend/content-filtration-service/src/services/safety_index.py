@@ -0,0 +1,353 @@
+"""Precomputed per-content safety decisions for feed requests
+
+Feed requests must never run the models. Every analysis that goes through
+the analysis endpoints is also written to a `SafetyIndex`: one row of
+fixed-width columns (safety score, min_age, sensitivity and age-group
+codes, flag bits), reachable by content digest and by content_id. Feed
+requests resolve their whole candidate pool with one bulk `lookup()`.
+Candidates that are not indexed are excluded; with the "defer" policy the
+ones that carry their text are also queued on `DeferredAnalysis`, so they
+are indexed for later requests.
+"""
+import asyncio
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+import orjson
+
+from config.settings import settings
+from ml.inference.executor import InferenceSaturatedError
+from models.schemas import ContentAnalysisRequest, SensitivityLevel
+from services.admission import AdmissionRejectedError
+from services.analysis_cache import content_digest
+from services.feed_ranking import SENSITIVITY_CODES, age_group_mask
+
+logger = logging.getLogger(__name__)
+
+# Bits of the flags column
+FLAG_TOXIC = 1
+FLAG_MISINFORMATION = 2
+
+_DIGEST_RE = re.compile(r"[0-9a-fA-F]{64}")
+
+def _digest_key(digest: Optional[str]) -> Optional[bytes]:
+    """16-byte dict key for a hex content digest; None unless it is a SHA-256 hex digest"""
+    if not isinstance(digest, str) or _DIGEST_RE.fullmatch(digest) is None:
+        return None
+    return bytes.fromhex(digest[:32])
+
+class SafetyLookup:
+    """Index columns gathered for a list of candidates; `found` marks the indexed ones"""
+    
+    __slots__ = (
+        "found",
+        "seq",
+        "updated",
+        "safety",
+        "min_age",
+        "sensitivity",
+        "age_groups",
+        "is_toxic",
+        "is_misinformation"
+    )
+    
+    def __init__(
+        self,
+        found: np.ndarray,
+        seq: np.ndarray,
+        updated: np.ndarray,
+        safety: np.ndarray,
+        min_age: np.ndarray,
+        sensitivity: np.ndarray,
+        age_groups: np.ndarray,
+        is_toxic: np.ndarray,
+        is_misinformation: np.ndarray
+    ):
+        self.found = found
+        # Row identity and version, for `SafetyIndex.changed_since`
+        self.seq = seq
+        self.updated = updated
+        self.safety = safety
+        self.min_age = min_age
+        self.sensitivity = sensitivity
+        self.age_groups = age_groups
+        self.is_toxic = is_toxic
+        self.is_misinformation = is_misinformation
+
+class SafetyIndex:
+    """Array-backed safety decisions keyed by content digest and content_id
+    
+    Rows are preallocated NumPy columns (about 10 bytes per entry) used as a
+    ring: when the index is full the oldest row is reused. Keys map to the
+    allocation sequence number of their row, so keys of a reused row stop
+    matching without being searched for; stale keys are pruned in bulk.
+    Reposts with the same text share one row. Every row records the update
+    that last changed it, so holders of earlier lookups can tell which of
+    their candidates changed since.
+    """
+    
+    _COLUMNS = ("safety", "min_age", "sensitivity", "age_groups", "flags")
+    
+    def __init__(self, capacity: int = None):
+        self.capacity = max(1, capacity or settings.SAFETY_INDEX_MAX_ENTRIES)
+        self.safety = np.zeros(self.capacity, dtype=np.float32)
+        self.min_age = np.zeros(self.capacity, dtype=np.uint8)
+        self.sensitivity = np.zeros(self.capacity, dtype=np.int8)
+        self.age_groups = np.zeros(self.capacity, dtype=np.uint8)
+        self.flags = np.zeros(self.capacity, dtype=np.uint8)
+        self.updated = np.zeros(self.capacity, dtype=np.int64)
+        self._updates = 0
+        self._row_seq = np.full(self.capacity, -1, dtype=np.int64)
+        self._next_seq = 0
+        self._by_digest: Dict[bytes, int] = {}
+        self._by_id: Dict[str, int] = {}
+        
+        self.added_total = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self) -> int:
+        return min(self._next_seq, self.capacity)
+    
+    def _valid(self, seq: Optional[int]) -> Optional[int]:
+        if seq is None or self._row_seq[seq % self.capacity] != seq:
+            return None
+        return seq
+    
+    def _touch(self, row: int):
+        self._updates += 1
+        self.updated[row] = self._updates
+    
+    def _allocate(self) -> int:
+        seq = self._next_seq
+        self._next_seq += 1
+        self._row_seq[seq % self.capacity] = seq
+        return seq
+    
+    def _prune(self):
+        """Drop keys whose row has been reused"""
+        for keys in (self._by_digest, self._by_id):
+            for key in [key for key, seq in keys.items() if self._valid(seq) is None]:
+                del keys[key]
+    
+    @staticmethod
+    def _values(analysis: Dict[str, Any]) -> Tuple:
+        """Column values of one analysis, in `_COLUMNS` order"""
+        toxicity = analysis.get("toxicity") or {}
+        age = analysis.get("age_appropriateness") or {}
+        misinformation = analysis.get("misinformation") or {}
+        flags = FLAG_TOXIC if toxicity.get("is_toxic") else 0
+        if misinformation.get("risk_level") == "high":
+            flags |= FLAG_MISINFORMATION
+        explicit = SENSITIVITY_CODES[SensitivityLevel.EXPLICIT.value]
+        return (
+            np.float32(1.0 - toxicity.get("overall_score", 1.0)),
+            min(max(age.get("min_age", 18), 0), 255),
+            SENSITIVITY_CODES.get(analysis.get("sensitivity"), explicit),
+            age_group_mask(age.get("recommended_age_groups") or ()),
+            flags
+        )
+    
+    def _read(self, row: int) -> Tuple:
+        return tuple(getattr(self, name)[row] for name in self._COLUMNS)
+    
+    def _write(self, row: int, values: Tuple):
+        for name, value in zip(self._COLUMNS, values):
+            getattr(self, name)[row] = value
+        self._touch(row)
+    
+    def add(self, digest: str, analysis: Union[Dict[str, Any], bytes], content_id: str = None) -> bool:
+        """Index one analysis (JSON-mode payload or encoded JSON); partial analyses are skipped"""
+        if isinstance(analysis, bytes):
+            analysis = orjson.loads(analysis)
+        if analysis.get("skipped_analyses"):
+            return False
+        
+        values = self._values(analysis)
+        key = _digest_key(digest)
+        seq = self._valid(self._by_digest.get(key))
+        if seq is None:
+            seq = self._by_digest[key] = self._allocate()
+            self._write(seq % self.capacity, values)
+        elif self._read(seq % self.capacity) != values:
+            self._write(seq % self.capacity, values)
+        if content_id:
+            previous = self._valid(self._by_id.get(content_id))
+            if previous is not None and previous != seq:
+                # Edited content: lookups that went through the old row are stale
+                self._touch(previous % self.capacity)
+            self._by_id[content_id] = seq
+        self.added_total += 1
+        
+        if len(self._by_digest) + len(self._by_id) > 4 * self.capacity:
+            self._prune()
+        return True
+    
+    def _gather(self, content_ids: Sequence[Optional[str]], digests: Sequence[Optional[str]]) -> SafetyLookup:
+        count = len(content_ids)
+        keys = [_digest_key(digest) for digest in digests]
+        has_digest = np.fromiter((key is not None for key in keys), dtype=bool, count=count)
+        by_id = np.fromiter((self._by_id.get(key, -1) for key in content_ids), dtype=np.int64, count=count)
+        by_digest = np.fromiter(
+            (-1 if key is None else self._by_digest.get(key, -1) for key in keys),
+            dtype=np.int64,
+            count=count
+        )
+        # The digest names the exact text that was scored, so it decides alone
+        # when given; an id may name content edited since it was analyzed
+        id_found = ~has_digest & (by_id >= 0) & (self._row_seq[by_id % self.capacity] == by_id)
+        digest_found = (by_digest >= 0) & (self._row_seq[by_digest % self.capacity] == by_digest)
+        found = id_found | digest_found
+        seqs = np.where(digest_found, by_digest, np.where(id_found, by_id, -1))
+        rows = seqs % self.capacity
+        flags = self.flags[rows]
+        return SafetyLookup(
+            found=found,
+            seq=seqs,
+            updated=np.where(found, self.updated[rows], 0),
+            safety=self.safety[rows],
+            min_age=self.min_age[rows],
+            sensitivity=self.sensitivity[rows],
+            age_groups=self.age_groups[rows],
+            is_toxic=(flags & FLAG_TOXIC) != 0,
+            is_misinformation=(flags & FLAG_MISINFORMATION) != 0
+        )
+    
+    def _count(self, lookup: SafetyLookup) -> SafetyLookup:
+        hits = int(np.count_nonzero(lookup.found))
+        self.hits += hits
+        self.misses += len(lookup.found) - hits
+        return lookup
+    
+    def lookup(
+        self,
+        content_ids: Sequence[Optional[str]],
+        digests: Optional[Sequence[Optional[str]]] = None
+    ) -> SafetyLookup:
+        """Bulk lookup by content digest, or by content_id where no valid digest is given"""
+        return self._count(self._gather(content_ids, digests or [None] * len(content_ids)))
+    
+    def lookup_pool(self, content_pool: Sequence[Dict[str, Any]]) -> SafetyLookup:
+        """Bulk lookup of feed candidates
+        
+        Candidates that carry their text as `content` are found by its
+        digest only, so edited content is analyzed again; the others by
+        `content_hash` or, without a valid one, by `content_id`.
+        """
+        return self._count(self._gather(
+            [item.get("content_id") for item in content_pool],
+            [
+                content_digest(item["content"]) if item.get("content") else item.get("content_hash")
+                for item in content_pool
+            ]
+        ))
+    
+    def changed_since(self, seqs: np.ndarray, updated: np.ndarray) -> np.ndarray:
+        """Which of earlier-found rows (`SafetyLookup.seq`/`updated`) were reused or updated since"""
+        rows = seqs % self.capacity
+        return (self._row_seq[rows] != seqs) | (self.updated[rows] != updated)
+    
+    def touch(self, seqs: Iterable[int]):
+        """Mark rows as updated (for `changed_since`) when data derived from them changes"""
+        for seq in seqs:
+            if self._valid(seq) is not None:
+                self._touch(seq % self.capacity)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "capacity": self.capacity,
+            "added_total": self.added_total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+class DeferredAnalysis:
+    """Background analysis of feed candidates that were missing from the index
+    
+    Also retries `/analyze` requests that were only answered with a partial
+    (pattern-only) result, so the full verdict still gets indexed.
+    
+    `submit()` never waits: items are queued up to `max_pending` (duplicates
+    of queued texts are ignored) and a worker analyzes them in batches
+    through `analyze`, which indexes the results. When the models are not
+    ready or the service sheds load, the worker waits and retries the batch.
+    """
+    
+    def __init__(
+        self,
+        analyze: Callable[[List[ContentAnalysisRequest]], Awaitable[Any]],
+        max_pending: int = None,
+        batch_size: int = None
+    ):
+        self.analyze = analyze
+        self.max_pending = max_pending or settings.SAFETY_INDEX_DEFER_MAX_PENDING
+        self.batch_size = batch_size or settings.SAFETY_INDEX_DEFER_BATCH_SIZE
+        self._queue: "asyncio.Queue[ContentAnalysisRequest]" = asyncio.Queue()
+        self._pending: Set[str] = set()
+        self._worker: Optional[asyncio.Task] = None
+        
+        self.submitted_total = 0
+        self.analyzed_total = 0
+        self.dropped_total = 0
+        self.failed_total = 0
+    
+    def submit(self, items: Iterable[ContentAnalysisRequest]) -> int:
+        """Queue items for analysis, returning how many were accepted"""
+        accepted = 0
+        for item in items:
+            if item.content in self._pending:
+                continue
+            if len(self._pending) >= self.max_pending:
+                self.dropped_total += 1
+                continue
+            self._pending.add(item.content)
+            self._queue.put_nowait(item)
+            accepted += 1
+        self.submitted_total += accepted
+        return accepted
+    
+    async def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run(), name="deferred-analysis")
+    
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+    
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                while True:
+                    try:
+                        await self.analyze(batch)
+                        self.analyzed_total += len(batch)
+                        break
+                    except (InferenceSaturatedError, AdmissionRejectedError) as e:
+                        await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                self.failed_total += len(batch)
+                logger.error(f"Deferred analysis of {len(batch)} items failed: {e}")
+            finally:
+                self._pending.difference_update(item.content for item in batch)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "submitted_total": self.submitted_total,
+            "analyzed_total": self.analyzed_total,
+            "dropped_total": self.dropped_total,
+            "failed_total": self.failed_total
+        }
@@ -1,34 +1,90 @@
 import logging
-from typing import Dict, Any
-from models.schemas import UserPreferences
+from datetime import datetime
+from typing import Dict, Any, Optional
+from database.mongodb import get_database
+from models.schemas import SensitivityLevel, UserPreferences
+from services.feed_cache import FeedCache
+from services.privacy_service import pseudonymize
 
 logger = logging.getLogger(__name__)
 
+# Safety settings of users without stored preferences
+DEFAULT_SAFETY_SETTINGS = {
+    "block_toxicity": True,
+    "block_misinformation": True,
+    "block_nsfw": True,
+    "sensitivity_level": "moderate"
+}
+
+FILTER_KEYS = ("block_toxicity", "block_misinformation", "block_nsfw")
+
 class UserService:
-    """User preferences and settings management"""
+    """User preferences and settings management
+    
+    Preferences live in `user_preferences`, keyed by the pseudonymous user
+    hash (see database/mongodb/collections.md); feed requests read the
+    safety settings and interests from there.
+    """
+    
+    COLLECTION = "user_preferences"
+    
+    def __init__(self, feed_cache: Optional[FeedCache] = None):
+        self.feed_cache = feed_cache
     
-    def __init__(self):
-        pass
+    @property
+    def collection(self):
+        db = get_database()
+        return db[self.COLLECTION] if db is not None else None
     
     async def update_preferences(self, preferences: UserPreferences):
         """Update user content preferences"""
-        # TODO: Store in database
         logger.info(f"Updating preferences for user: {preferences.user_id}")
+        if self.collection is None:
+            raise RuntimeError("MongoDB is not connected")
+        await self.collection.update_one(
+            {"user_hash": pseudonymize(preferences.user_id)},
+            {"$set": {
+                "age_group": preferences.age_group.value,
+                "sensitivity_level": preferences.sensitivity_level.value,
+                "filters": {key: getattr(preferences, key) for key in FILTER_KEYS},
+                "interests": list(preferences.interests or []),
+                "updated_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+        if self.feed_cache is not None:
+            self.feed_cache.invalidate(preferences.user_id)
         return True
     
     async def get_safety_settings(self, user_id: str) -> Dict[str, Any]:
-        """Get user safety settings"""
-        # TODO: Fetch from database
-        return {
-            "user_id": user_id,
-            "block_toxicity": True,
-            "block_misinformation": True,
-            "block_nsfw": True,
-            "sensitivity_level": "moderate"
-        }
+        """Get user safety settings, with the age group and interests when stored"""
+        safety_settings = {"user_id": user_id, **DEFAULT_SAFETY_SETTINGS}
+        if self.collection is None:
+            return safety_settings
+        doc = await self.collection.find_one(
+            {"user_hash": pseudonymize(user_id)},
+            {"_id": 0, "age_group": 1, "sensitivity_level": 1, "filters": 1, "interests": 1}
+        )
+        if doc is None:
+            return safety_settings
+        safety_settings.update(doc.pop("filters", None) or {})
+        safety_settings.update((key, value) for key, value in doc.items() if value is not None)
+        return safety_settings
     
     async def update_safety_settings(self, user_id: str, settings: Dict[str, Any]):
         """Update user safety settings"""
-        # TODO: Store in database
         logger.info(f"Updating safety settings for user: {user_id}")
+        if self.collection is None:
+            raise RuntimeError("MongoDB is not connected")
+        update = {f"filters.{key}": bool(settings[key]) for key in FILTER_KEYS if key in settings}
+        if "sensitivity_level" in settings:
+            update["sensitivity_level"] = SensitivityLevel(settings["sensitivity_level"]).value
+        update["updated_at"] = datetime.utcnow()
+        await self.collection.update_one(
+            {"user_hash": pseudonymize(user_id)},
+            {"$set": update},
+            upsert=True
+        )
+        if self.feed_cache is not None:
+            self.feed_cache.invalidate(user_id)
         return True
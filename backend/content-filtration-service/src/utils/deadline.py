@@ -0,0 +1,28 @@
+import time
+from typing import Optional
+
+class Deadline:
+    """Point in time (monotonic clock) by which a request has to be answered"""
+    
+    def __init__(self, budget_ms: float):
+        self.budget_ms = max(0.0, budget_ms)
+        self.expires_at = time.monotonic() + self.budget_ms / 1000.0
+    
+    @classmethod
+    def from_header(cls, value: Optional[str]) -> Optional["Deadline"]:
+        """Parse a remaining-budget header in milliseconds (None when absent)
+        
+        A relative budget rather than a timestamp, so client and server
+        clocks do not have to agree. Raises ValueError for malformed values.
+        """
+        if value is None or not value.strip():
+            return None
+        return cls(float(value))
+    
+    def remaining(self) -> float:
+        """Seconds left, never negative"""
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
@@ -0,0 +1,30 @@
+from bisect import bisect_left
+from typing import Any, Dict, Sequence
+
+# Default bounds for latency histograms, in seconds
+LATENCY_BOUNDS_SECONDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class BucketHistogram:
+    """Fixed-bucket histogram for cheap in-process observations"""
+    
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = sorted(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value: float):
+        """Record a single observation"""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Return cumulative bucket counts (Prometheus `le` semantics)"""
+        buckets = {}
+        running = 0
+        for bound, count in zip(self.bounds, self.counts):
+            running += count
+            buckets[f"{bound:g}"] = running
+        buckets["+Inf"] = self.count
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
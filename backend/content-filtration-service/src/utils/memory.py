@@ -0,0 +1,67 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# smaps fields (kB) that make up unique vs shared resident memory
+_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+def _read_smaps(pid: int) -> Optional[Dict[str, int]]:
+    """Sum smaps fields for a process; smaps_rollup when the kernel has it"""
+    totals = dict.fromkeys(_FIELDS, 0)
+    for name in ("smaps_rollup", "smaps"):
+        try:
+            with open(f"/proc/{pid}/{name}") as f:
+                for line in f:
+                    key, _, rest = line.partition(":")
+                    if key in totals:
+                        totals[key] += int(rest.split()[0])
+            return totals
+        except FileNotFoundError:
+            continue
+        except (OSError, ValueError) as e:
+            logger.debug(f"Cannot read /proc/{pid}/{name}: {e}")
+            return None
+    return None
+
+def process_memory(pid: int = None) -> Optional[Dict[str, Any]]:
+    """Unique (private) vs shared resident memory of one process, in MiB
+    
+    `unique_mb` is what the process alone costs (freed if it exited);
+    `shared_mb` is resident memory it shares with others, such as model
+    weights inherited from a pre-fork load. `pss_mb` splits shared pages
+    evenly, so summing it across workers gives the real total.
+    """
+    pid = pid or os.getpid()
+    smaps = _read_smaps(pid)
+    if smaps is None:
+        return None
+    return {
+        "pid": pid,
+        "rss_mb": smaps["Rss"] / 1024,
+        "pss_mb": smaps["Pss"] / 1024,
+        "unique_mb": (smaps["Private_Clean"] + smaps["Private_Dirty"]) / 1024,
+        "shared_mb": (smaps["Shared_Clean"] + smaps["Shared_Dirty"]) / 1024,
+        "swap_mb": smaps["Swap"] / 1024
+    }
+
+def sibling_pids() -> List[int]:
+    """PIDs of all children of our parent (the gunicorn master's workers)"""
+    parent = os.getppid()
+    try:
+        with open(f"/proc/{parent}/task/{parent}/children") as f:
+            return sorted(int(pid) for pid in f.read().split())
+    except (OSError, ValueError):
+        return [os.getpid()]
+
+def worker_memory_report(include_siblings: bool = True) -> Dict[str, Any]:
+    """Memory of this worker and its siblings, plus totals across them"""
+    pids = sibling_pids() if include_siblings else [os.getpid()]
+    workers = [m for m in (process_memory(pid) for pid in pids) if m is not None]
+    return {
+        "self": process_memory(),
+        "workers": workers,
+        "total_pss_mb": sum(w["pss_mb"] for w in workers),
+        "total_rss_mb": sum(w["rss_mb"] for w in workers)
+    }
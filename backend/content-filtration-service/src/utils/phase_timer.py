@@ -0,0 +1,31 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+class PhaseTimer:
+    """Wall-clock duration of named startup phases"""
+    
+    def __init__(self, name: str = "startup"):
+        self.name = name
+        self.phases: Dict[str, float] = {}
+        self._started = time.perf_counter()
+    
+    @contextmanager
+    def phase(self, phase: str):
+        """Time the enclosed block (works across awaits) and log it"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.phases[phase] = elapsed_ms
+            logger.info(f"{self.name} phase '{phase}' took {elapsed_ms:.0f} ms")
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "phases_ms": dict(self.phases),
+            "elapsed_ms": (time.perf_counter() - self._started) * 1000
+        }
@@ -0,0 +1,18 @@
+"""Shared setup for the service unit tests
+
+Tests import application modules the same way `src/main.py` does, so
+`src/` is put on the path and the settings that have no defaults are filled
+with local placeholders (no test talks to MongoDB or Redis):
+    
+    python -m pytest tests
+"""
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379")
+os.environ.setdefault("SECRET_KEY", "test")
@@ -0,0 +1,95 @@
+"""AdmissionController: priority classes, 429 on full queues, 503 on queue timeout"""
+import asyncio
+
+import pytest
+
+from services.admission import AdmissionController, AdmissionRejectedError, EndpointPool
+
+def controller(max_concurrency: int = 1, **queue_timeout_ms) -> AdmissionController:
+    return AdmissionController(
+        max_concurrency=max_concurrency,
+        pools=[
+            EndpointPool("analyze", limit=4, max_queue=4, priority="interactive"),
+            EndpointPool("batch-analyze", limit=4, max_queue=1, priority="batch")
+        ],
+        queue_timeout_ms={"interactive": 1000.0, "batch": 1000.0, **queue_timeout_ms}
+    )
+
+async def hold(admission: AdmissionController, endpoint: str, release: asyncio.Event, order: list):
+    async with admission.admit(endpoint):
+        order.append(endpoint)
+        await release.wait()
+
+@pytest.mark.asyncio
+async def test_freed_slot_goes_to_interactive_before_batch():
+    admission = controller()
+    first, release = asyncio.Event(), asyncio.Event()
+    order = []
+    running = asyncio.ensure_future(hold(admission, "batch-analyze", first, order))
+    await asyncio.sleep(0)
+    # Queued batch first, interactive second
+    batch = asyncio.ensure_future(hold(admission, "batch-analyze", release, order))
+    await asyncio.sleep(0)
+    interactive = asyncio.ensure_future(hold(admission, "analyze", release, order))
+    await asyncio.sleep(0)
+    first.set()
+    await asyncio.sleep(0.01)
+    assert order == ["batch-analyze", "analyze"]
+    release.set()
+    await asyncio.gather(running, batch, interactive)
+    assert order == ["batch-analyze", "analyze", "batch-analyze"]
+    assert admission.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_full_endpoint_queue_is_shed_with_429():
+    admission = controller()
+    release = asyncio.Event()
+    running = asyncio.ensure_future(hold(admission, "batch-analyze", release, []))
+    await asyncio.sleep(0)
+    queued = asyncio.ensure_future(hold(admission, "batch-analyze", release, []))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejectedError) as rejected:
+        async with admission.admit("batch-analyze"):
+            pass
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after >= 1
+    assert admission.pools["batch-analyze"].shed_total["queue_full"] == 1
+    release.set()
+    await asyncio.gather(running, queued)
+
+@pytest.mark.asyncio
+async def test_queue_timeout_is_shed_with_503():
+    admission = controller(interactive=20.0)
+    release = asyncio.Event()
+    running = asyncio.ensure_future(hold(admission, "analyze", release, []))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejectedError) as rejected:
+        async with admission.admit("analyze"):
+            pass
+    assert rejected.value.status_code == 503
+    assert admission.pools["analyze"].shed_total["deadline"] == 1
+    release.set()
+    await running
+    assert admission.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_keep_a_slot():
+    admission = controller()
+    release = asyncio.Event()
+    running = asyncio.ensure_future(hold(admission, "analyze", release, []))
+    await asyncio.sleep(0)
+    waiter = asyncio.ensure_future(hold(admission, "analyze", release, []))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    release.set()
+    await running
+    assert admission.in_flight == 0
+    assert admission.pools["analyze"].abandoned_total == 1
+
+@pytest.mark.asyncio
+async def test_unknown_endpoint_is_not_limited():
+    admission = controller()
+    async with admission.admit("recommendations"):
+        assert admission.in_flight == 0
@@ -0,0 +1,86 @@
+"""InferenceExecutor: bounded admission and slot release"""
+import asyncio
+import threading
+
+import pytest
+
+from ml.inference.executor import InferenceExecutor, InferenceSaturatedError
+
+def free_slots(executor: InferenceExecutor) -> int:
+    return executor._slots._value
+
+@pytest.fixture
+def executor():
+    executor = InferenceExecutor(max_workers=1, max_pending=0, queue_timeout_ms=50)
+    yield executor
+    executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_run_returns_the_result_and_frees_the_slot(executor):
+    assert await executor.run(sum, [1, 2, 3]) == 6
+    await asyncio.sleep(0.01)
+    assert free_slots(executor) == executor.capacity
+    assert executor.completed_total == 1
+    assert executor.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_saturated_pool_rejects_after_queue_timeout(executor):
+    release = threading.Event()
+    running = asyncio.ensure_future(executor.run(release.wait))
+    await asyncio.sleep(0.01)
+    with pytest.raises(InferenceSaturatedError):
+        await executor.run(sum, [1])
+    assert executor.rejected_total == 1
+    release.set()
+    assert await running is True
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_holds_the_slot_until_the_worker_finishes(executor):
+    release = threading.Event()
+    caller = asyncio.ensure_future(executor.run(release.wait))
+    await asyncio.sleep(0.01)
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+    # The call is still running on its thread, so its slot stays taken
+    assert free_slots(executor) == 0
+    release.set()
+    for _ in range(100):
+        if free_slots(executor) == executor.capacity:
+            break
+        await asyncio.sleep(0.01)
+    assert free_slots(executor) == executor.capacity
+    assert executor.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_waiter_cancelled_in_queue_leaves_no_slot_behind(executor):
+    release = threading.Event()
+    running = asyncio.ensure_future(executor.run(release.wait))
+    await asyncio.sleep(0.01)
+    waiter = asyncio.ensure_future(executor.run(sum, [1]))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    release.set()
+    await running
+    await asyncio.sleep(0.01)
+    assert free_slots(executor) == executor.capacity
+
+@pytest.mark.asyncio
+async def test_slot_granted_as_the_wait_is_abandoned_is_released():
+    executor = InferenceExecutor(max_workers=1, max_pending=0, queue_timeout_ms=1000)
+    try:
+        await executor.run(sum, [1])
+        await executor._slots.acquire()
+        waiter = asyncio.ensure_future(executor._acquire())
+        await asyncio.sleep(0)
+        # The slot frees up in the same loop iteration the waiter gives up
+        executor._slots.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0.01)
+        assert free_slots(executor) == executor.capacity
+    finally:
+        executor.shutdown()
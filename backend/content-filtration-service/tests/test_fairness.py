@@ -0,0 +1,78 @@
+"""FairnessMonitor: windowed rates and fairness gaps from bucketed counters"""
+import time
+
+import pytest
+
+from services.fairness_service import FairnessMonitor, parse_time_range
+
+BUCKET = 60
+
+@pytest.fixture
+def monitor():
+    return FairnessMonitor(bucket_seconds=BUCKET, buckets=60, max_groups=8, min_group_size=1)
+
+def record(monitor: FairnessMonitor, group: str, flagged: int, total: int, at: float, label: bool = None):
+    for number in range(total):
+        monitor.record_decision(group, number < flagged, label, at=at)
+
+def test_demographic_parity_gap_over_the_window(monitor):
+    now = time.time()
+    record(monitor, "a", flagged=3, total=10, at=now)
+    record(monitor, "b", flagged=1, total=10, at=now)
+    report = monitor.report("10m", now=now)
+    assert report["groups"]["a"]["positive_rate"] == pytest.approx(0.3)
+    assert report["groups"]["b"]["positive_rate"] == pytest.approx(0.1)
+    assert report["demographic_parity_gap"] == pytest.approx(0.2)
+    assert report["overall_fairness_score"] == pytest.approx(0.8)
+    assert report["source"] == "process"
+
+def test_buckets_outside_the_window_are_left_out(monitor):
+    now = time.time()
+    # 30 minutes ago group "a" was flagged for everything
+    record(monitor, "a", flagged=10, total=10, at=now - 30 * 60)
+    record(monitor, "a", flagged=1, total=10, at=now)
+    record(monitor, "b", flagged=1, total=10, at=now)
+    assert monitor.report("10m", now=now)["demographic_parity_gap"] == pytest.approx(0.0)
+    assert monitor.report("1h", now=now)["demographic_parity_gap"] == pytest.approx(11 / 20 - 0.1)
+
+def test_equal_opportunity_gap_uses_labels(monitor):
+    now = time.time()
+    # Group "a": 4 of 4 harmful items caught; group "b": 1 of 4
+    record(monitor, "a", flagged=4, total=4, at=now, label=True)
+    record(monitor, "b", flagged=1, total=4, at=now, label=True)
+    report = monitor.report("1h", now=now)
+    assert report["groups"]["b"]["true_positive_rate"] == pytest.approx(0.25)
+    assert report["equal_opportunity_gap"] == pytest.approx(0.75)
+
+def test_small_groups_are_left_out_of_gaps():
+    monitor = FairnessMonitor(bucket_seconds=BUCKET, buckets=60, max_groups=8, min_group_size=5)
+    now = time.time()
+    record(monitor, "a", flagged=1, total=10, at=now)
+    record(monitor, "b", flagged=4, total=4, at=now)
+    report = monitor.report("1h", now=now)
+    assert report["demographic_parity_gap"] is None
+    assert report["overall_fairness_score"] is None
+
+def test_trend_points_split_the_window(monitor):
+    now = time.time()
+    record(monitor, "a", flagged=1, total=2, at=now - 50 * 60)
+    record(monitor, "b", flagged=0, total=2, at=now - 50 * 60)
+    record(monitor, "a", flagged=0, total=3, at=now)
+    report = monitor.report("1h", trend_points=2, now=now)
+    assert [point["decisions"] for point in report["trends"]] == [4, 3]
+    assert report["trends"][0]["demographic_parity_gap"] == pytest.approx(0.5)
+    assert report["trends"][1]["demographic_parity_gap"] is None
+
+def test_decisions_outside_the_ring_are_stale(monitor):
+    now = time.time()
+    monitor.record_decision("a", True, at=now - 2 * 60 * BUCKET)
+    assert monitor.stale_total == 1
+    assert monitor.report("1h", now=now)["groups"] == {}
+
+def test_parse_time_range():
+    assert parse_time_range("30m") == 1800
+    assert parse_time_range("24h") == 86400
+    with pytest.raises(ValueError):
+        parse_time_range("0h")
+    with pytest.raises(ValueError):
+        parse_time_range("1w")
@@ -0,0 +1,63 @@
+"""FeedCache: LRU eviction bounded by total candidate rows"""
+import numpy as np
+
+from services.feed_cache import FeedCache, MaterializedFeed, pool_fingerprints
+from services.feed_ranking import ContentColumns
+
+def feed(rows: int) -> MaterializedFeed:
+    pool = [{"content_id": f"post-{row}", "relevance": 0.5} for row in range(rows)]
+    columns = ContentColumns.from_pool(pool, {})
+    return MaterializedFeed(
+        fingerprints=pool_fingerprints(pool),
+        columns=columns,
+        index_found=np.ones(rows, dtype=bool),
+        index_seq=np.arange(rows, dtype=np.int64),
+        index_updated=np.zeros(rows, dtype=np.int64),
+        reasons=np.zeros(rows, dtype=np.int8),
+        interest=np.zeros(rows, dtype=np.float32),
+        scores=np.zeros(rows, dtype=np.float32),
+        policy_key=(),
+        preference_version=0,
+        topic_vocab={}
+    )
+
+def test_least_recently_used_feeds_are_evicted_by_rows():
+    cache = FeedCache(max_rows=10, ttl_seconds=60)
+    cache.set("a", feed(4))
+    cache.set("b", feed(4))
+    assert cache.get("a") is not None  # "b" is now least recently used
+    cache.set("c", feed(4))
+    
+    assert cache.rows == 8
+    assert cache.evictions_total == 1
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+def test_large_feed_evicts_several_small_ones():
+    cache = FeedCache(max_rows=10, ttl_seconds=60)
+    for key in "abc":
+        cache.set(key, feed(3))
+    cache.set("d", feed(8))
+    assert cache.rows == 8
+    assert cache.evictions_total == 3
+    assert cache.stats()["users"] == 1
+
+def test_feed_larger_than_the_cache_is_not_stored():
+    cache = FeedCache(max_rows=10, ttl_seconds=60)
+    cache.set("a", feed(4))
+    cache.set("b", feed(11))
+    assert cache.get("b") is None
+    assert cache.rows == 4
+
+def test_replacing_a_feed_counts_its_rows_once():
+    cache = FeedCache(max_rows=10, ttl_seconds=60)
+    cache.set("a", feed(4))
+    cache.set("a", feed(6))
+    assert cache.rows == 6
+    assert cache.evictions_total == 0
+
+def test_expired_feed_is_dropped():
+    cache = FeedCache(max_rows=10, ttl_seconds=-1)
+    cache.set("a", feed(4))
+    assert cache.get("a") is None
+    assert cache.rows == 0
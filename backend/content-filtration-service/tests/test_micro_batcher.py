@@ -0,0 +1,91 @@
+"""MicroBatcher: coalescing concurrent submissions and flushing on the wait budget"""
+import asyncio
+
+import pytest
+
+from ml.inference.executor import InferenceSaturatedError
+from ml.inference.micro_batcher import MicroBatcher
+
+class RecordingBatchFn:
+    def __init__(self):
+        self.batches = []
+    
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        return [item * 2 for item in items]
+
+@pytest.mark.asyncio
+async def test_concurrent_submissions_share_one_batch():
+    batch_fn = RecordingBatchFn()
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=1000)
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(item) for item in range(4))),
+            timeout=0.5
+        )
+    finally:
+        await batcher.stop()
+    # A full batch is dispatched at once, well before the 1s wait budget
+    assert results == [0, 2, 4, 6]
+    assert batch_fn.batches == [[0, 1, 2, 3]]
+
+@pytest.mark.asyncio
+async def test_batches_are_capped_at_max_batch_size():
+    batch_fn = RecordingBatchFn()
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_wait_ms=1000)
+    try:
+        results = await asyncio.gather(*(batcher.submit(item) for item in range(5)))
+    finally:
+        await batcher.stop()
+    assert results == [0, 2, 4, 6, 8]
+    assert [len(batch) for batch in batch_fn.batches] == [2, 2, 1]
+
+@pytest.mark.asyncio
+async def test_partial_batch_flushes_after_max_wait():
+    batch_fn = RecordingBatchFn()
+    batcher = MicroBatcher(batch_fn, max_batch_size=32, max_wait_ms=20)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2))
+    finally:
+        await batcher.stop()
+    assert results == [2, 4]
+    assert batch_fn.batches == [[1, 2]]
+    assert loop.time() - started >= 0.015
+
+@pytest.mark.asyncio
+async def test_batch_failure_reaches_every_caller():
+    async def failing(items):
+        raise RuntimeError("model down")
+    
+    batcher = MicroBatcher(failing, max_batch_size=2, max_wait_ms=1)
+    try:
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+    finally:
+        await batcher.stop()
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batcher.errors_total == 1
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_submissions():
+    release = asyncio.Event()
+    
+    async def blocked(items):
+        await release.wait()
+        return items
+    
+    batcher = MicroBatcher(blocked, max_batch_size=1, max_wait_ms=0, max_queue_size=1)
+    try:
+        # One item is dispatched (and blocks), the next one fills the queue
+        running = asyncio.ensure_future(batcher.submit("a"))
+        await asyncio.sleep(0.01)
+        queued = asyncio.ensure_future(batcher.submit("b"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(InferenceSaturatedError):
+            await batcher.submit("c")
+        release.set()
+        assert await asyncio.gather(running, queued) == ["a", "b"]
+    finally:
+        await batcher.stop()
+    assert batcher.rejected_total == 1
@@ -0,0 +1,68 @@
+"""SafetyIndex: row reuse for reposts, digest-first lookup and change detection"""
+import numpy as np
+
+from services.analysis_cache import content_digest
+from services.safety_index import SafetyIndex
+
+def analysis(score: float, is_toxic: bool = False, **extra):
+    return {
+        "toxicity": {"overall_score": score, "is_toxic": is_toxic},
+        "age_appropriateness": {"min_age": 13, "recommended_age_groups": ["teen", "adult"]},
+        "sensitivity": "safe",
+        **extra
+    }
+
+def test_reposts_share_one_row():
+    index = SafetyIndex(capacity=8)
+    digest = content_digest("same text")
+    index.add(digest, analysis(0.2), "post-1")
+    index.add(digest, analysis(0.2), "post-2")
+    assert len(index) == 1
+    
+    lookup = index.lookup(["post-1", "post-2"])
+    assert lookup.found.tolist() == [True, True]
+    assert lookup.seq[0] == lookup.seq[1]
+    assert np.allclose(lookup.safety, 0.8)
+    assert lookup.min_age.tolist() == [13, 13]
+
+def test_partial_analyses_are_not_indexed():
+    index = SafetyIndex(capacity=8)
+    assert not index.add(content_digest("text"), analysis(0.0, skipped_analyses=["toxicity_model"]), "post-1")
+    assert not index.lookup(["post-1"]).found.any()
+
+def test_digest_decides_over_content_id():
+    index = SafetyIndex(capacity=8)
+    index.add(content_digest("old text"), analysis(0.1), "post-1")
+    # The id is known, but the candidate's current text was never analyzed
+    pool = [{"content_id": "post-1", "content": "edited text"}]
+    assert not index.lookup_pool(pool).found.any()
+    assert index.lookup_pool([{"content_id": "post-1"}]).found.all()
+    assert index.lookup_pool([{"content_id": "post-1", "content": "old text"}]).found.all()
+
+def test_changed_since_reports_updated_rows():
+    index = SafetyIndex(capacity=8)
+    digest = content_digest("text")
+    index.add(digest, analysis(0.1), "post-1")
+    before = index.lookup(["post-1"])
+    
+    # Same values: nothing changed
+    index.add(digest, analysis(0.1), "post-1")
+    assert not index.changed_since(before.seq, before.updated).any()
+    
+    index.add(digest, analysis(0.9, is_toxic=True), "post-1")
+    assert index.changed_since(before.seq, before.updated).all()
+    assert index.lookup(["post-1"]).is_toxic.all()
+
+def test_edited_content_invalidates_the_old_row():
+    index = SafetyIndex(capacity=8)
+    index.add(content_digest("first"), analysis(0.1), "post-1")
+    before = index.lookup(["post-1"])
+    index.add(content_digest("second"), analysis(0.1), "post-1")
+    assert index.changed_since(before.seq, before.updated).all()
+
+def test_full_index_reuses_the_oldest_row():
+    index = SafetyIndex(capacity=2)
+    for number in range(3):
+        index.add(content_digest(f"text {number}"), analysis(0.1), f"post-{number}")
+    assert len(index) == 2
+    assert index.lookup(["post-0", "post-1", "post-2"]).found.tolist() == [False, True, True]
@@ -0,0 +1,77 @@
+"""NDJSON streaming endpoint: a window that cannot be analyzed ends the stream"""
+import asyncio
+
+import orjson
+import pytest
+
+from api.routes import content
+from config.settings import settings
+from models.schemas import BatchAnalysisItemResult
+
+class NDJSONRequest:
+    """Stands in for the Starlette request: only the body stream is read"""
+    
+    def __init__(self, lines):
+        self.body = b"".join(orjson.dumps(line) + b"\n" for line in lines)
+    
+    async def stream(self):
+        yield self.body
+
+async def read_lines(response):
+    return [orjson.loads(line) async for chunk in response.body_iterator for line in chunk.splitlines()]
+
+@pytest.fixture
+def small_windows(monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_WINDOW_SIZE", 2)
+    monkeypatch.setattr(settings, "STREAM_WINDOW_MAX_RETRIES", 1)
+
+def analyze_items_failing_on(failing_content: str, error: Exception):
+    async def analyze_items(items, *services, start_index=0):
+        if any(item.content == failing_content for item in items):
+            raise error
+        return [
+            BatchAnalysisItemResult(index=position, content_id=item.content_id, error="not analyzed")
+            for position, item in enumerate(items)
+        ]
+    return analyze_items
+
+async def stream(lines):
+    response = await content.stream_batch_analyze_content(NDJSONRequest(lines), None, None, None, None, None)
+    return await read_lines(response)
+
+@pytest.mark.asyncio
+async def test_failed_window_ends_the_stream_with_its_index_range(small_windows, monkeypatch):
+    monkeypatch.setattr(content, "_analyze_items", analyze_items_failing_on("c", RuntimeError("model down")))
+    lines = await stream([{"content": text} for text in "abcde"])
+    
+    assert [line["index"] for line in lines[:2]] == [0, 1]
+    assert lines[2] == {"error": "model down", "first_index": 2, "last_index": 3}
+    assert lines[3] == {"summary": {"total": 4, "failed": 4}}
+    assert len(lines) == 4
+
+@pytest.mark.asyncio
+async def test_saturated_window_fails_after_its_retries(small_windows, monkeypatch):
+    sleeps = []
+    
+    async def no_sleep(seconds):
+        sleeps.append(seconds)
+    
+    error = content.InferenceSaturatedError("pool saturated", retry_after=3)
+    monkeypatch.setattr(content, "_analyze_items", analyze_items_failing_on("a", error))
+    monkeypatch.setattr(content.asyncio, "sleep", no_sleep)
+    lines = await stream([{"content": "a"}, {"content": "b"}])
+    
+    assert sleeps == [3]
+    assert lines == [
+        {"error": "pool saturated", "first_index": 0, "last_index": 1},
+        {"summary": {"total": 2, "failed": 2}}
+    ]
+
+@pytest.mark.asyncio
+async def test_invalid_lines_are_reported_per_item(small_windows, monkeypatch):
+    monkeypatch.setattr(content, "_analyze_items", analyze_items_failing_on(None, RuntimeError()))
+    lines = await stream([{"content": "a"}, {"content_id": "missing-content"}])
+    
+    assert lines[0]["index"] == 0
+    assert lines[1]["index"] == 1 and lines[1]["error"].startswith("Invalid item")
+    assert lines[2] == {"summary": {"total": 2, "failed": 2}}